@@ -1,7 +1,16 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 import time
 
+from export_loader import DEFAULT_CHUNKSIZE, expand_input_paths, order_by_age, read_export_streaming, unique_columns
+from instrumentation import Instrumentation, instrumented, stage
+from pivot_engine import pivot_answers
+from pivot_store import PivotStore
+from question_catalog import CodedExport, QuestionOrder, load_coded_export
+from report_writer import write_report
+from result_cache import ResultCache, cached_result
+
 def get_meta_data_fields(
   df: pd.DataFrame, 
   metadata_columns: List[str], 
@@ -18,36 +27,69 @@ def get_meta_data_fields(
     Returns:
         Dict[int, Dict[str, any]]: A dictionary mapping each assessment ID to its metadata.
     """
+    return get_meta_data_frame(df, metadata_columns, pivot_column).to_dict('index')
+
+def get_meta_data_frame(
+  df: pd.DataFrame, 
+  metadata_columns: List[str], 
+  pivot_column: str
+) -> pd.DataFrame:
+    """
+    Extracts the distinct assessment metadata rows indexed by assessment ID.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing assessment data.
+        metadata_columns (List[str]): List of metadata column names.
+        pivot_column (str): The column name to pivot on (used as the index).
+
+    Returns:
+        pd.DataFrame: One row of metadata per assessment ID.
+    """
     if pivot_column not in metadata_columns:
         # need to create a new list to not overwrite metadata columns
         metadata_columns = [pivot_column] + metadata_columns
-    return df[metadata_columns].drop_duplicates().set_index(pivot_column).to_dict('index')
+    return df[metadata_columns].drop_duplicates().set_index(pivot_column)
 
 def get_pivoted_data(
   df: pd.DataFrame, 
   pivot_index: List[str], 
   pivot_column: str, 
-  pivot_value: str
+  pivot_value: str,
+  on_duplicate: str = 'first',
+  question_order: Optional[QuestionOrder] = None
 ) -> pd.DataFrame:
     """
     Pivots the DataFrame based on specified index, column, and value.
 
+    Rows are in natural order of the first pivot_index column (the question
+    number, so 1.1.2 comes before 1.1.10), and rows with equal numbers in
+    order of the other pivot_index columns.
+
     Args:
         df (pd.DataFrame): The input DataFrame containing assessment data.
         pivot_index (List[str]): List of columns to set as the pivot index.
         pivot_column (str): The column to pivot on.
         pivot_value (str): The value column to aggregate.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once:
+            'first', 'last' or 'error' (see pivot_engine.pivot_answers). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks of the question numbers, updated with
+            new ones. Defaults to None (ranked from this export's numbers).
 
     Returns:
-        pd.DataFrame: The pivoted DataFrame.
+        pd.DataFrame: The pivoted DataFrame; attrs['conflicts'] lists cells with different answers.
     """
-    pivot_df = df.pivot_table(
+    pivot_df = pivot_answers(
+        df,
         index=pivot_index,
         columns=pivot_column,
         values=pivot_value,
-        aggfunc='first'
+        on_duplicate=on_duplicate
     ).reset_index()
-    return pivot_df
+    numbers = pivot_df[pivot_index[0]]
+    if question_order is None:
+        question_order = QuestionOrder(numbers)
+    # the pivot sorts rows by value, so a stable sort on the rank keeps equal numbers in that order
+    return pivot_df.iloc[question_order.argsort(numbers)].reset_index(drop=True)
 
 def get_new_columns(
     pivot_df: pd.DataFrame, 
@@ -67,26 +109,76 @@ def get_new_columns(
     Returns:
         List[Tuple]: A list of tuples representing the new MultiIndex columns.
     """
-    new_columns = []
-    metadata_count = len(assessment_metadata)
-    for col in pivot_df.columns:
-        if col in metadata.keys(): 
-            assessment_id = int(col)
-            metadata_for_col = metadata.get(assessment_id, {})
-            # handle null or empty
-            metadata_as_list = [metadata_for_col.get(key, '') or '' for key in assessment_metadata]
-            metadata_as_list.append(pivot_value)
-            new_columns.append(tuple(metadata_as_list))
-        else:
-            new_columns.append( ('',) * metadata_count + (col,))
-    return new_columns
+    metadata_df = pd.DataFrame.from_dict(metadata, orient='index')
+    return list(get_new_column_index(pivot_df, metadata_df, assessment_metadata, pivot_value))
+
+def get_new_column_index(
+    pivot_df: pd.DataFrame,
+    metadata_df: pd.DataFrame,
+    assessment_metadata: List[str],
+    pivot_value: str
+) -> pd.MultiIndex:
+    """
+    Constructs the MultiIndex header column by column instead of tuple by tuple.
+
+    The metadata fields are aligned with a single reindex and the rows are
+    taken in pivoted column order by position. Pivoted columns that are not assessment IDs get empty metadata
+    and keep their own name on the last level. Null or falsy metadata values
+    become empty strings.
+
+    Args:
+        pivot_df (pd.DataFrame): The pivoted DataFrame.
+        metadata_df (pd.DataFrame): Metadata indexed by assessment ID, as returned by get_meta_data_frame.
+        assessment_metadata (List[str]): List of metadata fields.
+        pivot_value (str): The name of the value column.
+
+    Returns:
+        pd.MultiIndex: One header level per metadata field plus the value name.
+    """
+    columns = pivot_df.columns
+    positions = metadata_df.index.get_indexer(columns)
+    is_assessment = positions >= 0
+    aligned = metadata_df.reindex(columns=assessment_metadata)
+    arrays = []
+    for key in assessment_metadata:
+        values = np.full(len(columns), '', dtype=object)
+        values[is_assessment] = aligned[key].to_numpy(dtype=object)[positions[is_assessment]]
+        # handle null or empty
+        values[pd.isna(values) | ~values.astype(bool)] = ''
+        arrays.append(values.tolist())
+    arrays.append(np.where(is_assessment, pivot_value, columns.to_numpy(dtype=object)).tolist())
+    return pd.MultiIndex.from_arrays(arrays)
+
+def get_report_columns(
+    assessment_metadata: List[str],
+    pivot_index: List[str],
+    pivot_column: str,
+    pivot_value: str
+) -> List[str]:
+    """
+    Lists the export columns the comparison report reads.
+
+    Args:
+        assessment_metadata (List[str]): List of metadata fields to include.
+        pivot_index (List[str]): List of columns to set as the pivot index.
+        pivot_column (str): The column to pivot on.
+        pivot_value (str): The value column to aggregate.
+
+    Returns:
+        List[str]: The required column names.
+    """
+    return unique_columns([pivot_column], assessment_metadata, pivot_index, [pivot_value])
 
 def transform_export(
     df: pd.DataFrame,
     assessment_metadata: List[str],
     pivot_index: List[str],
     pivot_column: str,
-    pivot_value: str
+    pivot_value: str,
+    metadata_df: Optional[pd.DataFrame] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first',
+    question_order: Optional[QuestionOrder] = None
 ) -> pd.DataFrame:
     """
     Transforms the exported DataFrame into the new report format.
@@ -97,49 +189,292 @@ def transform_export(
         pivot_index (List[str]): List of columns to set as the pivot index.
         pivot_column (str): The column to pivot on.
         pivot_value (str): The value column to aggregate.
+        metadata_df (pd.DataFrame, optional): Frame to read assessment metadata from
+            when df only carries the pivot columns. Defaults to df.
+        instrumentation (Instrumentation, optional): Records the pivot, metadata
+            and header stages. Defaults to None (not recorded).
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks that order the question rows naturally;
+            updated with new question numbers. Defaults to None (ranked from this export).
 
     Returns:
         pd.DataFrame: The transformed DataFrame ready for reporting.
     """
-    pivot_df = get_pivoted_data(df, pivot_index, pivot_column, pivot_value)
-    metadata = get_meta_data_fields(df, assessment_metadata, pivot_column)
-    new_columns = get_new_columns(pivot_df, metadata, assessment_metadata, pivot_value)
-    pivot_df.columns = pd.MultiIndex.from_tuples(new_columns)
+    with instrumented(instrumentation):
+        with stage('pivot') as record:
+            pivot_df = get_pivoted_data(df, pivot_index, pivot_column, pivot_value, on_duplicate, question_order)
+            record.set_output(pivot_df)
+        if metadata_df is None:
+            metadata_df = df
+        with stage('metadata') as record:
+            metadata = get_meta_data_frame(metadata_df, assessment_metadata, pivot_column)
+            record.set_output(metadata)
+        with stage('header') as record:
+            pivot_df.columns = get_new_column_index(pivot_df, metadata, assessment_metadata, pivot_value)
+            record.set_output(pivot_df)
     return pivot_df
 
-def main(
-    input_csv_path: str,
-    output_csv_path: str,
+def transform_coded_export(
+    coded: CodedExport,
     assessment_metadata: List[str],
     pivot_index: List[str],
     pivot_column: str,
-    pivot_value: str
-) -> None:
+    pivot_value: str,
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first',
+    question_order: Optional[QuestionOrder] = None
+) -> pd.DataFrame:
     """
-    Main function to execute the data transformation.
+    Transforms a coded export into the new report format.
+
+    The pivot runs on categorical columns rebuilt from the codes and the
+    header metadata comes from the assessments table, so strings are only
+    materialized for the report itself.
 
     Args:
-        input_csv_path (str): Path to the input CSV file.
-        output_csv_path (str): Path where the output CSV will be saved.
+        coded (CodedExport): The export, coded with pivot_column and the
+            assessment_metadata as assessment columns and pivot_value as answer column.
         assessment_metadata (List[str]): List of metadata fields to include.
         pivot_index (List[str]): List of columns to set as the pivot index.
         pivot_column (str): The column to pivot on.
         pivot_value (str): The value column to aggregate.
+        instrumentation (Instrumentation, optional): Records the pivot, metadata
+            and header stages. Defaults to None (not recorded).
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks that order the question rows naturally;
+            updated with new question numbers. Defaults to None (ranked from the question catalog).
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame ready for reporting.
     """
-    # Read input data
-    df = pd.read_csv(input_csv_path)
-    
-    # Transform data
-    transformed_df = transform_export(
-        df,
+    if question_order is None:
+        question_order = QuestionOrder(coded.questions[pivot_index[0]])
+    return transform_export(
+        coded.to_frame(unique_columns(pivot_index, [pivot_column, pivot_value])),
         assessment_metadata,
         pivot_index,
         pivot_column,
-        pivot_value
+        pivot_value,
+        metadata_df=coded.assessments,
+        instrumentation=instrumentation,
+        on_duplicate=on_duplicate,
+        question_order=question_order
     )
-    
-    # Output the transformed data
-    transformed_df.to_csv(output_csv_path, encoding='utf-8', index=False)
+
+def transform_pivot_store(
+    store: PivotStore,
+    assessment_metadata: List[str],
+    assessment_ids: Optional[Sequence] = None,
+    instrumentation: Optional[Instrumentation] = None
+) -> pd.DataFrame:
+    """
+    Builds the report for some assessments from a pivot store, without pivoting again.
+
+    Only the grid columns of the selected assessments are read from the
+    memory-mapped store. The result equals transform_export on those
+    assessments' export rows.
+
+    Args:
+        store (PivotStore): The pivoted export, see pivot_store.build_pivot_store.
+        assessment_metadata (List[str]): List of metadata fields to include; the store must hold them.
+        assessment_ids (Sequence, optional): pivot_column values to report on. Defaults to every assessment.
+        instrumentation (Instrumentation, optional): Records the pivot, metadata
+            and header stages. Defaults to None (not recorded).
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame ready for reporting.
+
+    Raises:
+        KeyError: If an assessment is not in the store.
+    """
+    with instrumented(instrumentation):
+        with stage('pivot') as record:
+            pivot_df = store.pivot(assessment_ids)
+            record.set_output(pivot_df)
+        with stage('metadata') as record:
+            metadata = store.metadata(assessment_metadata, assessment_ids)
+            record.set_output(metadata)
+        with stage('header') as record:
+            pivot_df.columns = get_new_column_index(pivot_df, metadata, assessment_metadata, store.pivot_value)
+            record.set_output(pivot_df)
+    return pivot_df
+
+def store_main(
+    store_path: str,
+    output_csv_path: str,
+    assessment_metadata: List[str],
+    assessment_ids: Optional[Sequence] = None,
+    output_format: Optional[str] = None,
+    instrumentation: Optional[Instrumentation] = None
+) -> None:
+    """
+    Writes the report for some assessments from a pivot store.
+
+    Args:
+        store_path (str): Directory of the pivot store, see pivot_store.write_pivot_store.
+        output_csv_path (str): Path where the output CSV (or Parquet/Arrow IPC/XLSX) will be saved.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        assessment_ids (Sequence, optional): pivot_column values to report on. Defaults to every assessment.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        instrumentation (Instrumentation, optional): Records wall time, peak memory and
+            output shape of the read, pivot, metadata, header and write stages. Defaults to None.
+    """
+    with instrumented(instrumentation):
+        with stage('read') as record:
+            store = PivotStore.open(store_path)
+            record.set_output(store.codes)
+        transformed_df = transform_pivot_store(store, assessment_metadata, assessment_ids)
+        with stage('write') as record:
+            write_report(
+                transformed_df, output_csv_path, output_format, encoding='utf-8',
+                key_columns=len(store.pivot_index))
+            record.set_output(transformed_df)
+
+def main(
+    input_csv_path: Union[str, Sequence[str]],
+    output_csv_path: str,
+    assessment_metadata: List[str],
+    pivot_index: List[str],
+    pivot_column: str,
+    pivot_value: str,
+    encoding: str = 'utf-8',
+    chunksize: Optional[int] = None,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    cache: Optional[ResultCache] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    shard_key: Optional[List[str]] = None,
+    newest_by: str = 'mtime',
+    max_workers: Optional[int] = None,
+    on_duplicate: str = 'first',
+    filters: Optional[Dict[str, Any]] = None,
+    question_order_path: Optional[str] = None
+) -> None:
+    """
+    Main function to execute the data transformation.
+
+    Args:
+        input_csv_path (Union[str, Sequence[str]]): Path to the input CSV, Parquet or Arrow IPC file,
+            or a glob pattern or list of export shards (see question_catalog.load_coded_export).
+        output_csv_path (str): Path where the output CSV (or Parquet/Arrow IPC/XLSX) will be saved.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        pivot_index (List[str]): List of columns to set as the pivot index.
+        pivot_column (str): The column to pivot on.
+        pivot_value (str): The value column to aggregate.
+        encoding (str, optional): Encoding for the output CSV. Defaults to 'utf-8'.
+        chunksize (int, optional): Read the export in chunks of this many rows so
+            memory follows the report size instead of the export size. Defaults to None (read at once).
+            Shards are always coded chunk by chunk.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the input file extension.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        cache (ResultCache, optional): Reuse the transformed report of an earlier run on the
+            same export contents and arguments. Defaults to None (always transform).
+        instrumentation (Instrumentation, optional): Records wall time, peak memory and
+            output shape of the read, pivot, metadata, header and write stages. Defaults to None.
+        shard_key (List[str], optional): Columns identifying one answer across shards; the
+            newest shard's answers win. Defaults to assessmentId and questionNumber.
+        newest_by (str, optional): 'mtime' or 'order' (last given is newest). Defaults to 'mtime'.
+        max_workers (int, optional): Shards read at once. Defaults to the thread pool default.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        filters (Dict[str, Any], optional): Equality/IN filters on export columns, e.g.
+            {'period': 2024, 'industry': ['IT', 'Finance']}, and export_loader.ValueRange
+            filters, e.g. {'grade': ValueRange(50, 80)}. They are applied to every chunk as it
+            is read, so only the selected slice is kept. Defaults to None (every row).
+        question_order_path (str, optional): JSON file keeping the natural order of the question
+            numbers across runs (see question_catalog.QuestionOrder); created when missing and
+            updated with new numbers. Defaults to None (ordered from this export alone).
+    """
+    question_order = QuestionOrder.load(question_order_path) if question_order_path else None
+    input_paths = order_by_age(expand_input_paths(input_csv_path), newest_by)
+    # the chunked reader keeps each distinct answer per cell once, in order, which loses the last
+    # answer when an earlier one repeats it, so 'last' reads the coded export
+    streaming = bool(chunksize) and len(input_paths) == 1 and on_duplicate != 'last'
+
+    def read_and_transform() -> pd.DataFrame:
+        # Read input data
+        with stage('read') as record:
+            if streaming:
+                df, metadata_df = read_export_streaming(
+                    input_paths[0],
+                    key_columns=pivot_index + [pivot_column],
+                    value_column=pivot_value,
+                    metadata_columns=unique_columns([pivot_column], assessment_metadata),
+                    chunksize=chunksize,
+                    file_format=input_format,
+                    filters=filters
+                )
+                record.set_output(df)
+            else:
+                coded = load_coded_export(
+                    input_paths,
+                    assessment_columns=unique_columns([pivot_column], assessment_metadata),
+                    question_columns=pivot_index,
+                    answer_column=pivot_value,
+                    chunksize=chunksize or DEFAULT_CHUNKSIZE,
+                    file_format=input_format,
+                    key_columns=shard_key,
+                    newest_by='order',
+                    max_workers=max_workers,
+                    filters=filters
+                )
+                record.set_output(coded)
+
+        # Transform data
+        if streaming:
+            report_df = transform_export(
+                df,
+                assessment_metadata,
+                pivot_index,
+                pivot_column,
+                pivot_value,
+                metadata_df,
+                on_duplicate=on_duplicate,
+                question_order=question_order
+            )
+        else:
+            report_df = transform_coded_export(
+                coded,
+                assessment_metadata,
+                pivot_index,
+                pivot_column,
+                pivot_value,
+                on_duplicate=on_duplicate,
+                question_order=question_order
+            )
+        if question_order is not None:
+            # saved only here: a cached report never loads new numbers into the order
+            question_order.save(question_order_path)
+        return report_df
+
+    with instrumented(instrumentation):
+        transformed_df = cached_result(
+            cache,
+            input_paths,
+            {
+                'report': 'assessment_comparison',
+                'input_format': input_format,
+                'shard_key': shard_key,
+                'filters': filters,
+                'assessment_metadata': assessment_metadata,
+                'pivot_index': pivot_index,
+                'pivot_column': pivot_column,
+                'pivot_value': pivot_value,
+                'on_duplicate': on_duplicate,
+            },
+            read_and_transform
+        )
+
+        # Output the transformed data
+        with stage('write') as record:
+            write_report(
+                transformed_df, output_csv_path, output_format, encoding=encoding, key_columns=len(pivot_index))
+            record.set_output(transformed_df)
 
 if __name__ == "__main__":
     start_time = time.perf_counter()
@@ -0,0 +1,211 @@
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional
+
+import assessment_comparison_report
+import questions_as_columns
+from export_loader import filter_mask, load_export, read_export_columns, unique_columns
+from report_writer import write_report
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPES = ('comparison', 'questions_as_columns')
+
+# The parsed export, shared with forked workers instead of being pickled to them.
+_BATCH_EXPORT: Optional[pd.DataFrame] = None
+
+
+@dataclass
+class ReportSpec:
+    """
+    One report to build from the shared export.
+
+    Attributes:
+        name (str): Label used in results and logs.
+        output_path (str): Path where the report will be saved.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        report (str): 'comparison' or 'questions_as_columns'.
+        filters (Dict[str, Any]): Equality/IN filters applied to the export rows first.
+        pivot_index (List[str]): Pivot index of the comparison report.
+        pivot_column (str): The column to pivot on.
+        pivot_value (str): The value column to aggregate.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+    """
+    name: str
+    output_path: str
+    assessment_metadata: List[str]
+    report: str = 'comparison'
+    filters: Dict[str, Any] = field(default_factory=dict)
+    pivot_index: List[str] = field(default_factory=lambda: ['questionNumber', 'questionText'])
+    pivot_column: str = 'assessmentId'
+    pivot_value: str = 'answer'
+    output_format: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> 'ReportSpec':
+        spec = dict(spec)
+        if spec.get('report', 'comparison') == 'questions_as_columns':
+            spec.setdefault('pivot_column', 'question')
+        return cls(**spec)
+
+    def required_columns(self) -> List[str]:
+        """
+        Lists the export columns this spec reads, including its filter columns.
+
+        Returns:
+            List[str]: The required column names.
+        """
+        if self.report == 'comparison':
+            columns = assessment_comparison_report.get_report_columns(
+                self.assessment_metadata, self.pivot_index, self.pivot_column, self.pivot_value)
+        else:
+            columns = questions_as_columns.get_report_columns(
+                self.assessment_metadata, pivot_column=self.pivot_column, pivot_value=self.pivot_value)
+        return unique_columns(columns, list(self.filters))
+
+    def key_columns(self) -> int:
+        """
+        Counts the leading report columns that identify a report row.
+
+        Returns:
+            int: The pivot index columns of a comparison report, or the metadata columns otherwise.
+        """
+        return len(self.pivot_index if self.report == 'comparison' else self.assessment_metadata)
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of one report spec.
+
+    Attributes:
+        name (str): The spec name.
+        output_path (str): Where the report was (or would have been) written.
+        seconds (float): Time spent building and writing the report.
+        shape (tuple): Rows and columns of the written report.
+        error (str, optional): Traceback when the spec failed.
+    """
+    name: str
+    output_path: str
+    seconds: float = 0.0
+    shape: tuple = (0, 0)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def build_report(df: pd.DataFrame, spec: ReportSpec) -> pd.DataFrame:
+    """
+    Builds one report from the already parsed export.
+
+    Args:
+        df (pd.DataFrame): The parsed export.
+        spec (ReportSpec): The report to build.
+
+    Returns:
+        pd.DataFrame: The transformed report.
+    """
+    if spec.report not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type {spec.report!r}; expected one of {REPORT_TYPES}")
+    if spec.filters:
+        df = df[filter_mask(df, spec.filters)]
+    # questions_as_columns adds its combined question column to the frame it gets
+    df = df.copy(deep=False)
+    if spec.report == 'comparison':
+        return assessment_comparison_report.transform_export(
+            df, spec.assessment_metadata, spec.pivot_index, spec.pivot_column, spec.pivot_value)
+    return questions_as_columns.transform_export(
+        df, spec.assessment_metadata, pivot_column=spec.pivot_column, pivot_value=spec.pivot_value)
+
+
+def _run_spec(spec: ReportSpec) -> BatchResult:
+    start_time = time.perf_counter()
+    try:
+        report_df = build_report(_BATCH_EXPORT, spec)
+        write_report(report_df, spec.output_path, spec.output_format, key_columns=spec.key_columns())
+    except Exception:
+        return BatchResult(
+            spec.name, spec.output_path, time.perf_counter() - start_time, error=traceback.format_exc())
+    return BatchResult(spec.name, spec.output_path, time.perf_counter() - start_time, report_df.shape)
+
+
+def run_batch(
+    input_path: str,
+    specs: List[ReportSpec],
+    max_workers: Optional[int] = None,
+    input_format: Optional[str] = None,
+    on_result: Optional[Callable[[BatchResult], None]] = None
+) -> List[BatchResult]:
+    """
+    Parses the export once and builds every report spec from it.
+
+    Reports are built across a process pool. Workers are forked after the
+    export is loaded, so they share its memory copy-on-write instead of each
+    receiving a pickled copy; each worker writes its report as soon as it is
+    built. Where fork is not available, or max_workers is 0, the specs run
+    one after another in this process. A failing spec is recorded in its
+    result and does not stop the rest of the batch; specs naming columns the
+    export does not have fail before it is loaded, and only the columns of
+    the other specs are read.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        specs (List[ReportSpec]): The reports to build.
+        max_workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the input file extension.
+        on_result (Callable[[BatchResult], None], optional): Called with each result as it completes.
+
+    Returns:
+        List[BatchResult]: One result per spec, in the order of specs.
+    """
+    global _BATCH_EXPORT
+    results = {}
+
+    def record(position: int, result: BatchResult) -> None:
+        results[position] = result
+        if not result.ok:
+            logger.warning("Report %s failed:\n%s", result.name, result.error)
+        if on_result is not None:
+            on_result(result)
+
+    export_columns = set(read_export_columns(input_path, input_format))
+    valid_specs = {}
+    for position, spec in enumerate(specs):
+        missing = [col for col in spec.required_columns() if col not in export_columns]
+        if missing:
+            record(position, BatchResult(
+                spec.name, spec.output_path, error=f"Columns not in the export: {', '.join(map(str, missing))}"))
+        else:
+            valid_specs[position] = spec
+    if not valid_specs:
+        return [results[position] for position in range(len(specs))]
+
+    columns = unique_columns(*[spec.required_columns() for spec in valid_specs.values()])
+    _BATCH_EXPORT, _ = load_export(input_path, columns, file_format=input_format)
+    try:
+        if max_workers == 0 or 'fork' not in multiprocessing.get_all_start_methods():
+            for position, spec in valid_specs.items():
+                record(position, _run_spec(spec))
+        else:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                futures = {executor.submit(_run_spec, spec): position for position, spec in valid_specs.items()}
+                for future in as_completed(futures):
+                    position = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception:
+                        # the worker died, e.g. killed for running out of memory
+                        spec = specs[position]
+                        result = BatchResult(spec.name, spec.output_path, error=traceback.format_exc())
+                    record(position, result)
+    finally:
+        _BATCH_EXPORT = None
+    return [results[position] for position in range(len(specs))]
@@ -0,0 +1,51 @@
+import argparse
+import time
+import pandas as pd
+
+from pivot_engine import pivot_first
+from synthetic_export import make_export
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def run_pivot_table(df: pd.DataFrame) -> pd.DataFrame:
+    return df.pivot_table(
+        index=['questionNumber', 'questionText'],
+        columns='assessmentId',
+        values='answer',
+        aggfunc='first'
+    )
+
+
+def run_pivot_first(df: pd.DataFrame) -> pd.DataFrame:
+    return pivot_first(df, ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+
+
+def main(assessments: int, questions: int, repeat: int, check: bool) -> None:
+    df = make_export(assessments, questions)[['assessmentId', 'questionNumber', 'questionText', 'answer']]
+    print(f"Rows: {len(df)} ({assessments} assessments x {questions} questions)")
+    if check:
+        pd.testing.assert_frame_equal(run_pivot_first(df), run_pivot_table(df))
+        print("pivot_first matches pivot_table")
+    pivot_table_time = best_of(repeat, run_pivot_table, df)
+    pivot_first_time = best_of(repeat, run_pivot_first, df)
+    print(f"pivot_table(aggfunc='first'): {pivot_table_time:.4f} seconds")
+    print(f"pivot_first:                  {pivot_first_time:.4f} seconds")
+    print(f"Speedup: {pivot_table_time / pivot_first_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pivot_first against pivot_table.")
+    parser.add_argument('--assessments', type=int, default=10000)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--check', action='store_true', help="verify both pivots give the same table")
+    args = parser.parse_args()
+    main(args.assessments, args.questions, args.repeat, args.check)
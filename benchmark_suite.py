@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+import assessment_comparison_report
+import questions_as_columns
+from instrumentation import Instrumentation
+from synthetic_export import write_export
+
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+PIVOT_INDEX = ['questionNumber', 'questionText']
+
+# Stages shorter than this in both runs are too noisy to flag as regressions.
+DEFAULT_MIN_SECONDS = 0.05
+DEFAULT_TOLERANCE = 0.2
+
+
+def stage_seconds(instrumentation: Instrumentation) -> Dict[str, float]:
+    return {record.name: record.seconds for record in instrumentation.records}
+
+
+def run_comparison(input_path: str, output_path: str) -> Dict[str, float]:
+    """
+    Runs the assessment comparison report and times its stages.
+
+    Args:
+        input_path (str): Path to the export.
+        output_path (str): Path where the report will be saved.
+
+    Returns:
+        Dict[str, float]: Seconds spent in read, pivot, metadata, header and write.
+    """
+    instrumentation = Instrumentation(trace_memory=False)
+    assessment_comparison_report.main(
+        input_path,
+        output_path,
+        ASSESSMENT_METADATA,
+        PIVOT_INDEX,
+        'assessmentId',
+        'answer',
+        instrumentation=instrumentation
+    )
+    return stage_seconds(instrumentation)
+
+
+def run_questions_as_columns(input_path: str, output_path: str) -> Dict[str, float]:
+    """
+    Runs the questions-as-columns report and times its stages.
+
+    The report has no separate metadata lookup, as the metadata is its pivot
+    index; it builds the combined question column instead. Its header stage
+    is the natural sort of the question columns.
+
+    Args:
+        input_path (str): Path to the export.
+        output_path (str): Path where the report will be saved.
+
+    Returns:
+        Dict[str, float]: Seconds spent in read, question, pivot, header and write.
+    """
+    instrumentation = Instrumentation(trace_memory=False)
+    questions_as_columns.main(input_path, output_path, ASSESSMENT_METADATA, instrumentation=instrumentation)
+    return stage_seconds(instrumentation)
+
+
+REPORTS = {
+    'comparison': run_comparison,
+    'questions_as_columns': run_questions_as_columns,
+}
+
+
+def run_suite(
+    input_path: str,
+    work_dir: str,
+    repeat: int = 3,
+    reports: Optional[List[str]] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Times every stage of the reports, keeping the best of several runs per stage.
+
+    Args:
+        input_path (str): Path to the export.
+        work_dir (str): Directory for the written reports.
+        repeat (int, optional): Runs per report. Defaults to 3.
+        reports (List[str], optional): Reports to run. Defaults to all of REPORTS.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Best seconds per report and stage, plus a 'total' per report.
+    """
+    results = {}
+    for report in reports or list(REPORTS):
+        best = {}
+        for _ in range(repeat):
+            seconds = REPORTS[report](input_path, os.path.join(work_dir, f'{report}.csv'))
+            for stage, value in seconds.items():
+                best[stage] = min(value, best.get(stage, value))
+        best['total'] = sum(best.values())
+        results[report] = best
+    return results
+
+
+def compare_results(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE,
+    min_seconds: float = DEFAULT_MIN_SECONDS
+) -> List[Dict[str, Any]]:
+    """
+    Finds the stages that got slower than a baseline run.
+
+    A stage regresses when it takes more than (1 + tolerance) times its
+    baseline time and at least min_seconds longer. Stages missing from
+    either run are skipped.
+
+    Args:
+        current (Dict[str, Dict[str, float]]): Results of this run, as returned by run_suite.
+        baseline (Dict[str, Dict[str, float]]): Results of the baseline run.
+        tolerance (float, optional): Allowed relative slowdown. Defaults to 0.2.
+        min_seconds (float, optional): Smallest absolute slowdown to flag. Defaults to 0.05.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per regressed stage with its report, stage, times and ratio.
+    """
+    regressions = []
+    for report, stages in current.items():
+        for stage, seconds in stages.items():
+            baseline_seconds = baseline.get(report, {}).get(stage)
+            if baseline_seconds is None:
+                continue
+            if seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds >= min_seconds:
+                regressions.append({
+                    'report': report,
+                    'stage': stage,
+                    'seconds': seconds,
+                    'baseline_seconds': baseline_seconds,
+                    'ratio': seconds / baseline_seconds if baseline_seconds else float('inf'),
+                })
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def main(
+    assessments: int,
+    questions: int,
+    text_length: int,
+    answer_length: int,
+    repeat: int,
+    reports: Optional[List[str]] = None,
+    output_path: Optional[str] = None,
+    baseline_path: Optional[str] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    min_seconds: float = DEFAULT_MIN_SECONDS,
+    input_path: Optional[str] = None
+) -> int:
+    """
+    Generates a synthetic export, benchmarks both reports on it and prints the JSON results.
+
+    Args:
+        assessments (int): Number of synthetic assessments.
+        questions (int): Questions per assessment.
+        text_length (int): Characters of every question text.
+        answer_length (int): Characters of every free text answer.
+        repeat (int): Runs per report.
+        reports (List[str], optional): Reports to run. Defaults to all.
+        output_path (str, optional): Also save the results here, e.g. as a new baseline.
+        baseline_path (str, optional): Results to compare against.
+        tolerance (float, optional): Allowed relative slowdown per stage. Defaults to 0.2.
+        min_seconds (float, optional): Smallest absolute slowdown to flag. Defaults to 0.05.
+        input_path (str, optional): Benchmark this export instead of a synthetic one.
+
+    Returns:
+        int: Exit status, 1 when a stage regressed against the baseline.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        config = {'repeat': repeat}
+        if input_path is None:
+            input_path = os.path.join(work_dir, 'export.csv')
+            start_time = time.perf_counter()
+            rows = write_export(
+                input_path, assessments, questions, text_length=text_length, answer_length=answer_length)
+            config.update({
+                'assessments': assessments,
+                'questions': questions,
+                'text_length': text_length,
+                'answer_length': answer_length,
+                'rows': rows,
+                'generate_seconds': time.perf_counter() - start_time,
+            })
+        else:
+            config['input_path'] = input_path
+        config['input_bytes'] = os.path.getsize(input_path)
+        results = run_suite(input_path, work_dir, repeat, reports)
+
+    document = {'config': config, 'environment': environment(), 'results': results}
+    status = 0
+    if baseline_path is not None:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('rows') != config.get('rows'):
+            print("warning: the baseline was run on a different export size", file=sys.stderr)
+        document['regressions'] = compare_results(results, baseline['results'], tolerance, min_seconds)
+        for regression in document['regressions']:
+            print(
+                "REGRESSION {report}.{stage}: {seconds:.4f}s vs {baseline_seconds:.4f}s ({ratio:.2f}x)".format(
+                    **regression),
+                file=sys.stderr
+            )
+        status = 1 if document['regressions'] else 0
+
+    encoded = json.dumps(document, indent=2)
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(encoded + '\n')
+    print(encoded)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage of both reports on a synthetic export.")
+    parser.add_argument('--assessments', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--text-length', type=int, default=200)
+    parser.add_argument('--answer-length', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--report', action='append', choices=list(REPORTS), dest='reports',
+                        help="report to run; repeat for several (default: all)")
+    parser.add_argument('--input', dest='input_path', help="benchmark this export instead of a synthetic one")
+    parser.add_argument('--output', help="save the JSON results, e.g. as a baseline")
+    parser.add_argument('--compare', dest='baseline', help="flag stages slower than this saved result")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS)
+    args = parser.parse_args()
+    sys.exit(main(
+        args.assessments,
+        args.questions,
+        args.text_length,
+        args.answer_length,
+        args.repeat,
+        args.reports,
+        args.output,
+        args.baseline,
+        args.tolerance,
+        args.min_seconds,
+        args.input_path
+    ))
@@ -0,0 +1,571 @@
+import logging
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from export_paths import expand_input_paths, order_by_age, unique_columns
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# File extensions of the formats exports and reports can be stored in.
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.xlsx': 'xlsx',
+}
+
+# Formats only reports are written in; exports cannot be read from them.
+OUTPUT_ONLY_FORMATS = ('xlsx',)
+
+# A string column stays categorical while it has at most this many distinct values per row.
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# Rows read with plain read_csv to estimate what loading the whole export would cost.
+BASELINE_SAMPLE_ROWS = 10_000
+
+_BOOLEAN_STRINGS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+
+@dataclass(frozen=True)
+class ValueRange:
+    """
+    An inclusive range filter on a numeric column, e.g. grade or evaluationScore.
+
+    Rows whose value is missing or not numeric never match.
+
+    Attributes:
+        low (float, optional): Smallest matching value; None for no lower bound.
+        high (float, optional): Largest matching value; None for no upper bound.
+    """
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+    @classmethod
+    def parse(cls, text: str) -> 'ValueRange':
+        """
+        Reads a range written as 'low..high', where either bound may be left out.
+
+        Args:
+            text (str): e.g. '50..80', '50..' or '..3.5'.
+
+        Returns:
+            ValueRange: The range.
+
+        Raises:
+            ValueError: If the text is not a range of numbers.
+        """
+        low, separator, high = text.partition('..')
+        if not separator:
+            raise ValueError(f"Not a range: {text!r}; expected 'low..high'")
+        return cls(float(low) if low.strip() else None, float(high) if high.strip() else None)
+
+    def mask(self, values: pd.Series) -> np.ndarray:
+        numbers = _numeric_values(values)
+        mask = ~np.isnan(numbers)
+        if self.low is not None:
+            mask &= numbers >= self.low
+        if self.high is not None:
+            mask &= numbers <= self.high
+        return mask
+
+
+def _numeric_values(values: pd.Series) -> np.ndarray:
+    """Reads a column as floats, NaN where a value is missing or not a number; text is converted once per distinct value."""
+    if pd.api.types.is_numeric_dtype(values.dtype) and values.dtype != bool:
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    codes, uniques = pd.factorize(values)
+    numbers = pd.to_numeric(pd.Series(np.asarray(uniques, dtype=object)), errors='coerce').to_numpy(dtype=float)
+    return np.where(codes >= 0, numbers[codes], np.nan)
+
+
+def filter_mask(df: pd.DataFrame, filters: Dict[str, Any]) -> np.ndarray:
+    """
+    Selects the rows matching every equality, IN or range filter.
+
+    Args:
+        df (pd.DataFrame): The export rows.
+        filters (Dict[str, Any]): Column name to a single value (equality), a list, tuple
+            or set of values (IN) or a ValueRange. Values for numeric columns may be given
+            as strings, and numbers match columns read as text, e.g. CSV chunks read with dtype=str.
+
+    Returns:
+        np.ndarray: Boolean mask of the matching rows.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filters.items():
+        if isinstance(value, ValueRange):
+            mask &= value.mask(df[col])
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        if pd.api.types.is_numeric_dtype(df[col].dtype):
+            # filters given as text, e.g. from a query string or the command line
+            values = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').dropna().tolist()
+            mask &= df[col].isin(values).to_numpy()
+            continue
+        text_values = [item for item in values if isinstance(item, str)]
+        column_mask = df[col].isin(text_values).to_numpy()
+        numbers = [item for item in values if not isinstance(item, str)]
+        if numbers:
+            # numbers against a column of text: compare as numbers, so 2023 matches '2023'
+            column_mask |= np.isin(_numeric_values(df[col]), np.asarray(numbers, dtype=float))
+        mask &= column_mask
+    return mask
+
+
+def detect_format(path: str, file_format: Optional[str] = None) -> str:
+    """
+    Works out the file format from an explicit value or the file extension.
+
+    Args:
+        path (str): Path to the file.
+        file_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the extension of path.
+
+    Returns:
+        str: The file format.
+
+    Raises:
+        ValueError: If the format is unknown or cannot be told from the extension.
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in FILE_FORMATS:
+            raise ValueError(f"Cannot tell the file format of {path!r}; pass one of {sorted(set(FILE_FORMATS.values()))}")
+        return FILE_FORMATS[extension]
+    if file_format not in FILE_FORMATS.values():
+        raise ValueError(f"Unknown file format {file_format!r}; expected one of {sorted(set(FILE_FORMATS.values()))}")
+    return file_format
+
+
+def read_export_columns(input_path: str, file_format: Optional[str] = None) -> List[str]:
+    """
+    Reads the column names of an export without reading its rows.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+
+    Returns:
+        List[str]: The export's columns, in file order.
+    """
+    file_format = detect_format(input_path, file_format)
+    if file_format in OUTPUT_ONLY_FORMATS:
+        raise ValueError(f"Exports cannot be read from {file_format}; use CSV, Parquet or Arrow IPC")
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(input_path).names
+    if file_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(input_path) as source:
+            return pa.ipc.open_file(source).schema.names
+    return list(pd.read_csv(input_path, nrows=0).columns)
+
+
+def iter_export_chunks(
+    input_path: str,
+    columns: Optional[List[str]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    dtype: Optional[type] = None,
+    file_format: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads the export in bounded chunks.
+
+    Parquet and Arrow IPC files only read the requested columns from disk.
+    Filters are applied to every chunk as it is read, so rows outside the
+    slice are dropped before any caller keeps them; chunks left empty are skipped.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        columns (List[str], optional): Columns to read. Defaults to all columns.
+        chunksize (int, optional): Number of rows per chunk. Defaults to DEFAULT_CHUNKSIZE.
+        dtype (type, optional): dtype passed to read_csv for every column (CSV only). Defaults to inference.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+        filters (Dict[str, Any], optional): Equality, IN and range filters, see filter_mask.
+            Filter columns are read even when columns leaves them out. Defaults to None (every row).
+
+    Yields:
+        pd.DataFrame: The next chunk of the export.
+    """
+    if not filters:
+        yield from _read_chunks(input_path, columns, chunksize, dtype, file_format)
+        return
+    read_columns = None if columns is None else unique_columns(columns, list(filters))
+    for chunk in _read_chunks(input_path, read_columns, chunksize, dtype, file_format):
+        chunk = chunk[filter_mask(chunk, filters)]
+        if len(chunk):
+            yield chunk if columns is None else chunk[columns]
+
+
+def _read_chunks(
+    input_path: str,
+    columns: Optional[List[str]],
+    chunksize: int,
+    dtype: Optional[type],
+    file_format: Optional[str]
+) -> Iterator[pd.DataFrame]:
+    file_format = detect_format(input_path, file_format)
+    if file_format in OUTPUT_ONLY_FORMATS:
+        raise ValueError(f"Exports cannot be read from {file_format}; use CSV, Parquet or Arrow IPC")
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif file_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(input_path) as source:
+            reader = pa.ipc.open_file(source)
+            for batch_number in range(reader.num_record_batches):
+                batch = reader.get_batch(batch_number)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+    else:
+        with pd.read_csv(input_path, usecols=columns, chunksize=chunksize, dtype=dtype) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stores every string column as a categorical so repeated values are kept once.
+
+    Args:
+        df (pd.DataFrame): The frame to compact.
+
+    Returns:
+        pd.DataFrame: The frame with object columns converted to categoricals.
+    """
+    object_columns = df.select_dtypes(include='object').columns
+    if len(object_columns) == 0:
+        return df
+    return df.astype({col: 'category' for col in object_columns})
+
+
+def concat_compact(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates compacted chunks without expanding categoricals back to strings.
+
+    Args:
+        frames (List[pd.DataFrame]): Compacted chunks sharing the same columns.
+
+    Returns:
+        pd.DataFrame: The concatenated frame with a fresh RangeIndex.
+    """
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    data = {}
+    for col in frames[0].columns:
+        parts = [frame[col] for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[col] = pd.Series(union_categoricals([part.array for part in parts]))
+        else:
+            data[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data, columns=frames[0].columns)
+
+
+def _convert_categories(categories: pd.Index) -> Optional[pd.Index]:
+    """Applies read_csv's type inference to the distinct values of a string column."""
+    if len(categories) == 0:
+        return pd.Index([], dtype='float64')
+    if set(categories) <= _BOOLEAN_STRINGS.keys():
+        return pd.Index([_BOOLEAN_STRINGS[value] for value in categories], dtype=bool)
+    try:
+        return pd.to_numeric(categories)
+    except (ValueError, TypeError):
+        return None
+
+
+def infer_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Restores numeric and boolean columns in a frame that was read as strings.
+
+    Reading every chunk as strings keeps a column's type from depending on
+    which rows landed in which chunk. Type inference then runs once over the
+    distinct values of each compacted column, so the result has the dtypes a
+    single read_csv call would have given.
+
+    Args:
+        df (pd.DataFrame): A compacted frame read with dtype=str.
+
+    Returns:
+        pd.DataFrame: The frame with numeric and boolean columns converted.
+    """
+    df = df.copy()
+    for col, dtype in df.dtypes.items():
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        converted = _convert_categories(df[col].cat.categories)
+        if converted is None:
+            continue
+        codes = df[col].cat.codes.to_numpy()
+        missing = codes == -1
+        if missing.any():
+            values = np.full(len(codes), np.nan)
+            values[~missing] = converted.to_numpy(dtype=float)[codes[~missing]]
+            if converted.dtype == bool:
+                values = values.astype(object)
+                values[~missing] = converted.to_numpy()[codes[~missing]]
+        else:
+            values = converted.to_numpy()[codes]
+        df[col] = values
+    return df
+
+
+def expand_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns categorical columns back into object columns.
+
+    The values share the category strings, so this only allocates one
+    pointer per row rather than a new string per row.
+
+    Args:
+        df (pd.DataFrame): The compacted frame.
+
+    Returns:
+        pd.DataFrame: The frame with plain object columns.
+    """
+    categorical_columns = [
+        col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if not categorical_columns:
+        return df
+    return df.astype({col: object for col in categorical_columns})
+
+
+def keep_repetitive_categoricals(
+    df: pd.DataFrame,
+    max_unique_ratio: float = CATEGORICAL_MAX_UNIQUE_RATIO
+) -> pd.DataFrame:
+    """
+    Expands categorical columns whose values rarely repeat, such as free-text answers.
+
+    Args:
+        df (pd.DataFrame): The compacted frame.
+        max_unique_ratio (float, optional): Largest distinct-values-per-row ratio kept
+            as categorical. Defaults to CATEGORICAL_MAX_UNIQUE_RATIO.
+
+    Returns:
+        pd.DataFrame: The frame with only repetitive string columns left categorical.
+    """
+    if len(df) == 0:
+        return df
+    free_text_columns = [
+        col for col, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+        and len(dtype.categories) > max_unique_ratio * len(df)]
+    if not free_text_columns:
+        return df
+    return df.astype({col: object for col in free_text_columns})
+
+
+@dataclass
+class LoadReport:
+    """
+    Memory used by a projected, dictionary-encoded load.
+
+    Attributes:
+        rows (int): Number of rows loaded.
+        columns (List[str]): Columns that were read.
+        memory_bytes (int): Deep memory usage of the loaded frame.
+        baseline_memory_bytes (int): Estimated deep memory usage of a plain read_csv of every column.
+    """
+    rows: int
+    columns: List[str]
+    memory_bytes: int
+    baseline_memory_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.baseline_memory_bytes - self.memory_bytes
+
+    def summary(self) -> str:
+        saved_ratio = self.saved_bytes / self.baseline_memory_bytes if self.baseline_memory_bytes else 0.0
+        return (
+            f"Loaded {self.rows} rows x {len(self.columns)} columns in "
+            f"{self.memory_bytes / 2**20:.1f} MiB (plain read_csv: ~{self.baseline_memory_bytes / 2**20:.1f} MiB, "
+            f"saved {saved_ratio:.0%})"
+        )
+
+
+def estimate_plain_memory(
+    input_path: str,
+    rows: int,
+    sample_rows: int = BASELINE_SAMPLE_ROWS,
+    file_format: Optional[str] = None
+) -> int:
+    """
+    Estimates the deep memory usage of reading every column of the export as plain strings.
+
+    For a CSV export this is what pd.read_csv on the whole file uses.
+
+    Args:
+        input_path (str): Path to the input file.
+        rows (int): Number of data rows in the export.
+        sample_rows (int, optional): Rows to read for the estimate. Defaults to BASELINE_SAMPLE_ROWS.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+
+    Returns:
+        int: Estimated bytes, extrapolated from the first sample_rows rows.
+    """
+    sample = next(iter_export_chunks(input_path, chunksize=sample_rows, file_format=file_format), None)
+    if sample is None or len(sample) == 0:
+        return 0
+    return int(expand_frame(sample).memory_usage(deep=True).sum() / len(sample) * rows)
+
+
+def _read_compact_parts(
+    input_path: str,
+    columns: Optional[List[str]],
+    chunksize: int,
+    file_format: str,
+    filters: Optional[Dict[str, Any]] = None
+) -> Iterator[pd.DataFrame]:
+    # CSV chunks are parsed as strings so types can be inferred once over the whole export
+    dtype = str if file_format == 'csv' else None
+    for chunk in iter_export_chunks(input_path, columns, chunksize, dtype, file_format, filters):
+        yield compact_frame(chunk)
+
+
+def _finish_compact(frame: pd.DataFrame, file_format: str) -> pd.DataFrame:
+    return infer_column_types(frame) if file_format == 'csv' else frame
+
+
+def load_export(
+    input_path: str,
+    columns: Optional[List[str]],
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    report_memory: bool = True,
+    file_format: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[pd.DataFrame, Optional[LoadReport]]:
+    """
+    Loads only the columns a report needs, with repetitive strings as categoricals.
+
+    The export is parsed chunk by chunk and every chunk is dictionary-encoded
+    before the next one is read, so the full object-string frame never exists.
+    Column types match what pd.read_csv infers for the same columns.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        columns (List[str]): Columns the report uses, or None for every column.
+        chunksize (int, optional): Number of rows per chunk. Defaults to DEFAULT_CHUNKSIZE.
+        report_memory (bool, optional): Measure memory against a plain read and log it. Defaults to True.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+        filters (Dict[str, Any], optional): Equality, IN and range filters applied to every chunk
+            as it is read, see filter_mask. Defaults to None (every row).
+
+    Returns:
+        Tuple[pd.DataFrame, Optional[LoadReport]]: The loaded export and, when
+        report_memory is set, how much memory the projection and encoding saved.
+    """
+    file_format = detect_format(input_path, file_format)
+    parts = list(_read_compact_parts(input_path, columns, chunksize, file_format, filters))
+    if not parts:
+        parts = [pd.DataFrame(columns=columns)]
+    df = keep_repetitive_categoricals(_finish_compact(concat_compact(parts), file_format))
+
+    report = None
+    if report_memory:
+        report = LoadReport(
+            rows=len(df),
+            columns=list(df.columns),
+            memory_bytes=int(df.memory_usage(deep=True).sum()),
+            baseline_memory_bytes=estimate_plain_memory(input_path, len(df), file_format=file_format)
+        )
+        logger.info(report.summary())
+    return df, report
+
+
+def read_export_streaming(
+    input_path: str,
+    key_columns: List[str],
+    value_column: str,
+    metadata_columns: Optional[List[str]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    file_format: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Reads the export chunk by chunk and keeps only what a "first" pivot needs.
+
+    Rows without a value are dropped and only the first row for each key and
+    answer is kept, so the retained answers grow with the number of output
+    cells rather than with the number of input rows. A key answered
+    differently keeps each of its answers in order, so pivoting the result
+    with on_duplicate='first' gives the same table and the same conflict
+    report as pivoting the full export.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        key_columns (List[str]): Columns identifying one output cell.
+        value_column (str): The value column to pivot.
+        metadata_columns (List[str], optional): Columns to collect as deduplicated metadata rows.
+        chunksize (int, optional): Number of rows per chunk. Defaults to DEFAULT_CHUNKSIZE.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+        filters (Dict[str, Any], optional): Equality, IN and range filters applied to every chunk
+            as it is read, see filter_mask. Defaults to None (every row).
+
+    Returns:
+        Tuple[pd.DataFrame, Optional[pd.DataFrame]]: The reduced answer rows and,
+        when metadata_columns is given, the distinct metadata rows in order of first appearance.
+    """
+    file_format = detect_format(input_path, file_format)
+    answer_columns = unique_columns(key_columns, [value_column])
+    columns = unique_columns(answer_columns, metadata_columns or [])
+    answer_parts = []
+    metadata_parts = []
+    for chunk in _read_compact_parts(input_path, columns, chunksize, file_format, filters):
+        answers = chunk.loc[chunk[value_column].notna().to_numpy(), answer_columns]
+        answer_parts.append(answers.drop_duplicates())
+        if metadata_columns is not None:
+            metadata_parts.append(chunk[metadata_columns].drop_duplicates())
+
+    if not answer_parts:
+        answer_parts = [pd.DataFrame(columns=answer_columns)]
+        metadata_parts = [pd.DataFrame(columns=metadata_columns or [])]
+    answers = _finish_compact(concat_compact(answer_parts), file_format)
+    answers = expand_frame(answers.drop_duplicates()).reset_index(drop=True)
+    metadata = None
+    if metadata_columns is not None:
+        metadata = _finish_compact(concat_compact(metadata_parts), file_format)
+        metadata = expand_frame(metadata.drop_duplicates()).reset_index(drop=True)
+    return answers, metadata
+
+
+def convert_export(
+    input_csv_path: str,
+    output_path: str,
+    file_format: Optional[str] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE
+) -> None:
+    """
+    Converts a CSV export once into a Parquet or Arrow IPC cache of the same data.
+
+    Repetitive string columns are stored dictionary-encoded, so later loads
+    of the cache come back as categoricals without any parsing.
+
+    Args:
+        input_csv_path (str): Path to the input CSV file.
+        output_path (str): Path of the Parquet or Arrow IPC file to write.
+        file_format (str, optional): 'parquet' or 'arrow'. Defaults to the extension of output_path.
+        chunksize (int, optional): Number of CSV rows parsed at a time. Defaults to DEFAULT_CHUNKSIZE.
+    """
+    file_format = detect_format(output_path, file_format)
+    if file_format not in ('parquet', 'arrow'):
+        raise ValueError(f"convert_export writes Parquet or Arrow IPC, not {file_format}")
+    df, _ = load_export(input_csv_path, None, chunksize, report_memory=False, file_format='csv')
+    if file_format == 'parquet':
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_feather(output_path)
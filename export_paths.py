@@ -0,0 +1,79 @@
+import glob
+import os
+from typing import List, Sequence, Union
+
+# Only the standard library is imported here, so report_cli can resolve
+# inputs and cache keys before pandas is loaded.
+
+# How load_coded_export tells which of several shards is the newest.
+SHARD_ORDERS = ('mtime', 'order')
+
+
+def unique_columns(*column_groups: List[str]) -> List[str]:
+    """
+    Merges column lists into one list, keeping the first occurrence of each name.
+
+    Args:
+        *column_groups (List[str]): Column name lists to merge.
+
+    Returns:
+        List[str]: The merged column names in order of first appearance.
+    """
+    columns = []
+    for group in column_groups:
+        for col in group:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def expand_input_paths(input_path: Union[str, Sequence[str]]) -> List[str]:
+    """
+    Lists the export files behind a path, a glob pattern or a list of either.
+
+    Glob patterns expand to their matches in sorted order; plain paths are
+    kept as given, so a missing file still fails when it is read.
+
+    Args:
+        input_path (Union[str, Sequence[str]]): Path, glob pattern (e.g. 'exports/*.csv') or a list of them.
+
+    Returns:
+        List[str]: The files, without repeats, in the order given.
+
+    Raises:
+        FileNotFoundError: If a glob pattern matches no file.
+    """
+    patterns = [input_path] if isinstance(input_path, (str, os.PathLike)) else list(input_path)
+    paths = []
+    for pattern in map(os.fspath, patterns):
+        if any(char in pattern for char in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No export files match {pattern!r}")
+        else:
+            matches = [pattern]
+        paths.extend(matches)
+    # dict keys keep the first occurrence of each file, in order
+    return list(dict.fromkeys(paths))
+
+
+def order_by_age(paths: List[str], newest_by: str = 'mtime') -> List[str]:
+    """
+    Orders export shards from oldest to newest.
+
+    Args:
+        paths (List[str]): The shard files.
+        newest_by (str, optional): 'mtime' orders by modification time, keeping the given
+            order for equal times; 'order' takes the given order as oldest first. Defaults to 'mtime'.
+
+    Returns:
+        List[str]: The shards, oldest first.
+
+    Raises:
+        ValueError: If newest_by is unknown.
+    """
+    if newest_by not in SHARD_ORDERS:
+        raise ValueError(f"Unknown shard order {newest_by!r}; expected one of {list(SHARD_ORDERS)}")
+    if newest_by == 'order':
+        return list(paths)
+    return sorted(paths, key=lambda path: os.stat(path).st_mtime_ns)
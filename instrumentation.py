@@ -0,0 +1,241 @@
+import cProfile
+import contextvars
+import io
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The Instrumentation the current report run records into, if any.
+_active: contextvars.ContextVar[Optional['Instrumentation']] = contextvars.ContextVar(
+    'instrumentation', default=None)
+
+
+@dataclass
+class StageRecord:
+    """
+    Measurements of one pipeline stage.
+
+    Attributes:
+        name (str): The stage name, e.g. 'read' or 'pivot'.
+        seconds (float): Wall time of the stage.
+        peak_memory_bytes (int, optional): Peak traced memory during the stage; None when memory is not traced.
+        rows (int, optional): Rows of the stage output, when the stage reported it.
+        columns (int, optional): Columns of the stage output, when the stage reported it.
+    """
+    name: str
+    seconds: float = 0.0
+    peak_memory_bytes: Optional[int] = None
+    rows: Optional[int] = None
+    columns: Optional[int] = None
+
+    def set_output(self, df: Any) -> None:
+        """
+        Records the shape of the stage output.
+
+        Args:
+            df (Any): The output frame, or anything with a 2-tuple shape.
+        """
+        self.rows, self.columns = df.shape
+
+
+class _NullRecord:
+    """Stands in for a StageRecord when nothing is recorded."""
+
+    def set_output(self, df: Any) -> None:
+        pass
+
+
+class _NullStage:
+    def __enter__(self) -> _NullRecord:
+        return _NULL_RECORD
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_RECORD = _NullRecord()
+_NULL_STAGE = _NullStage()
+
+
+class Instrumentation:
+    """
+    Records wall time, peak memory and output shape of every report stage.
+
+    Pass one to a report's main or transform_export. Stages run while it is
+    active are appended to records and passed to every hook as they finish.
+    Without an active Instrumentation, stage() returns a shared no-op context
+    manager, so the pipeline pays one context variable lookup per stage.
+
+    Memory is traced with tracemalloc, which slows allocation-heavy stages
+    down; turn it off with trace_memory=False when only timings matter.
+    Stages are expected not to nest, as each one resets the traced peak.
+
+    Attributes:
+        records (List[StageRecord]): Finished stages in the order they ended.
+        trace_memory (bool): Whether peak memory is traced.
+        profile_stage (str, optional): Stage to run under cProfile.
+        profile (pstats.Stats, optional): Profile of profile_stage once it has run.
+    """
+
+    def __init__(
+        self,
+        hooks: Optional[List[Callable[[StageRecord], None]]] = None,
+        trace_memory: bool = True,
+        profile_stage: Optional[str] = None
+    ):
+        self.records: List[StageRecord] = []
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile: Optional[pstats.Stats] = None
+        self._hooks = list(hooks or [])
+
+    def add_hook(self, hook: Callable[[StageRecord], None]) -> None:
+        """
+        Registers a callable that receives every finished stage.
+
+        Args:
+            hook (Callable[[StageRecord], None]): Called with the record of each stage.
+        """
+        self._hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageRecord]:
+        """
+        Measures one stage.
+
+        Args:
+            name (str): The stage name.
+
+        Yields:
+            StageRecord: The record, for the stage to report its output shape.
+        """
+        record = StageRecord(name)
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        if profiler is not None:
+            profiler.enable()
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start_time
+            if profiler is not None:
+                profiler.disable()
+                self.profile = pstats.Stats(profiler)
+            if self.trace_memory:
+                record.peak_memory_bytes = tracemalloc.get_traced_memory()[1] - start_memory
+            self.records.append(record)
+            for hook in self._hooks:
+                hook(record)
+
+    @contextmanager
+    def activate(self) -> Iterator['Instrumentation']:
+        """
+        Makes this the instrumentation stage() records into, for the current thread or task.
+
+        Yields:
+            Instrumentation: This instrumentation.
+        """
+        start_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+            if start_tracing:
+                tracemalloc.stop()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarizes the recorded stages.
+
+        Returns:
+            Dict[str, Any]: 'stages' (one dict per record) and 'total_seconds'.
+        """
+        return {
+            'stages': [asdict(record) for record in self.records],
+            'total_seconds': sum(record.seconds for record in self.records),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary())
+
+    def summary_line(self) -> str:
+        """
+        Formats the recorded stages as one log line.
+
+        Returns:
+            str: e.g. 'read 0.120s 34.2MiB 468x9 | pivot 0.010s 1.1MiB 51x11'.
+        """
+        parts = []
+        for record in self.records:
+            part = f"{record.name} {record.seconds:.3f}s"
+            if record.peak_memory_bytes is not None:
+                part += f" {record.peak_memory_bytes / 2**20:.1f}MiB"
+            if record.rows is not None:
+                part += f" {record.rows}x{record.columns}"
+            parts.append(part)
+        return ' | '.join(parts)
+
+    def log_summary(self, level: int = logging.INFO) -> None:
+        logger.log(level, "Report stages: %s", self.summary_line())
+
+    def profile_text(self, limit: int = 25, sort: str = 'cumulative') -> str:
+        """
+        Formats the cProfile statistics of profile_stage.
+
+        Args:
+            limit (int, optional): Number of functions to list. Defaults to 25.
+            sort (str, optional): pstats sort key. Defaults to 'cumulative'.
+
+        Returns:
+            str: The statistics, or an empty string when the stage has not run.
+        """
+        if self.profile is None:
+            return ''
+        stream = io.StringIO()
+        self.profile.stream = stream
+        self.profile.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+def stage(name: str):
+    """
+    Measures a stage in the active Instrumentation, or does nothing when none is active.
+
+    Args:
+        name (str): The stage name.
+
+    Returns:
+        A context manager yielding the stage record (a no-op stand-in when inactive).
+    """
+    instrumentation = _active.get()
+    if instrumentation is None:
+        return _NULL_STAGE
+    return instrumentation.stage(name)
+
+
+@contextmanager
+def instrumented(instrumentation: Optional[Instrumentation]) -> Iterator[None]:
+    """
+    Activates an instrumentation for a report run; None leaves the current one active.
+
+    Args:
+        instrumentation (Instrumentation, optional): The instrumentation to record into.
+    """
+    if instrumentation is None or _active.get() is instrumentation:
+        yield
+        return
+    with instrumentation.activate():
+        yield
@@ -0,0 +1,314 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from assessment_comparison_report import get_pivoted_data
+from export_loader import load_export, unique_columns
+from instrumentation import Instrumentation, instrumented, stage
+from report_writer import write_report_sheets
+
+# Kinds of change listed in the detail sheet; 'rescored' is the same answer with another score.
+CHANGES = ('changed', 'added', 'removed', 'rescored')
+
+DEFAULT_PAIR_COLUMNS = ['partner', 'product']
+
+
+def get_period_pairs(
+    assessments: pd.DataFrame,
+    pair_columns: List[str],
+    period_column: str,
+    pivot_column: str,
+    base_period: Any,
+    compare_period: Any
+) -> pd.DataFrame:
+    """
+    Pairs every partner's assessment in the base period with its assessment in the compare period.
+
+    A partner with several assessments in one period is paired through the
+    last of them in pivot_column order. Partners assessed in only one of the
+    periods are left out.
+
+    Args:
+        assessments (pd.DataFrame): Rows holding pair_columns, period_column and pivot_column.
+        pair_columns (List[str]): The columns identifying a partner across periods.
+        period_column (str): The period column.
+        pivot_column (str): The assessment column.
+        base_period (Any): The earlier period.
+        compare_period (Any): The later period.
+
+    Returns:
+        pd.DataFrame: pair_columns, base_<pivot_column> and compare_<pivot_column>, sorted by pair_columns.
+    """
+    assessments = assessments[unique_columns(pair_columns, [period_column, pivot_column])].drop_duplicates()
+    assessments = assessments.sort_values(pivot_column, kind='stable')
+    periods = []
+    for prefix, period in (('base', base_period), ('compare', compare_period)):
+        in_period = assessments[assessments[period_column] == period].drop_duplicates(pair_columns, keep='last')
+        periods.append(
+            in_period[pair_columns + [pivot_column]].rename(columns={pivot_column: f'{prefix}_{pivot_column}'}))
+    return periods[0].merge(periods[1], on=pair_columns).sort_values(pair_columns, kind='stable', ignore_index=True)
+
+
+def compare_columns(
+    answers: np.ndarray,
+    scores: Optional[np.ndarray],
+    base_positions: np.ndarray,
+    compare_positions: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Compares pairs of columns of the pivoted answer (and score) matrix in whole-array operations.
+
+    Args:
+        answers (np.ndarray): Answer codes, questions x assessments; -1 for no answer.
+        scores (np.ndarray, optional): Scores aligned with answers; NaN for none.
+        base_positions (np.ndarray): Column of each pair's base assessment.
+        compare_positions (np.ndarray): Column of each pair's compare assessment.
+
+    Returns:
+        Dict[str, np.ndarray]: A questions x pairs mask per kind of change in CHANGES, plus
+            'unchanged', and when scores are given 'base_score', 'compare_score' and 'score_delta'.
+    """
+    base = answers[:, base_positions]
+    compare = answers[:, compare_positions]
+    base_answered = base >= 0
+    compare_answered = compare >= 0
+    both = base_answered & compare_answered
+    changes = {
+        'changed': both & (base != compare),
+        'added': ~base_answered & compare_answered,
+        'removed': base_answered & ~compare_answered,
+    }
+    changes['unchanged'] = both & ~changes['changed']
+    if scores is None:
+        changes['rescored'] = np.zeros_like(both)
+        return changes
+    changes['base_score'] = scores[:, base_positions]
+    changes['compare_score'] = scores[:, compare_positions]
+    changes['score_delta'] = changes['compare_score'] - changes['base_score']
+    # a score given or taken away counts as a new score as well
+    rescored = (changes['score_delta'] != 0) & ~np.isnan(changes['score_delta'])
+    rescored |= np.isnan(changes['base_score']) != np.isnan(changes['compare_score'])
+    changes['rescored'] = changes['unchanged'] & rescored
+    return changes
+
+
+def transform_export(
+    df: pd.DataFrame,
+    base_period: Any,
+    compare_period: Any,
+    pair_columns: Optional[List[str]] = None,
+    period_column: str = 'period',
+    pivot_index: Optional[List[str]] = None,
+    pivot_column: str = 'assessmentId',
+    pivot_value: str = 'answer',
+    score_column: Optional[str] = 'evaluationScore',
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first'
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Builds the period-over-period change report: what changed in each partner's answers between two periods.
+
+    The answers are pivoted as for the comparison report (questions x
+    assessments) and coded once, so every pair of assessments is compared
+    column against column without a loop over pairs or questions.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the export data.
+        base_period (Any): The earlier period.
+        compare_period (Any): The later period.
+        pair_columns (List[str], optional): The columns identifying a partner across periods.
+            Defaults to partner and product.
+        period_column (str, optional): The period column. Defaults to 'period'.
+        pivot_index (List[str], optional): The question columns. Defaults to questionNumber and questionText.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        pivot_value (str, optional): The answer column. Defaults to 'answer'.
+        score_column (str, optional): The score column; None leaves the scores out. Defaults to 'evaluationScore'.
+        instrumentation (Instrumentation, optional): Records the pivot, metadata
+            (pairing) and compare stages. Defaults to None (not recorded).
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once:
+            'first', 'last' or 'error'. Defaults to 'first'.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The summary, one row per pair with the count of
+            every kind of change (and the score totals), and the details, one row per
+            changed question of a pair with both answers (and scores).
+    """
+    pair_columns = list(pair_columns or DEFAULT_PAIR_COLUMNS)
+    pivot_index = list(pivot_index or ['questionNumber', 'questionText'])
+    with instrumented(instrumentation):
+        with stage('pivot') as record:
+            pivot_df = get_pivoted_data(df, pivot_index, pivot_column, pivot_value, on_duplicate)
+            questions = pivot_df[pivot_index]
+            assessment_ids = pivot_df.columns[len(pivot_index):]
+            codes, answer_values = pd.factorize(pivot_df[assessment_ids].to_numpy().ravel())
+            answers = codes.reshape(len(pivot_df), len(assessment_ids))
+            scores = None
+            if score_column is not None:
+                score_df = get_pivoted_data(df, pivot_index, pivot_column, score_column, on_duplicate)
+                scores = (
+                    score_df.set_index(pivot_index)
+                    .reindex(index=questions.set_index(pivot_index).index, columns=assessment_ids)
+                    .to_numpy(dtype=float, na_value=np.nan)
+                )
+            record.set_output(pivot_df)
+
+        with stage('metadata') as record:
+            pairs = get_period_pairs(df, pair_columns, period_column, pivot_column, base_period, compare_period)
+            # pairs whose assessments answered nothing have no pivot column
+            base_positions = assessment_ids.get_indexer(pairs[f'base_{pivot_column}'])
+            compare_positions = assessment_ids.get_indexer(pairs[f'compare_{pivot_column}'])
+            pivoted = (base_positions >= 0) & (compare_positions >= 0)
+            pairs = pairs[pivoted].reset_index(drop=True)
+            base_positions = base_positions[pivoted]
+            compare_positions = compare_positions[pivoted]
+            record.set_output(pairs)
+
+        with stage('compare') as record:
+            changes = compare_columns(answers, scores, base_positions, compare_positions)
+            summary_df = pairs.copy()
+            for change in ('changed', 'added', 'removed', 'unchanged', 'rescored'):
+                summary_df[change] = changes[change].sum(axis=0)
+            if scores is not None:
+                summary_df['base_score'] = np.nansum(changes['base_score'], axis=0)
+                summary_df['compare_score'] = np.nansum(changes['compare_score'], axis=0)
+                summary_df['score_delta'] = summary_df['compare_score'] - summary_df['base_score']
+
+            # one detail row per (pair, question) with a change, pair by pair
+            kinds = np.select([changes[change] for change in CHANGES], CHANGES, default='')
+            pair_rows, question_rows = np.nonzero(kinds.T != '')
+            detail_df = pd.concat(
+                [pairs[pair_columns].iloc[pair_rows].reset_index(drop=True),
+                 questions.iloc[question_rows].reset_index(drop=True)],
+                axis=1
+            )
+            detail_df['change'] = kinds[question_rows, pair_rows]
+            answer_values = np.append(np.asarray(answer_values, dtype=object), np.nan)
+            for prefix, positions in (('base', base_positions), ('compare', compare_positions)):
+                # code -1 picks the appended NaN
+                detail_df[f'{prefix}_{pivot_value}'] = answer_values[answers[question_rows, positions[pair_rows]]]
+            if scores is not None:
+                for name in ('base_score', 'compare_score', 'score_delta'):
+                    detail_df[name] = changes[name][question_rows, pair_rows]
+            record.set_output(detail_df)
+    return summary_df, detail_df
+
+
+def get_report_columns(
+    pair_columns: List[str],
+    period_column: str = 'period',
+    pivot_index: Optional[List[str]] = None,
+    pivot_column: str = 'assessmentId',
+    pivot_value: str = 'answer',
+    score_column: Optional[str] = 'evaluationScore'
+) -> List[str]:
+    """
+    Lists the export columns the change report reads.
+
+    Args:
+        pair_columns (List[str]): The columns identifying a partner across periods.
+        period_column (str, optional): The period column. Defaults to 'period'.
+        pivot_index (List[str], optional): The question columns. Defaults to questionNumber and questionText.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        pivot_value (str, optional): The answer column. Defaults to 'answer'.
+        score_column (str, optional): The score column, or None. Defaults to 'evaluationScore'.
+
+    Returns:
+        List[str]: The required column names.
+    """
+    return unique_columns(
+        [pivot_column],
+        pair_columns,
+        [period_column],
+        pivot_index or ['questionNumber', 'questionText'],
+        [pivot_value],
+        [score_column] if score_column is not None else []
+    )
+
+
+def main(
+    input_csv_path: str,
+    output_csv_path: str,
+    base_period: Any,
+    compare_period: Any,
+    pair_columns: Optional[List[str]] = None,
+    period_column: str = 'period',
+    pivot_index: Optional[List[str]] = None,
+    pivot_column: str = 'assessmentId',
+    pivot_value: str = 'answer',
+    score_column: Optional[str] = 'evaluationScore',
+    encoding: str = 'utf-8',
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first',
+    filters: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Reads the export and writes the change report between two periods.
+
+    Only the rows of the two periods are read. XLSX output gets a 'Summary'
+    and a 'Detail' sheet; other formats write the summary to output_csv_path
+    and the details next to it (e.g. 'changes.detail.csv').
+
+    Args:
+        input_csv_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        output_csv_path (str): Path where the summary (or the XLSX workbook) will be saved.
+        base_period (Any): The earlier period.
+        compare_period (Any): The later period.
+        pair_columns (List[str], optional): The columns identifying a partner across periods.
+            Defaults to partner and product.
+        period_column (str, optional): The period column. Defaults to 'period'.
+        pivot_index (List[str], optional): The question columns. Defaults to questionNumber and questionText.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        pivot_value (str, optional): The answer column. Defaults to 'answer'.
+        score_column (str, optional): The score column; None leaves the scores out. Defaults to 'evaluationScore'.
+        encoding (str, optional): Encoding for CSV output. Defaults to 'utf-8'.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the input file extension.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        instrumentation (Instrumentation, optional): Records wall time, peak memory and
+            output shape of the read, pivot, metadata, compare and write stages. Defaults to None.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once:
+            'first', 'last' or 'error'. Defaults to 'first'.
+        filters (Dict[str, Any], optional): Further equality/IN and export_loader.ValueRange
+            filters on export columns, applied while reading. Defaults to None.
+    """
+    pair_columns = list(pair_columns or DEFAULT_PAIR_COLUMNS)
+    filters = {period_column: [base_period, compare_period], **(filters or {})}
+    with instrumented(instrumentation):
+        with stage('read') as record:
+            df, _ = load_export(
+                input_csv_path,
+                get_report_columns(pair_columns, period_column, pivot_index, pivot_column, pivot_value, score_column),
+                file_format=input_format,
+                filters=filters
+            )
+            record.set_output(df)
+        summary_df, detail_df = transform_export(
+            df,
+            base_period,
+            compare_period,
+            pair_columns,
+            period_column,
+            pivot_index,
+            pivot_column,
+            pivot_value,
+            score_column,
+            on_duplicate=on_duplicate
+        )
+        with stage('write') as record:
+            write_report_sheets(
+                [('Summary', summary_df, len(pair_columns)), ('Detail', detail_df, len(pair_columns))],
+                output_csv_path,
+                output_format,
+                encoding
+            )
+            record.set_output(detail_df)
+
+
+if __name__ == "__main__":
+    main(
+        input_csv_path='sample_export.csv',
+        output_csv_path='period_changes.csv',
+        base_period=2023,
+        compare_period=2024,
+    )
@@ -0,0 +1,332 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Combined row codes are compacted before they could overflow int64.
+_MAX_ROW_CODE = 2 ** 62
+
+# How pivot_answers fills a cell that several rows answer.
+DUPLICATE_POLICIES = ('first', 'last', 'error')
+
+
+class DuplicateAnswersError(ValueError):
+    """
+    Raised by pivot_answers(on_duplicate='error') when a cell gets different answers.
+
+    Attributes:
+        conflicts (pd.DataFrame): One row per conflicting cell, see pivot_answers.
+    """
+
+    def __init__(self, conflicts: pd.DataFrame):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} pivot cells have conflicting answers")
+
+
+def factorize_sorted(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """
+    Encodes a key column as integer codes that follow the sorted order of its values.
+
+    Categorical columns are encoded from their existing codes, so only the
+    categories are sorted and the row values are never hashed.
+
+    Args:
+        values (pd.Series): The key column.
+
+    Returns:
+        Tuple[np.ndarray, pd.Index]: The code of every row (-1 for nulls) and the sorted distinct values.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        order = categories.argsort()
+        rank = np.empty(len(categories), dtype=np.int64)
+        rank[order] = np.arange(len(categories))
+        codes = values.cat.codes.to_numpy()
+        present = codes >= 0
+        sorted_codes = np.full(len(codes), -1, dtype=np.int64)
+        sorted_codes[present] = rank[codes[present]]
+        used = np.bincount(sorted_codes[present], minlength=len(categories)) > 0
+        remap = np.cumsum(used) - 1
+        sorted_codes[present] = remap[sorted_codes[present]]
+        return sorted_codes, categories.take(order[used])
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def dense_sorted_codes(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Renumbers integer codes as 0..n-1 in sorted order, hashing instead of sorting every row.
+
+    Args:
+        codes (np.ndarray): Non-negative integer codes.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The dense code of every row and, for each
+        dense code, the position of the first row that carries it.
+    """
+    appearance_codes, uniques = pd.factorize(codes)
+    # factorize numbers values by first appearance, so a new code starts wherever the running max grows
+    running_max = np.maximum.accumulate(appearance_codes)
+    first_rows = np.flatnonzero(np.r_[True, running_max[1:] > running_max[:-1]])
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[order] = np.arange(len(uniques))
+    return rank[appearance_codes], first_rows[order]
+
+
+def combine_codes(level_codes: List[np.ndarray], level_sizes: List[int]) -> np.ndarray:
+    """
+    Combines per-level codes into one code whose order is the lexicographic order of the levels.
+
+    Args:
+        level_codes (List[np.ndarray]): Codes of each key level, none of them null.
+        level_sizes (List[int]): Number of distinct values in each level.
+
+    Returns:
+        np.ndarray: One int64 code per row.
+    """
+    combined = np.zeros(len(level_codes[0]), dtype=np.int64)
+    bound = 1
+    for codes, size in zip(level_codes, level_sizes):
+        if bound * size >= _MAX_ROW_CODE:
+            # renumber the observed combinations, which keeps their order
+            combined = dense_sorted_codes(combined)[0]
+            bound = int(combined.max()) + 1
+        combined = combined * size + codes
+        bound *= size
+    return combined
+
+
+def _drop_unused(codes: np.ndarray, uniques: pd.Index) -> Tuple[np.ndarray, pd.Index]:
+    """Drops distinct values that no remaining row refers to."""
+    used = np.bincount(codes, minlength=len(uniques)) > 0
+    if used.all():
+        return codes, uniques
+    remap = np.cumsum(used) - 1
+    return remap[codes], uniques[used]
+
+
+def _conflicting_cells(cells: np.ndarray, answers: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, List[list]]:
+    """
+    Finds the cells that more than one distinct answer lands in.
+
+    Returns:
+        Tuple[np.ndarray, List[list]]: The first row of every conflicting cell and
+        its distinct answers in row order.
+    """
+    repeated = np.flatnonzero(counts[cells] > 1)
+    pairs = pd.DataFrame({'cell': cells[repeated], 'answer': answers[repeated], 'row': repeated})
+    grouped = pairs.drop_duplicates(['cell', 'answer']).groupby('cell', sort=True)
+    competing = grouped['answer'].agg(list)
+    rows = grouped['row'].first()
+    conflicting = (competing.str.len() > 1).to_numpy()
+    return rows.to_numpy()[conflicting], competing[conflicting].tolist()
+
+
+def _conflict_frame(df: pd.DataFrame, keys: List[str], rows: np.ndarray, competing: List[list]) -> pd.DataFrame:
+    conflicts = pd.DataFrame({key: np.asarray(df[key].iloc[rows], dtype=object) for key in keys}, columns=keys)
+    conflicts['answers'] = pd.Series(competing, dtype=object)
+    return conflicts
+
+
+def get_conflicts(pivot_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the conflict report pivot_answers left on a pivoted frame or a report built from it.
+
+    Args:
+        pivot_df (pd.DataFrame): The pivoted frame or report.
+
+    Returns:
+        pd.DataFrame: One row per cell that got different answers: the key values and
+        'answers', the distinct answers in export order. Empty when there were none.
+    """
+    return pd.DataFrame.from_records(pivot_df.attrs.get('conflicts', []))
+
+
+def pivot_answers(
+    df: pd.DataFrame,
+    index: List[str],
+    columns: str,
+    values: str,
+    on_duplicate: str = 'first'
+) -> pd.DataFrame:
+    """
+    Pivots the answers into a grid, checking in one pass whether any cell is answered twice.
+
+    Index and column keys are factorized into sorted integer codes and one
+    bincount over the cell codes tells whether the keys are unique. Unique
+    keys are written straight into a preallocated 2-D array with no
+    aggregation. Otherwise the cells that got different (non-null) answers
+    are collected into a conflict report, and the on_duplicate policy picks
+    the answer: 'first' gives the pivot_table(aggfunc='first') result, 'last'
+    the last non-null answer, and 'error' raises DuplicateAnswersError.
+    Repeated equal answers are not conflicts. Inputs the scatter does not
+    cover (several column keys, keys that cannot be sorted) are handed to
+    pivot_table after the same check.
+
+    The conflict report is stored as records in pivot_df.attrs['conflicts'];
+    get_conflicts turns it back into a frame.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame.
+        index (List[str]): List of columns to set as the pivot index.
+        columns (str): The column to pivot on.
+        values (str): The value column.
+        on_duplicate (str, optional): 'first', 'last' or 'error'. Defaults to 'first'.
+
+    Returns:
+        pd.DataFrame: The pivoted DataFrame.
+
+    Raises:
+        ValueError: If on_duplicate is unknown.
+        DuplicateAnswersError: If on_duplicate is 'error' and a cell got different answers.
+    """
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {on_duplicate!r}; expected one of {list(DUPLICATE_POLICIES)}")
+    value_dtype = df[values].dtype
+    pivot_df = None
+    if isinstance(columns, str) and (
+            value_dtype == object or isinstance(value_dtype, pd.CategoricalDtype) or value_dtype.kind in 'iuf'):
+        try:
+            pivot_df = _scatter_pivot(df, list(index), columns, values, on_duplicate)
+        except TypeError:
+            # keys of mixed types cannot be sorted; let pandas raise or cope
+            pivot_df = None
+    if pivot_df is None:
+        conflicts = _find_conflicts(df, list(index) + _as_list(columns), values)
+        if on_duplicate == 'error' and len(conflicts):
+            raise DuplicateAnswersError(conflicts)
+        aggfunc = 'last' if on_duplicate == 'last' else 'first'
+        pivot_df = df.pivot_table(index=index, columns=columns, values=values, aggfunc=aggfunc)
+        pivot_df.attrs['conflicts'] = conflicts.to_dict('records')
+    if pivot_df.attrs['conflicts']:
+        logger.warning(
+            "%d pivot cells have conflicting answers; kept the %s one",
+            len(pivot_df.attrs['conflicts']), 'last' if on_duplicate == 'last' else 'first')
+    return pivot_df
+
+
+def pivot_first(
+    df: pd.DataFrame,
+    index: List[str],
+    columns: str,
+    values: str
+) -> pd.DataFrame:
+    """
+    Pivots the DataFrame the way pivot_table(aggfunc='first') does, without a groupby.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame.
+        index (List[str]): List of columns to set as the pivot index.
+        columns (str): The column to pivot on.
+        values (str): The value column.
+
+    Returns:
+        pd.DataFrame: The pivoted DataFrame, equal to the pivot_table result.
+    """
+    return pivot_answers(df, index, columns, values, 'first')
+
+
+def _as_list(columns) -> List[str]:
+    return [columns] if isinstance(columns, str) else list(columns)
+
+
+def _find_conflicts(df: pd.DataFrame, keys: List[str], values: str) -> pd.DataFrame:
+    """Builds the conflict report for inputs the scatter pivot does not cover."""
+    # like the groupby, skip null answers and null keys
+    keep = df[values].notna().to_numpy()
+    key_codes = []
+    key_sizes = []
+    for key in keys:
+        codes, uniques = pd.factorize(df[key])
+        keep &= codes >= 0
+        key_codes.append(codes)
+        key_sizes.append(max(len(uniques), 1))
+    rows = np.flatnonzero(keep)
+    if not len(rows):
+        return _conflict_frame(df, keys, rows, [])
+    cells, _ = dense_sorted_codes(combine_codes([codes[rows] for codes in key_codes], key_sizes))
+    counts = np.bincount(cells)
+    if counts.max() <= 1:
+        return _conflict_frame(df, keys, rows[:0], [])
+    conflict_rows, competing = _conflicting_cells(cells, df[values].to_numpy(dtype=object)[rows], counts)
+    return _conflict_frame(df, keys, rows[conflict_rows], competing)
+
+
+def _scatter_pivot(
+    df: pd.DataFrame,
+    index: List[str],
+    columns: str,
+    values: str,
+    on_duplicate: str = 'first'
+) -> Optional[pd.DataFrame]:
+    keys = index + [columns]
+    key_codes = []
+    key_uniques = []
+    for key in keys:
+        codes, uniques = factorize_sorted(df[key])
+        key_codes.append(codes)
+        key_uniques.append(uniques)
+    numeric = df[values].dtype.kind in 'iuf'
+    answers = df[values].to_numpy() if numeric else df[values].to_numpy(dtype=object)
+
+    # "first" skips null values and groupby drops null keys
+    keep = df[values].notna().to_numpy()
+    for codes in key_codes:
+        keep &= codes >= 0
+    if not keep.any():
+        return None
+    rows = None
+    if not keep.all():
+        rows = np.flatnonzero(keep)
+        answers = answers[rows]
+        key_codes = [codes[rows] for codes in key_codes]
+        for position, (codes, uniques) in enumerate(zip(key_codes, key_uniques)):
+            key_codes[position], key_uniques[position] = _drop_unused(codes, uniques)
+
+    level_codes, column_codes = key_codes[:-1], key_codes[-1]
+    level_uniques, column_uniques = key_uniques[:-1], key_uniques[-1]
+    if len(index) == 1:
+        row_codes = level_codes[0]
+        row_index = pd.Index(level_uniques[0], name=index[0])
+    else:
+        combined = combine_codes(level_codes, [len(uniques) for uniques in level_uniques])
+        row_codes, first_rows = dense_sorted_codes(combined)
+        row_index = pd.MultiIndex.from_arrays(
+            [uniques.take(codes[first_rows]) for codes, uniques in zip(level_codes, level_uniques)],
+            names=index
+        )
+
+    n_rows, n_columns = len(row_index), len(column_uniques)
+    cells = row_codes.astype(np.int64) * n_columns + column_codes
+    # the uniqueness check: unique keys go straight into the grid
+    counts = np.bincount(cells, minlength=n_rows * n_columns)
+    conflicts = []
+    if counts.max() > 1:
+        conflict_rows, competing = _conflicting_cells(cells, answers, counts)
+        if rows is not None:
+            conflict_rows = rows[conflict_rows]
+        conflict_df = _conflict_frame(df, keys, conflict_rows, competing)
+        if on_duplicate == 'error' and len(conflict_df):
+            raise DuplicateAnswersError(conflict_df)
+        conflicts = conflict_df.to_dict('records')
+        chosen = ~pd.Series(cells).duplicated(keep='last' if on_duplicate == 'last' else 'first').to_numpy()
+        cells, answers = cells[chosen], answers[chosen]
+
+    if not numeric:
+        grid = np.full(n_rows * n_columns, np.nan, dtype=object)
+    elif len(cells) < n_rows * n_columns:
+        # empty cells turn integer answers into floats, as in pivot_table
+        grid = np.full(n_rows * n_columns, np.nan, dtype=np.result_type(answers.dtype, np.float64))
+    else:
+        grid = np.empty(n_rows * n_columns, dtype=answers.dtype)
+    grid[cells] = answers
+    pivot_df = pd.DataFrame(
+        grid.reshape(n_rows, n_columns),
+        index=row_index,
+        columns=pd.Index(column_uniques, name=columns)
+    )
+    pivot_df.attrs['conflicts'] = conflicts
+    return pivot_df
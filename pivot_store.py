@@ -0,0 +1,298 @@
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence
+
+from export_loader import unique_columns
+from pivot_engine import combine_codes, factorize_sorted
+from question_catalog import CodedExport, QuestionOrder, _smallest_codes, load_coded_export
+
+STORE_VERSION = 2
+
+# Files of a pivot store directory.
+CODES_FILE = 'codes.npy'
+DICTIONARIES_FILE = 'dictionaries.pkl'
+MANIFEST_FILE = 'manifest.json'
+
+
+class PivotStore:
+    """
+    A pivoted export on disk: the question x assessment grid of answer codes, memory-mapped.
+
+    The grid holds the code of each cell's first non-null answer (-1 for
+    none), one column per assessment stored contiguously, so a report over a
+    few assessments only pages in their columns. The questions, assessments
+    and answers the codes refer to are small dictionaries loaded on open.
+    Opening maps the grid without reading it.
+
+    Attributes:
+        directory (str): Where the store lives.
+        codes (np.ndarray): The read-only memory-mapped grid, questions x assessments.
+        questions (pd.DataFrame): The pivot_index values of every grid row, in report order.
+        assessment_ids (pd.Index): The pivot_column value of every grid column, sorted.
+        assessments (pd.DataFrame): Distinct rows of the pivot column and metadata, as in the export.
+        answers (pd.Index): Distinct answers, by code.
+        question_order (QuestionOrder): Natural order of the question numbers the rows follow.
+        manifest (Dict[str, Any]): Version, pivot arguments and grid shape.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        codes: np.ndarray,
+        questions: pd.DataFrame,
+        assessment_ids: pd.Index,
+        assessments: pd.DataFrame,
+        answers: pd.Index,
+        question_order: QuestionOrder,
+        manifest: Dict[str, Any]
+    ):
+        self.directory = directory
+        self.codes = codes
+        self.questions = questions
+        self.assessment_ids = assessment_ids
+        self.assessments = assessments
+        self.answers = answers
+        self.question_order = question_order
+        self.manifest = manifest
+
+    @property
+    def pivot_index(self) -> List[str]:
+        return self.manifest['pivot_index']
+
+    @property
+    def pivot_column(self) -> str:
+        return self.manifest['pivot_column']
+
+    @property
+    def pivot_value(self) -> str:
+        return self.manifest['pivot_value']
+
+    @classmethod
+    def open(cls, directory: str) -> 'PivotStore':
+        """
+        Opens a store written by build_pivot_store.
+
+        Args:
+            directory (str): The store directory.
+
+        Returns:
+            PivotStore: The store, with its grid memory-mapped.
+
+        Raises:
+            ValueError: If the store was written by an incompatible version.
+        """
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != STORE_VERSION:
+            raise ValueError(f"Pivot store version {manifest.get('version')!r} is not supported")
+        with open(os.path.join(directory, DICTIONARIES_FILE), 'rb') as f:
+            dictionaries = pickle.load(f)
+        codes = np.load(os.path.join(directory, CODES_FILE), mmap_mode='r')
+        return cls(directory, codes, manifest=manifest, **dictionaries)
+
+    def column_positions(self, assessment_ids: Optional[Sequence] = None) -> np.ndarray:
+        """
+        Finds the grid columns of some assessments.
+
+        Args:
+            assessment_ids (Sequence, optional): pivot_column values. Defaults to every assessment.
+
+        Returns:
+            np.ndarray: Sorted grid column positions.
+
+        Raises:
+            KeyError: If an assessment is not in the store.
+        """
+        if assessment_ids is None:
+            return np.arange(len(self.assessment_ids))
+        requested = pd.Index(list(assessment_ids)).unique()
+        positions = self.assessment_ids.get_indexer(requested)
+        if (positions < 0).any():
+            missing = requested[positions < 0].tolist()
+            raise KeyError(f"Assessments not in the pivot store: {missing}")
+        return np.sort(positions)
+
+    def pivot(self, assessment_ids: Optional[Sequence] = None) -> pd.DataFrame:
+        """
+        Slices the pivoted answers of some assessments out of the grid.
+
+        The result equals pivoting only those assessments' export rows with
+        aggfunc='first': questions and assessments without any answer among
+        them are left out.
+
+        Args:
+            assessment_ids (Sequence, optional): pivot_column values. Defaults to every assessment.
+
+        Returns:
+            pd.DataFrame: The pivot_index columns followed by one answer column per assessment.
+        """
+        positions = self.column_positions(assessment_ids)
+        # fancy indexing only pages in the selected columns of the Fortran-ordered grid
+        codes = np.asarray(self.codes[:, positions])
+        answered = codes >= 0
+        rows = np.flatnonzero(answered.any(axis=1))
+        columns = np.flatnonzero(answered.any(axis=0))
+        codes = codes[np.ix_(rows, columns)]
+
+        answers = self.answers.to_numpy()
+        if answers.dtype == object or not (codes < 0).any():
+            values = answers[codes] if len(answers) else np.empty(codes.shape, dtype=object)
+            if answers.dtype == object:
+                values[codes < 0] = np.nan
+        else:
+            # empty cells turn integer answers into floats, as in pivot_table
+            values = np.where(codes >= 0, answers.astype(np.float64)[codes], np.nan)
+        pivot_df = self.questions.iloc[rows].reset_index(drop=True)
+        answer_df = pd.DataFrame(values, columns=self.assessment_ids[positions[columns]])
+        return pd.concat([pivot_df, answer_df], axis=1)
+
+    def metadata(self, assessment_metadata: List[str], assessment_ids: Optional[Sequence] = None) -> pd.DataFrame:
+        """
+        Looks up the metadata of some assessments, like get_meta_data_frame on their export rows.
+
+        Args:
+            assessment_metadata (List[str]): Metadata fields, all stored in the store.
+            assessment_ids (Sequence, optional): pivot_column values. Defaults to every assessment.
+
+        Returns:
+            pd.DataFrame: One row of metadata per assessment, indexed by pivot_column.
+        """
+        columns = unique_columns([self.pivot_column], assessment_metadata)
+        assessments = self.assessments
+        if assessment_ids is not None:
+            assessments = assessments[assessments[self.pivot_column].isin(list(assessment_ids))]
+        return assessments[columns].drop_duplicates().set_index(self.pivot_column)
+
+
+def build_pivot_store(
+    coded: CodedExport,
+    directory: str,
+    pivot_index: List[str],
+    pivot_column: str,
+    question_order: Optional[QuestionOrder] = None
+) -> PivotStore:
+    """
+    Pivots a coded export once and writes it as a pivot store.
+
+    Args:
+        coded (CodedExport): The export, coded with pivot_column and the metadata as
+            assessment columns, pivot_index as question columns and the answer column.
+        directory (str): Where to write the store; created when missing.
+        pivot_index (List[str]): The question columns that make the report rows.
+        pivot_column (str): The assessment column that makes the report columns.
+        question_order (QuestionOrder, optional): Ranks that order the rows naturally by the first
+            pivot_index column; stored with the store. Defaults to None (ranked from the catalog).
+
+    Returns:
+        PivotStore: The written store, opened.
+    """
+    # value order first: the questions sorted level by level, as the pivot sorts them
+    level_codes = []
+    level_sizes = []
+    for col in pivot_index:
+        codes, uniques = factorize_sorted(coded.questions[col])
+        level_codes.append(codes)
+        level_sizes.append(len(uniques))
+    valid_questions = np.logical_and.reduce([codes >= 0 for codes in level_codes])
+    question_keys = np.where(
+        valid_questions, combine_codes([np.maximum(codes, 0) for codes in level_codes], level_sizes), -1)
+    catalog_order = np.flatnonzero(valid_questions)[np.argsort(question_keys[valid_questions], kind='stable')]
+    # question rows with equal keys (e.g. the same number and text) share a grid row
+    row_of_question = np.full(len(coded.questions), -1, dtype=np.int64)
+    sorted_keys = question_keys[catalog_order]
+    new_row = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if len(sorted_keys) else np.empty(0, dtype=bool)
+    row_of_question[catalog_order] = np.cumsum(new_row) - 1
+    questions = coded.questions.iloc[catalog_order[new_row]][pivot_index]
+    # then natural order of the question number, as get_pivoted_data orders them
+    if question_order is None:
+        question_order = QuestionOrder(coded.questions[pivot_index[0]])
+    natural = question_order.argsort(questions[pivot_index[0]])
+    grid_row = np.empty(len(natural), dtype=np.int64)
+    grid_row[natural] = np.arange(len(natural))
+    row_of_question = np.where(row_of_question >= 0, grid_row[np.maximum(row_of_question, 0)], -1)
+    questions = questions.iloc[natural].astype(object).reset_index(drop=True)
+
+    id_codes, assessment_ids = factorize_sorted(coded.assessments[pivot_column])
+    row_codes = row_of_question[coded.question_codes]
+    column_codes = id_codes[coded.assessment_codes]
+    answer_codes = coded.answer_codes
+    keep = (row_codes >= 0) & (column_codes >= 0) & (answer_codes >= 0)
+    n_rows, n_columns = len(questions), len(assessment_ids)
+    cells = row_codes[keep] * n_columns + column_codes[keep]
+    first = ~pd.Series(cells).duplicated(keep='first').to_numpy()
+
+    grid_dtype = _smallest_codes(np.array([len(coded.answers)])).dtype
+    grid = np.full(n_rows * n_columns, -1, dtype=grid_dtype)
+    grid[cells[first]] = answer_codes[keep][first]
+    grid = np.asfortranarray(grid.reshape(n_rows, n_columns))
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, CODES_FILE), grid)
+    dictionaries = {
+        'questions': questions,
+        'assessment_ids': pd.Index(assessment_ids, name=pivot_column),
+        'assessments': _plain_frame(coded.assessments),
+        'answers': coded.answers,
+        'question_order': question_order,
+    }
+    with open(os.path.join(directory, DICTIONARIES_FILE), 'wb') as f:
+        pickle.dump(dictionaries, f, protocol=pickle.HIGHEST_PROTOCOL)
+    manifest = {
+        'version': STORE_VERSION,
+        'pivot_index': list(pivot_index),
+        'pivot_column': pivot_column,
+        'pivot_value': coded.answer_column,
+        'assessment_metadata': [col for col in coded.assessments.columns if col != pivot_column],
+        'shape': [n_rows, n_columns],
+    }
+    # the manifest goes last, so a store without one is incomplete
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return PivotStore.open(directory)
+
+
+def _plain_frame(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({
+        col: object for col, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)})
+
+
+def write_pivot_store(
+    input_path: str,
+    directory: str,
+    assessment_metadata: List[str],
+    pivot_index: List[str],
+    pivot_column: str,
+    pivot_value: str,
+    input_format: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    question_order: Optional[QuestionOrder] = None
+) -> PivotStore:
+    """
+    Reads an export and writes its pivot store.
+
+    Args:
+        input_path (str): Path to the export, a glob pattern or a list of shards.
+        directory (str): Where to write the store.
+        assessment_metadata (List[str]): Metadata fields to keep for report headers.
+        pivot_index (List[str]): The question columns that make the report rows.
+        pivot_column (str): The assessment column that makes the report columns.
+        pivot_value (str): The answer column.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+        filters (Dict[str, Any], optional): Filters applied while reading, see export_loader.filter_mask.
+        question_order (QuestionOrder, optional): Ranks that order the rows naturally. Defaults to None.
+
+    Returns:
+        PivotStore: The written store, opened.
+    """
+    coded = load_coded_export(
+        input_path,
+        assessment_columns=unique_columns([pivot_column], assessment_metadata),
+        question_columns=pivot_index,
+        answer_column=pivot_value,
+        file_format=input_format,
+        filters=filters
+    )
+    return build_pivot_store(coded, directory, pivot_index, pivot_column, question_order)
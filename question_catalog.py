@@ -0,0 +1,598 @@
+import bisect
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from natsort import natsort_keygen, natsorted
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from export_loader import (
+    DEFAULT_CHUNKSIZE,
+    _convert_categories,
+    compact_frame,
+    detect_format,
+    expand_frame,
+    expand_input_paths,
+    infer_column_types,
+    iter_export_chunks,
+    keep_repetitive_categoricals,
+    order_by_age,
+    unique_columns
+)
+from pivot_engine import combine_codes
+
+logger = logging.getLogger(__name__)
+
+
+def _smallest_codes(codes: np.ndarray) -> np.ndarray:
+    """Stores codes in the narrowest signed integer type that holds them (and -1)."""
+    high = int(codes.max()) if len(codes) else 0
+    for dtype in (np.int8, np.int16, np.int32):
+        if high <= np.iinfo(dtype).max:
+            return codes.astype(dtype, copy=False)
+    return codes.astype(np.int64, copy=False)
+
+
+def _factorize_rows(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Numbers the distinct rows of a frame in order of first appearance, nulls included.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The code of every row and the position of the first row of each code.
+    """
+    level_codes = []
+    level_sizes = []
+    for col in frame.columns:
+        codes, uniques = pd.factorize(frame[col], use_na_sentinel=False)
+        level_codes.append(codes)
+        level_sizes.append(max(len(uniques), 1))
+    combined = level_codes[0] if len(level_codes) == 1 else combine_codes(level_codes, level_sizes)
+    codes, _ = pd.factorize(combined)
+    first_rows = np.flatnonzero(~pd.Series(codes).duplicated().to_numpy())
+    return codes, first_rows
+
+
+class _RowInterner:
+    """Gives every distinct row of some columns one code, stable across chunks."""
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self._codes: Dict[tuple, int] = {}
+        self._rows: List[tuple] = []
+
+    def encode(self, chunk: pd.DataFrame) -> np.ndarray:
+        frame = chunk[self.columns]
+        local_codes, first_rows = _factorize_rows(frame)
+        mapping = np.empty(len(first_rows), dtype=np.int64)
+        for position, row in enumerate(frame.iloc[first_rows].itertuples(index=False, name=None)):
+            # NaN is not equal to itself, so nulls are keyed as None
+            key = tuple(None if pd.isna(value) else value for value in row)
+            code = self._codes.get(key)
+            if code is None:
+                code = self._codes[key] = len(self._rows)
+                self._rows.append(row)
+            mapping[position] = code
+        return mapping[local_codes]
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(self._rows, columns=self.columns)
+
+
+class _ValueInterner:
+    """Gives every distinct non-null value of a column one code, stable across chunks; nulls get -1."""
+
+    def __init__(self):
+        self._codes: Dict[object, int] = {}
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        local_codes, uniques = pd.factorize(values)
+        mapping = np.array(
+            [self._codes.setdefault(value, len(self._codes)) for value in uniques] + [-1], dtype=np.int64)
+        # -1 (null) picks the trailing -1
+        return mapping[local_codes]
+
+    def values(self) -> pd.Index:
+        return pd.Index(list(self._codes), dtype=object)
+
+
+@dataclass
+class CodedExport:
+    """
+    An export stored as integer codes into tables of distinct values.
+
+    Each export row is one answer of one assessment to one question. The
+    assessment columns (assessmentId and metadata) and the question columns
+    (questionNumber, questionText, ...) are kept once per distinct row in
+    the assessments table and the question catalog, and every answer string
+    is kept once in answers. The rows themselves are three code arrays, so
+    long strings are never repeated per row. Strings are only materialized
+    for the pivot and the written report.
+
+    Attributes:
+        assessments (pd.DataFrame): Distinct rows of the assessment columns, by code.
+        questions (pd.DataFrame): The question catalog: distinct rows of the question
+            columns, by code; normally one per questionNumber.
+        answers (pd.Index): Distinct answer values, by code.
+        assessment_codes (np.ndarray): Assessment code of every export row.
+        question_codes (np.ndarray): Question code of every export row.
+        answer_codes (np.ndarray): Answer code of every export row, -1 when the answer is missing.
+        answer_column (str): Name of the answer column.
+        conflicts (pd.DataFrame, optional): When read from several shards, the rows a newer
+            shard replaced with a different answer; see load_coded_export.
+    """
+    assessments: pd.DataFrame
+    questions: pd.DataFrame
+    answers: pd.Index
+    assessment_codes: np.ndarray
+    question_codes: np.ndarray
+    answer_codes: np.ndarray
+    answer_column: str
+    conflicts: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        return len(self.answer_codes)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Export rows and the number of columns they were coded from."""
+        return len(self), len(self.assessments.columns) + len(self.questions.columns) + 1
+
+    def memory_bytes(self) -> int:
+        """
+        Measures the deep memory usage of the codes and the tables.
+
+        Returns:
+            int: Bytes used.
+        """
+        return int(
+            self.assessment_codes.nbytes + self.question_codes.nbytes + self.answer_codes.nbytes
+            + self.assessments.memory_usage(deep=True).sum()
+            + self.questions.memory_usage(deep=True).sum()
+            + self.answers.memory_usage(deep=True)
+        )
+
+    def column(self, name: str):
+        """
+        Rebuilds one export column from the codes.
+
+        Columns of string values come back as categoricals over the distinct
+        values, so no string is repeated; numeric answers come back as the
+        plain numeric column read_csv would have given.
+
+        Args:
+            name (str): An assessment, question or answer column.
+
+        Returns:
+            The column values, one per export row.
+
+        Raises:
+            KeyError: If the export was coded without that column.
+        """
+        if name == self.answer_column:
+            answers = pd.Categorical.from_codes(self.answer_codes, categories=self.answers, validate=False)
+            return answers if self.answers.dtype == object else np.asarray(answers)
+        if name in self.assessments.columns:
+            table, row_codes = self.assessments, self.assessment_codes
+        elif name in self.questions.columns:
+            table, row_codes = self.questions, self.question_codes
+        else:
+            raise KeyError(name)
+        values = table[name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            table_codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            table_codes, uniques = pd.factorize(values)
+        return pd.Categorical.from_codes(table_codes[row_codes], categories=uniques, validate=False)
+
+    def to_frame(self, columns: List[str]) -> pd.DataFrame:
+        """
+        Rebuilds the export columns a transform needs.
+
+        Args:
+            columns (List[str]): Column names.
+
+        Returns:
+            pd.DataFrame: One row per export row.
+        """
+        return pd.DataFrame({name: self.column(name) for name in columns}, columns=columns)
+
+    def summary(self) -> str:
+        return (
+            f"Coded {len(self)} rows into {len(self.assessments)} assessments, {len(self.questions)} questions "
+            f"and {len(self.answers)} distinct answers in {self.memory_bytes() / 2**20:.1f} MiB"
+        )
+
+
+_NATURAL_KEY = natsort_keygen()
+
+
+class QuestionOrder:
+    """
+    The natural-sort rank of every question number seen so far.
+
+    The numbers are natural-sorted once; numbers first seen later are
+    inserted with a binary search, so only their own sort keys are computed.
+    Reports order their question rows or columns by an integer argsort of
+    these ranks instead of natural-sorting the long question strings, and
+    save the order next to their other files to reuse it on the next run.
+
+    Attributes:
+        numbers (List[str]): The question numbers in natural order; a number's rank is its position.
+    """
+
+    def __init__(self, numbers: Sequence = ()):
+        self.numbers: List[str] = natsorted(pd.Index(numbers).dropna().unique().astype(str))
+        self._index: Optional[pd.Index] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the lookup index is rebuilt on demand
+        return {'numbers': self.numbers, '_index': None}
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def update(self, numbers: Sequence) -> int:
+        """
+        Inserts the numbers not seen yet.
+
+        Args:
+            numbers (Sequence): Question numbers, with repeats; they are compared as strings.
+
+        Returns:
+            int: How many numbers were new.
+        """
+        values = pd.Index(numbers).dropna().unique().astype(str)
+        new = values[self.index().get_indexer(values) < 0]
+        for number in new:
+            bisect.insort(self.numbers, number, key=_NATURAL_KEY)
+        if len(new):
+            self._index = None
+        return len(new)
+
+    def index(self) -> pd.Index:
+        if self._index is None:
+            self._index = pd.Index(self.numbers)
+        return self._index
+
+    def ranks(self, numbers: Sequence) -> np.ndarray:
+        """
+        Looks up the rank of question numbers, inserting unseen ones first.
+
+        Args:
+            numbers (Sequence): Question numbers.
+
+        Returns:
+            np.ndarray: The rank of every number; -1 for missing numbers.
+        """
+        self.update(numbers)
+        values = pd.Index(numbers)
+        ranks = self.index().get_indexer(values.astype(str))
+        ranks[values.isna()] = -1
+        return ranks
+
+    def argsort(self, numbers: Sequence) -> np.ndarray:
+        """
+        Orders question numbers naturally; equal numbers keep their given order.
+
+        Args:
+            numbers (Sequence): Question numbers.
+
+        Returns:
+            np.ndarray: Positions of numbers in natural order.
+        """
+        return np.argsort(self.ranks(numbers), kind='stable')
+
+    @classmethod
+    def load(cls, path: str) -> 'QuestionOrder':
+        """
+        Reads an order saved by save; a missing file gives an empty order.
+
+        Args:
+            path (str): Path to the JSON file.
+
+        Returns:
+            QuestionOrder: The order.
+        """
+        order = cls()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                # saved in natural order already
+                order.numbers = json.load(f)['numbers']
+        return order
+
+    def save(self, path: str) -> None:
+        """
+        Writes the order as JSON.
+
+        Args:
+            path (str): Path to the JSON file.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'numbers': self.numbers}, f)
+
+
+# Shard key of load_coded_export: a newer shard replaces all answers of an assessment to a question.
+DEFAULT_SHARD_KEY = ['assessmentId', 'questionNumber']
+
+
+def _compact_table(table: pd.DataFrame, file_format: str) -> pd.DataFrame:
+    # the same column types and categoricals load_export would give
+    table = compact_frame(table)
+    if file_format == 'csv':
+        table = infer_column_types(table)
+    return keep_repetitive_categoricals(table)
+
+
+def _code_file(
+    input_path: str,
+    assessment_columns: List[str],
+    question_columns: List[str],
+    answer_column: str,
+    chunksize: int,
+    file_format: str,
+    filters: Optional[Dict[str, Any]] = None
+) -> CodedExport:
+    """Codes one export file, keeping the table and answer values as read."""
+    columns = unique_columns(assessment_columns, question_columns, [answer_column])
+    assessments = _RowInterner(assessment_columns)
+    questions = _RowInterner(question_columns)
+    answers = _ValueInterner()
+    code_parts = {'assessment': [], 'question': [], 'answer': []}
+    dtype = str if file_format == 'csv' else None
+    for chunk in iter_export_chunks(input_path, columns, chunksize, dtype, file_format, filters):
+        code_parts['assessment'].append(assessments.encode(chunk))
+        code_parts['question'].append(questions.encode(chunk))
+        code_parts['answer'].append(answers.encode(chunk[answer_column]))
+    codes = {
+        part: _smallest_codes(np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64))
+        for part, arrays in code_parts.items()
+    }
+    return CodedExport(
+        assessments=assessments.table(),
+        questions=questions.table(),
+        answers=answers.values(),
+        assessment_codes=codes['assessment'],
+        question_codes=codes['question'],
+        answer_codes=codes['answer'],
+        answer_column=answer_column
+    )
+
+
+def _merge_tables(tables: List[pd.DataFrame]) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Interns the rows of several tables into one; returns it and the new code of every old row, table after table."""
+    combined = pd.concat(tables, ignore_index=True)
+    codes, first_rows = _factorize_rows(combined)
+    return combined.iloc[first_rows].reset_index(drop=True), codes
+
+
+def _merge_shards(shards: List[CodedExport]) -> Tuple[CodedExport, np.ndarray]:
+    """
+    Combines coded shards into one coded export, rows in shard order.
+
+    Returns:
+        Tuple[CodedExport, np.ndarray]: The combined export and the shard number of every row.
+    """
+    assessments, assessment_mapping = _merge_tables([shard.assessments for shard in shards])
+    questions, question_mapping = _merge_tables([shard.questions for shard in shards])
+    answer_mapping, answers = pd.factorize(
+        np.concatenate([shard.answers.to_numpy(dtype=object) for shard in shards]))
+    code_parts = {'assessment': [], 'question': [], 'answer': []}
+    starts = {'assessment': 0, 'question': 0, 'answer': 0}
+    for shard in shards:
+        for part, mapping, table_size, codes in (
+            ('assessment', assessment_mapping, len(shard.assessments), shard.assessment_codes),
+            ('question', question_mapping, len(shard.questions), shard.question_codes),
+            ('answer', answer_mapping, len(shard.answers), shard.answer_codes),
+        ):
+            start = starts[part]
+            # the trailing -1 keeps null answers (-1) null
+            shard_mapping = _smallest_codes(np.append(mapping[start:start + table_size], -1))
+            code_parts[part].append(shard_mapping[codes])
+            starts[part] += table_size
+    shard_numbers = np.repeat(_smallest_codes(np.arange(len(shards))), [len(shard) for shard in shards])
+    merged = CodedExport(
+        assessments=assessments,
+        questions=questions,
+        answers=pd.Index(answers, dtype=object),
+        assessment_codes=np.concatenate(code_parts['assessment']),
+        question_codes=np.concatenate(code_parts['question']),
+        answer_codes=np.concatenate(code_parts['answer']),
+        answer_column=shards[0].answer_column
+    )
+    return merged, shard_numbers
+
+
+def _drop_superseded(
+    coded: CodedExport,
+    shard_numbers: np.ndarray,
+    paths: List[str],
+    key_columns: List[str]
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Finds the rows a newer shard replaces, in one pass over the key codes.
+
+    Every key keeps the rows of the newest shard that has it, so rows a
+    single shard repeats are left to the pivot. The newest answer listed
+    for a conflict is that of the key's last row.
+
+    Returns:
+        Tuple[np.ndarray, pd.DataFrame]: Mask of the rows to keep, and one conflict row per
+        replaced row whose answer differs from the newest one.
+    """
+    # key codes per table row first, so only small tables are hashed by value
+    key_parts = []
+    key_sizes = []
+    for table, row_codes in ((coded.assessments, coded.assessment_codes), (coded.questions, coded.question_codes)):
+        columns = [col for col in key_columns if col in table.columns]
+        if columns:
+            table_keys, first_rows = _factorize_rows(table[columns])
+            key_parts.append(table_keys[row_codes])
+            key_sizes.append(len(first_rows))
+    keys = key_parts[0] if len(key_parts) == 1 else combine_codes(key_parts, key_sizes)
+    keys, uniques = pd.factorize(keys)
+    # rows are in shard order, so the last row of a key is in its newest shard
+    newest_rows = np.zeros(len(uniques), dtype=np.int64)
+    np.maximum.at(newest_rows, keys, np.arange(len(keys)))
+    newest = newest_rows[keys]
+    keep = shard_numbers == shard_numbers[newest]
+
+    replaced = np.flatnonzero(~keep)
+    # a replaced answer only conflicts when the newest shard does not give it for the same key
+    pairs = keys.astype(np.int64) * (len(coded.answers) + 1) + coded.answer_codes + 1
+    contested = np.zeros(len(uniques), dtype=bool)
+    contested[keys[replaced]] = True
+    changed = replaced[~np.isin(pairs[replaced], pairs[keep & contested[keys]])]
+    changed_newest = newest[changed]
+    shard_paths = np.array(paths, dtype=object)
+    answers = pd.Categorical.from_codes(coded.answer_codes, categories=coded.answers, validate=False)
+    conflicts = pd.DataFrame({col: np.asarray(coded.column(col)[changed]) for col in key_columns})
+    conflicts['shard'] = shard_paths[shard_numbers[changed]]
+    conflicts[coded.answer_column] = np.asarray(answers[changed])
+    conflicts['newest_shard'] = shard_paths[shard_numbers[changed_newest]]
+    conflicts[f'newest_{coded.answer_column}'] = np.asarray(answers[changed_newest])
+    logger.info("%d rows replaced by newer shards, %d of them with a different answer", len(replaced), len(changed))
+    return keep, conflicts
+
+
+def _prune_table(table: pd.DataFrame, codes: np.ndarray) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Drops the table rows no code refers to and renumbers the codes."""
+    used = np.zeros(len(table), dtype=bool)
+    used[codes] = True
+    if used.all():
+        return table, codes
+    mapping = np.cumsum(used) - 1
+    return table[used].reset_index(drop=True), mapping[codes]
+
+
+def _load_shards(
+    paths: List[str],
+    assessment_columns: List[str],
+    question_columns: List[str],
+    answer_column: str,
+    chunksize: int,
+    file_format: str,
+    key_columns: List[str],
+    max_workers: Optional[int],
+    filters: Optional[Dict[str, Any]] = None
+) -> CodedExport:
+    """Codes the shards concurrently, merges them oldest first and drops the rows newer shards replace."""
+    missing = [col for col in key_columns if col not in assessment_columns and col not in question_columns]
+    # shard key columns the report does not show still have to be read to tell rows apart
+    assessment_columns = assessment_columns + missing
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        shards = list(pool.map(
+            lambda path: _code_file(
+                path, assessment_columns, question_columns, answer_column, chunksize, file_format, filters),
+            paths
+        ))
+    coded, shard_numbers = _merge_shards(shards)
+    del shards
+    keep, conflicts = _drop_superseded(coded, shard_numbers, paths, key_columns)
+    assessments, assessment_codes = _prune_table(coded.assessments, coded.assessment_codes[keep])
+    questions, question_codes = _prune_table(coded.questions, coded.question_codes[keep])
+    if file_format == 'csv':
+        conflicts = expand_frame(infer_column_types(compact_frame(conflicts)))
+    return CodedExport(
+        assessments=assessments.drop(columns=missing),
+        questions=questions,
+        answers=coded.answers,
+        assessment_codes=assessment_codes,
+        question_codes=question_codes,
+        answer_codes=coded.answer_codes[keep],
+        answer_column=answer_column,
+        conflicts=conflicts
+    )
+
+
+def load_coded_export(
+    input_path: Union[str, Sequence[str]],
+    assessment_columns: List[str],
+    question_columns: List[str],
+    answer_column: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    file_format: Optional[str] = None,
+    key_columns: Optional[List[str]] = None,
+    newest_by: str = 'mtime',
+    max_workers: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> CodedExport:
+    """
+    Reads an export chunk by chunk straight into its coded form.
+
+    Only the code arrays grow with the export; each chunk is discarded once
+    it is coded. CSV values are read as strings and their types inferred on
+    the distinct values afterwards, which gives the types read_csv would.
+
+    An export split into shards can be given as a glob pattern or a list of
+    files. The shards are coded concurrently and merged by their small
+    tables, so no shard is ever held as a frame. When the same key_columns
+    values appear in several shards, the rows of the newest shard replace
+    those of the older ones; replaced rows with a different answer are
+    listed in the conflicts of the result and counted in the log.
+
+    Args:
+        input_path (Union[str, Sequence[str]]): Path to the input CSV, Parquet or Arrow IPC file,
+            a glob pattern, or a list of shard files.
+        assessment_columns (List[str]): Columns that describe the assessment, e.g. assessmentId and metadata.
+        question_columns (List[str]): Columns that describe the question, e.g. questionNumber and questionText.
+        answer_column (str): The answer column.
+        chunksize (int, optional): Number of rows per chunk. Defaults to DEFAULT_CHUNKSIZE.
+        file_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+        key_columns (List[str], optional): Columns identifying one answer across shards.
+            Defaults to DEFAULT_SHARD_KEY.
+        newest_by (str, optional): How to tell the newest shard, 'mtime' or 'order'
+            (the last one given); see export_paths.order_by_age. Defaults to 'mtime'.
+        max_workers (int, optional): Shards read at once. Defaults to the thread pool default.
+        filters (Dict[str, Any], optional): Equality, IN and range filters (see
+            export_loader.filter_mask) applied to every chunk before it is coded, so rows
+            outside the slice are never kept. Defaults to None (every row).
+
+    Returns:
+        CodedExport: The coded export.
+
+    Raises:
+        ValueError: If the shards are stored in different formats.
+    """
+    paths = order_by_age(expand_input_paths(input_path), newest_by)
+    formats = {detect_format(path, file_format) for path in paths}
+    if len(formats) > 1:
+        raise ValueError(f"Export shards must share one format, got {sorted(formats)}")
+    file_format = formats.pop()
+    if len(paths) == 1:
+        coded = _code_file(
+            paths[0], assessment_columns, question_columns, answer_column, chunksize, file_format, filters)
+    else:
+        coded = _load_shards(
+            paths,
+            assessment_columns,
+            question_columns,
+            answer_column,
+            chunksize,
+            file_format,
+            key_columns or DEFAULT_SHARD_KEY,
+            max_workers,
+            filters
+        )
+
+    answer_values = coded.answers
+    if file_format == 'csv':
+        converted = _convert_categories(answer_values)
+        if converted is not None:
+            answer_values = converted
+    coded = CodedExport(
+        assessments=_compact_table(coded.assessments, file_format),
+        questions=_compact_table(coded.questions, file_format),
+        answers=answer_values,
+        assessment_codes=_smallest_codes(coded.assessment_codes),
+        question_codes=_smallest_codes(coded.question_codes),
+        answer_codes=_smallest_codes(coded.answer_codes),
+        answer_column=answer_column,
+        conflicts=coded.conflicts
+    )
+    logger.info(coded.summary())
+    if coded.conflicts is not None and len(coded.conflicts):
+        logger.warning("%d answers differ between export shards; the newest shard was used", len(coded.conflicts))
+    return coded
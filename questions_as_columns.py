@@ -1,13 +1,41 @@
-from natsort import natsorted
+import json
+import logging
+import os
 import pandas as pd
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from export_loader import (
+    DEFAULT_CHUNKSIZE,
+    detect_format,
+    expand_input_paths,
+    load_export,
+    order_by_age,
+    read_export_streaming,
+    unique_columns
+)
+from instrumentation import Instrumentation, instrumented, stage
+from pivot_engine import pivot_answers
+from question_catalog import CodedExport, QuestionOrder, load_coded_export
+from report_writer import read_report, write_report, write_report_shards
+from result_cache import ResultCache, cached_result
+
+logger = logging.getLogger(__name__)
+
+# Identifies an assessment across exports; update_export replaces report rows by it.
+ASSESSMENT_KEY = 'assessmentId'
+
+# Joins question number and text into the combined question column, e.g. '1.1.1: Is your organization ...'.
+QUESTION_SEPARATOR = ': '
 
 
 def get_pivoted_data(
     df: pd.DataFrame,
     pivot_index: List[str],
     pivot_column: str,
-    pivot_value: str
+    pivot_value: str,
+    on_duplicate: str = 'first',
+    question_order: Optional[QuestionOrder] = None,
+    separator: Optional[str] = QUESTION_SEPARATOR
 ) -> pd.DataFrame:
     """
     Pivots the DataFrame based on specified index, column, and value.
@@ -17,32 +45,111 @@ def get_pivoted_data(
         pivot_index (List[str]): List of columns to set as the pivot index.
         pivot_column (str): The column to pivot on.
         pivot_value (str): The value column to aggregate.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once:
+            'first', 'last' or 'error' (see pivot_engine.pivot_answers). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks that order the question columns, see
+            order_question_columns. Defaults to None.
+        separator (str, optional): Ends the question number in a column name, see
+            order_question_columns. Defaults to QUESTION_SEPARATOR.
 
     Returns:
-        pd.DataFrame: The pivoted DataFrame.
+        pd.DataFrame: The pivoted DataFrame; attrs['conflicts'] lists cells with different answers.
     """
-    pivot_df = df.pivot_table(
-        index=pivot_index,
-        columns=pivot_column,
-        values=pivot_value,
-        aggfunc='first'
-    ).reset_index()
+    with stage('pivot') as record:
+        pivot_df = pivot_answers(
+            df,
+            index=pivot_index,
+            columns=pivot_column,
+            values=pivot_value,
+            on_duplicate=on_duplicate
+        ).reset_index()
+        record.set_output(pivot_df)
 
     # Extract assessment metadata columns (pivot_index)
-    metadata_columns = pivot_index
+    with stage('header') as record:
+        pivot_df = order_question_columns(pivot_df, pivot_index, question_order, separator)
+        record.set_output(pivot_df)
+    return pivot_df
 
-    # Extract question columns (all columns that are not in metadata)
-    question_columns = [
-        col for col in pivot_df.columns if col not in metadata_columns]
 
-    # Sort question columns using natural sorting
-    sorted_question_columns = natsorted(
-        question_columns, key=lambda col: str(col))
+def order_question_columns(
+    pivot_df: pd.DataFrame,
+    metadata_columns: List[str],
+    question_order: Optional[QuestionOrder] = None,
+    separator: Optional[str] = QUESTION_SEPARATOR
+) -> pd.DataFrame:
+    """
+    Puts the metadata columns first, followed by the question columns in natural order of their question number.
+
+    The question number is the part of a column name before separator. The
+    columns are ordered by an integer argsort of the numbers' ranks, so the
+    long question texts are never natural-sorted; equal numbers are ordered
+    by text.
+
+    Args:
+        pivot_df (pd.DataFrame): The pivoted DataFrame.
+        metadata_columns (List[str]): The assessment metadata columns.
+        question_order (QuestionOrder, optional): Ranks of the question numbers, updated with
+            new ones. Defaults to None (ranked from these columns).
+        separator (str, optional): Ends the question number in a column name; None ranks whole
+            names. Defaults to QUESTION_SEPARATOR.
+
+    Returns:
+        pd.DataFrame: The DataFrame with its columns reordered.
+    """
+    # Extract question columns (all columns that are not in metadata), in text order
+    question_columns = sorted((col for col in pivot_df.columns if col not in metadata_columns), key=str)
+    numbers = [str(col) if separator is None else str(col).split(separator, 1)[0] for col in question_columns]
+    if question_order is None:
+        question_order = QuestionOrder(numbers)
+    sorted_question_columns = [question_columns[position] for position in question_order.argsort(numbers)]
 
     # Reorder DataFrame with metadata columns first, followed by sorted question columns
-    pivot_df = pivot_df[metadata_columns + sorted_question_columns]
+    return pivot_df[metadata_columns + sorted_question_columns]
 
-    return pivot_df
+
+def _question_ranking(
+    pivot_column: str,
+    question_number_column: str,
+    question_new_column: str,
+    question_order: Optional[QuestionOrder]
+) -> Tuple[Optional[str], Optional[QuestionOrder]]:
+    """Picks the separator and the order that rank the columns pivoted from pivot_column."""
+    if pivot_column == question_new_column:
+        return QUESTION_SEPARATOR, question_order
+    if pivot_column == question_number_column:
+        return None, question_order
+    # other columns hold no question numbers, so they are ranked apart from the shared order
+    return None, None
+
+
+def get_report_columns(
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer'
+) -> List[str]:
+    """
+    Lists the export columns the questions-as-columns report reads.
+
+    Args:
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+
+    Returns:
+        List[str]: The required column names.
+    """
+    columns = unique_columns(
+        assessment_metadata,
+        get_question_columns(question_number_column, question_text_column, question_new_column, pivot_column)
+    )
+    return unique_columns(columns, [pivot_value])
 
 
 def transform_export(
@@ -52,7 +159,10 @@ def transform_export(
     question_text_column: str = 'questionText',
     question_new_column: str = 'question',
     pivot_column: str = 'question',
-    pivot_value: str = 'answer'
+    pivot_value: str = 'answer',
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first',
+    question_order: Optional[QuestionOrder] = None
 ) -> pd.DataFrame:
     """
     Transforms the exported DataFrame into the new report format.
@@ -65,19 +175,557 @@ def transform_export(
         question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
         pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
         pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        instrumentation (Instrumentation, optional): Records the question, pivot
+            and header stages. Defaults to None (not recorded).
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks that order the question columns naturally;
+            updated with new question numbers. Only used when pivot_column is the combined question
+            or the question number. Defaults to None (ranked from this export).
 
     Returns:
         pd.DataFrame: The transformed DataFrame ready for reporting.
     """
-    df[question_new_column] = df[question_number_column].astype(
-        str) + ": " + df[question_text_column]
-    pivot_df = get_pivoted_data(
-        df, assessment_metadata, pivot_column, pivot_value)
+    with instrumented(instrumentation):
+        with stage('question') as record:
+            df[question_new_column] = df[question_number_column].astype(
+                str) + QUESTION_SEPARATOR + df[question_text_column].astype(object)
+            record.set_output(df)
+        separator, question_order = _question_ranking(
+            pivot_column, question_number_column, question_new_column, question_order)
+        pivot_df = get_pivoted_data(
+            df, assessment_metadata, pivot_column, pivot_value, on_duplicate, question_order, separator)
     return pivot_df
 
 
+def get_question_columns(
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question'
+) -> List[str]:
+    """
+    Lists the export columns that describe a question rather than an assessment.
+
+    Args:
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+
+    Returns:
+        List[str]: The question column names.
+    """
+    columns = [question_number_column, question_text_column]
+    if pivot_column != question_new_column:
+        columns = unique_columns(columns, [pivot_column])
+    return columns
+
+
+def transform_coded_export(
+    coded: CodedExport,
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer',
+    instrumentation: Optional[Instrumentation] = None,
+    on_duplicate: str = 'first',
+    question_order: Optional[QuestionOrder] = None
+) -> pd.DataFrame:
+    """
+    Transforms a coded export into the new report format.
+
+    The combined question column is built once per catalog question instead
+    of once per export row, and the pivot runs on categorical columns rebuilt
+    from the codes.
+
+    Args:
+        coded (CodedExport): The export, coded with the assessment_metadata as assessment
+            columns, get_question_columns as question columns and pivot_value as answer column.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        instrumentation (Instrumentation, optional): Records the question, pivot
+            and header stages. Defaults to None (not recorded).
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        question_order (QuestionOrder, optional): Ranks that order the question columns naturally;
+            updated with new question numbers. Only used when pivot_column is the combined question
+            or the question number. Defaults to None (ranked from the question catalog).
+
+    Returns:
+        pd.DataFrame: The transformed DataFrame ready for reporting.
+    """
+    if question_order is None:
+        question_order = QuestionOrder(coded.questions[question_number_column])
+    with instrumented(instrumentation):
+        with stage('question') as record:
+            questions = coded.questions
+            questions[question_new_column] = questions[question_number_column].astype(
+                str) + QUESTION_SEPARATOR + questions[question_text_column].astype(object)
+            record.set_output(questions)
+        separator, question_order = _question_ranking(
+            pivot_column, question_number_column, question_new_column, question_order)
+        pivot_df = get_pivoted_data(
+            coded.to_frame(unique_columns(assessment_metadata, [pivot_column, pivot_value])),
+            assessment_metadata,
+            pivot_column,
+            pivot_value,
+            on_duplicate,
+            question_order,
+            separator
+        )
+    return pivot_df
+
+
+def update_export(
+    previous_df: pd.DataFrame,
+    delta_df: pd.DataFrame,
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer',
+    previous_assessments: Optional[pd.DataFrame] = None,
+    assessment_key: str = ASSESSMENT_KEY
+) -> pd.DataFrame:
+    """
+    Applies a delta export to a previously transformed report.
+
+    Only the delta is pivoted. Given the previous report's assessment rows
+    (see transform_assessments), every delta assessment replaces its own row
+    and the report is collapsed from them again: an assessment whose
+    metadata changed (e.g. a new grade) leaves its old report row, and other
+    assessments sharing that row keep their answers. Without them, report
+    rows are matched by their metadata: every row the delta produces
+    replaces the previous row with the same metadata, or is added when there
+    is none. Question columns that only the delta has are added, and the
+    column and row order is the one a full rebuild would give.
+
+    Args:
+        previous_df (pd.DataFrame): The earlier output of transform_export.
+        delta_df (pd.DataFrame): Export rows of the new or changed assessments.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        previous_assessments (pd.DataFrame, optional): Assessment rows of previous_df, see
+            transform_assessments. Defaults to None (rows are matched by their metadata only).
+        assessment_key (str, optional): Column identifying an assessment. Defaults to 'assessmentId'.
+
+    Returns:
+        pd.DataFrame: The updated report.
+    """
+    separator, _ = _question_ranking(pivot_column, question_number_column, question_new_column, None)
+    if previous_assessments is not None:
+        assessments = update_assessments(
+            previous_assessments,
+            delta_df,
+            assessment_metadata,
+            question_number_column,
+            question_text_column,
+            question_new_column,
+            pivot_column,
+            pivot_value,
+            assessment_key
+        )
+        return collapse_assessments(assessments, assessment_metadata, assessment_key, separator)
+
+    delta_pivot_df = transform_export(
+        delta_df,
+        assessment_metadata,
+        question_number_column,
+        question_text_column,
+        question_new_column,
+        pivot_column,
+        pivot_value
+    )
+    previous_rows = pd.MultiIndex.from_frame(previous_df[assessment_metadata])
+    delta_rows = pd.MultiIndex.from_frame(delta_pivot_df[assessment_metadata])
+    kept_df = previous_df[~previous_rows.isin(delta_rows)]
+
+    updated_df = pd.concat([kept_df, delta_pivot_df], ignore_index=True)
+    # pivoting sorts the rows by their metadata
+    updated_df = updated_df.sort_values(assessment_metadata, kind='stable', ignore_index=True)
+    return order_question_columns(updated_df, assessment_metadata, separator=separator)
+
+
+def transform_assessments(
+    df: pd.DataFrame,
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer',
+    assessment_key: str = ASSESSMENT_KEY,
+    on_duplicate: str = 'first'
+) -> pd.DataFrame:
+    """
+    Transforms export rows into one report row per assessment, for update_export.
+
+    The rows are in order of the assessments' first export row, the order
+    in which a report row shared by several assessments takes their answers.
+
+    Args:
+        df (pd.DataFrame): Export rows, including assessment_key.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        assessment_key (str, optional): Column identifying an assessment. Defaults to 'assessmentId'.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Defaults to 'first'.
+
+    Returns:
+        pd.DataFrame: assessment_key, the assessment_metadata and the question columns.
+    """
+    assessments = transform_export(
+        df,
+        unique_columns([assessment_key], assessment_metadata),
+        question_number_column,
+        question_text_column,
+        question_new_column,
+        pivot_column,
+        pivot_value,
+        on_duplicate=on_duplicate
+    )
+    first_seen = pd.Index(pd.unique(df[assessment_key]))
+    return assessments.sort_values(
+        assessment_key, key=lambda ids: pd.Series(first_seen.get_indexer(ids), index=ids.index), kind='stable'
+    ).reset_index(drop=True)
+
+
+def update_assessments(
+    previous_assessments: pd.DataFrame,
+    delta_df: pd.DataFrame,
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer',
+    assessment_key: str = ASSESSMENT_KEY
+) -> pd.DataFrame:
+    """
+    Replaces the assessment rows of every assessment in a delta export.
+
+    Args:
+        previous_assessments (pd.DataFrame): Assessment rows, see transform_assessments.
+        delta_df (pd.DataFrame): Export rows of the new or changed assessments.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        assessment_key (str, optional): Column identifying an assessment. Defaults to 'assessmentId'.
+
+    Returns:
+        pd.DataFrame: The updated assessment rows; the delta's assessments come last.
+    """
+    delta_assessments = transform_assessments(
+        delta_df,
+        assessment_metadata,
+        question_number_column,
+        question_text_column,
+        question_new_column,
+        pivot_column,
+        pivot_value,
+        assessment_key
+    )
+    # a key column read back from a file may hold numbers as text, e.g. next to text ids
+    replaced = previous_assessments[assessment_key].astype(str).isin(delta_df[assessment_key].astype(str))
+    kept = previous_assessments[~replaced]
+    assessments = _drop_unanswered_columns(
+        pd.concat([kept, delta_assessments], ignore_index=True), unique_columns([assessment_key], assessment_metadata))
+    separator, _ = _question_ranking(pivot_column, question_number_column, question_new_column, None)
+    return order_question_columns(assessments, unique_columns([assessment_key], assessment_metadata), separator=separator)
+
+
+def collapse_assessments(
+    assessments: pd.DataFrame,
+    assessment_metadata: List[str],
+    assessment_key: str = ASSESSMENT_KEY,
+    separator: Optional[str] = QUESTION_SEPARATOR
+) -> pd.DataFrame:
+    """
+    Turns assessment rows into the report: one row per distinct metadata.
+
+    Each cell takes the first answer among the assessments sharing the row,
+    as pivoting their export rows with on_duplicate='first' does.
+
+    Args:
+        assessments (pd.DataFrame): Assessment rows, see transform_assessments.
+        assessment_metadata (List[str]): List of metadata fields the report rows are keyed by.
+        assessment_key (str, optional): Column identifying an assessment. Defaults to 'assessmentId'.
+        separator (str, optional): Ends the question number in a column name, see
+            order_question_columns. Defaults to QUESTION_SEPARATOR.
+
+    Returns:
+        pd.DataFrame: The report.
+    """
+    question_columns = [
+        col for col in assessments.columns if col not in assessment_metadata and col != assessment_key]
+    report_df = assessments.groupby(assessment_metadata, sort=True, observed=True)[question_columns].first()
+    # first() leaves None in the object cells no assessment answered, the pivot leaves NaN
+    report_df = report_df.where(report_df.notna())
+    report_df = _drop_unanswered_columns(report_df.reset_index(), assessment_metadata)
+    return order_question_columns(report_df, assessment_metadata, separator=separator)
+
+
+def _drop_unanswered_columns(df: pd.DataFrame, key_columns: List[str]) -> pd.DataFrame:
+    # a question only replaced assessments answered has no column in a full rebuild
+    answered = df.drop(columns=key_columns).notna().any()
+    return df[key_columns + answered.index[answered].tolist()]
+
+
+def assessments_path(output_path: str) -> str:
+    """
+    Names the file holding the assessment rows of a report, written next to it.
+
+    Args:
+        output_path (str): Path of the report.
+
+    Returns:
+        str: e.g. 'report.assessments.csv' for 'report.csv'.
+    """
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}.assessments{extension}"
+
+
+def _read_report_file(input_path: str, file_format: Optional[str] = None, encoding: str = 'utf-8') -> pd.DataFrame:
+    """Reads a CSV, Parquet or Arrow IPC report written by write_report."""
+    if detect_format(input_path, file_format) == 'csv':
+        return pd.read_csv(input_path, encoding=encoding)
+    return read_report(input_path, file_format)
+
+
+def write_assessments(
+    assessments: pd.DataFrame, output_path: str, output_format: Optional[str] = None, encoding: str = 'utf-8'
+) -> None:
+    """
+    Writes the assessment rows of a report next to it, in the report's format.
+
+    XLSX reports get none, as update_main cannot read them.
+
+    Args:
+        assessments (pd.DataFrame): The assessment rows, see transform_assessments.
+        output_path (str): Path of the report.
+        output_format (str, optional): Format of the report. Defaults to its file extension.
+        encoding (str, optional): Encoding of a CSV file. Defaults to 'utf-8'.
+    """
+    if detect_format(output_path, output_format) != 'xlsx':
+        write_report(assessments, assessments_path(output_path), output_format, encoding=encoding)
+
+
+def update_main(
+    previous_output_path: str,
+    delta_input_path: str,
+    output_csv_path: str,
+    assessment_metadata: List[str],
+    question_number_column: str = 'questionNumber',
+    question_text_column: str = 'questionText',
+    question_new_column: str = 'question',
+    pivot_column: str = 'question',
+    pivot_value: str = 'answer',
+    encoding: str = 'utf-8',
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    assessment_key: str = ASSESSMENT_KEY
+) -> None:
+    """
+    Updates a saved questions-as-columns report with a delta export.
+
+    When main wrote the previous report's assessment rows next to it (see
+    assessments_path), each delta assessment replaces its own row, see
+    update_export, and the updated rows are written next to the updated
+    report. Otherwise report rows are matched by their metadata only.
+
+    Args:
+        previous_output_path (str): Path to the earlier report (CSV, Parquet or Arrow IPC).
+        delta_input_path (str): Path to the delta export.
+        output_csv_path (str): Path where the updated report will be saved.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
+        question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
+        question_new_column (str, optional): New column name for combined question. Defaults to 'question'.
+        pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
+        pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
+        encoding (str, optional): Encoding for the output CSV. Defaults to 'utf-8'.
+        input_format (str, optional): Format of the delta export. Defaults to its file extension.
+        output_format (str, optional): Format of both reports. Defaults to the file extensions.
+        assessment_key (str, optional): Column identifying an assessment. Defaults to 'assessmentId'.
+    """
+    previous_assessments_path = assessments_path(previous_output_path)
+    previous_assessments = None
+    if os.path.exists(previous_assessments_path):
+        previous_assessments = _read_report_file(previous_assessments_path, output_format, encoding)
+    else:
+        logger.warning(
+            "No assessment rows at %s; report rows are matched by their metadata", previous_assessments_path)
+    columns = get_report_columns(
+        assessment_metadata,
+        question_number_column,
+        question_text_column,
+        question_new_column,
+        pivot_column,
+        pivot_value
+    )
+    if previous_assessments is None:
+        delta_df, _ = load_export(delta_input_path, columns, file_format=input_format)
+        updated_df = update_export(
+            _read_report_file(previous_output_path, output_format, encoding),
+            delta_df,
+            assessment_metadata,
+            question_number_column,
+            question_text_column,
+            question_new_column,
+            pivot_column,
+            pivot_value
+        )
+    else:
+        delta_df, _ = load_export(
+            delta_input_path, unique_columns([assessment_key], columns), file_format=input_format)
+        assessments = update_assessments(
+            previous_assessments,
+            delta_df,
+            assessment_metadata,
+            question_number_column,
+            question_text_column,
+            question_new_column,
+            pivot_column,
+            pivot_value,
+            assessment_key
+        )
+        separator, _ = _question_ranking(pivot_column, question_number_column, question_new_column, None)
+        updated_df = collapse_assessments(assessments, assessment_metadata, assessment_key, separator)
+        write_assessments(assessments, output_csv_path, output_format, encoding)
+    write_report(
+        updated_df, output_csv_path, output_format, encoding=encoding, key_columns=len(assessment_metadata))
+
+
+def get_question_sections(questions: pd.DataFrame, pivot_column: str, split_by: str) -> Dict[Any, str]:
+    """
+    Maps every question column of the report to its section.
+
+    Args:
+        questions (pd.DataFrame): Export rows or question catalog holding pivot_column and split_by.
+        pivot_column (str): The column the report was pivoted on.
+        split_by (str): The section column, e.g. 'sectionName' or 'subsectionName'.
+
+    Returns:
+        Dict[Any, str]: Section of each question; '' for questions without one.
+    """
+    sections = questions[[pivot_column, split_by]].drop_duplicates(pivot_column)
+    return dict(zip(sections[pivot_column], sections[split_by].astype(object).fillna('')))
+
+
+def group_question_columns(
+    report_df: pd.DataFrame,
+    question_sections: Dict[Any, str],
+    assessment_metadata: List[str]
+) -> List[Tuple[str, List[Any]]]:
+    """
+    Groups the question columns of a report by section.
+
+    Args:
+        report_df (pd.DataFrame): The output of transform_export.
+        question_sections (Dict[Any, str]): Section of each question, see get_question_sections.
+        assessment_metadata (List[str]): The metadata columns, left out of the groups.
+
+    Returns:
+        List[Tuple[str, List[Any]]]: Each section with its questions, both in report (natural) order.
+    """
+    groups: Dict[str, List[Any]] = {}
+    for col in report_df.columns:
+        if col not in assessment_metadata:
+            groups.setdefault(question_sections.get(col, ''), []).append(col)
+    return list(groups.items())
+
+
+def manifest_path(output_path: str) -> str:
+    """
+    Names the manifest of a report split by section.
+
+    Args:
+        output_path (str): Path the whole report would have been written to.
+
+    Returns:
+        str: e.g. 'report.manifest.json' for 'report.csv'.
+    """
+    return f"{os.path.splitext(output_path)[0]}.manifest.json"
+
+
+def write_section_shards(
+    report_df: pd.DataFrame,
+    output_path: str,
+    question_sections: Dict[Any, str],
+    assessment_metadata: List[str],
+    split_by: str,
+    output_format: Optional[str] = None,
+    encoding: str = 'utf-8',
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Writes a report as one file per section, in parallel, with a manifest.
+
+    Every shard holds the assessment_metadata columns followed by the
+    section's questions in natural order (see report_writer.write_report_shards).
+    The manifest, written next to the shards, lists every shard file with its
+    section and questions.
+
+    Args:
+        report_df (pd.DataFrame): The output of transform_export.
+        output_path (str): Path the whole report would have been written to.
+        question_sections (Dict[Any, str]): Section of each question, see get_question_sections.
+        assessment_metadata (List[str]): List of metadata fields, repeated in every shard.
+        split_by (str): The section column, recorded in the manifest.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        encoding (str, optional): Encoding for CSV shards. Defaults to 'utf-8'.
+        max_workers (int, optional): Shards written at once. Defaults to the CPU count.
+
+    Returns:
+        Dict[str, Any]: The manifest.
+    """
+    groups = group_question_columns(report_df, question_sections, assessment_metadata)
+    paths = write_report_shards(
+        report_df,
+        output_path,
+        [questions for _, questions in groups],
+        output_format,
+        encoding,
+        key_columns=len(assessment_metadata),
+        max_workers=max_workers
+    )
+    manifest = {
+        'split_by': split_by,
+        'assessment_metadata': assessment_metadata,
+        'rows': len(report_df),
+        'shards': [
+            {'path': os.path.basename(path), 'section': section, 'questions': [str(col) for col in questions]}
+            for path, (section, questions) in zip(paths, groups)
+        ],
+    }
+    with open(manifest_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
 def main(
-    input_csv_path: str,
+    input_csv_path: Union[str, Sequence[str]],
     output_csv_path: str,
     assessment_metadata: List[str],
     question_number_column: str = 'questionNumber',
@@ -85,14 +733,29 @@ def main(
     question_new_column: str = 'question',
     pivot_column: str = 'question',
     pivot_value: str = 'answer',
-    encoding: str = 'utf-8'
+    encoding: str = 'utf-8',
+    chunksize: Optional[int] = None,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    cache: Optional[ResultCache] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    shard_key: Optional[List[str]] = None,
+    newest_by: str = 'mtime',
+    max_workers: Optional[int] = None,
+    on_duplicate: str = 'first',
+    filters: Optional[Dict[str, Any]] = None,
+    split_by: Optional[str] = None,
+    write_workers: Optional[int] = None,
+    question_order_path: Optional[str] = None,
+    assessment_key: Optional[str] = None
 ) -> None:
     """
     Processes the data export and generates a transformed report.
 
     Args:
-        input_csv_path (str): Path to the input CSV file.
-        output_csv_path (str): Path where the output CSV will be saved.
+        input_csv_path (Union[str, Sequence[str]]): Path to the input CSV, Parquet or Arrow IPC file,
+            or a glob pattern or list of export shards (see question_catalog.load_coded_export).
+        output_csv_path (str): Path where the output CSV (or Parquet/Arrow IPC/XLSX) will be saved.
         assessment_metadata (List[str]): List of metadata fields to include.
         question_number_column (str, optional): Column name for question number. Defaults to 'questionNumber'.
         question_text_column (str, optional): Column name for question text. Defaults to 'questionText'.
@@ -100,13 +763,42 @@ def main(
         pivot_column (str, optional): The column to pivot on. Defaults to 'question'.
         pivot_value (str, optional): The value column to aggregate. Defaults to 'answer'.
         encoding (str, optional): Encoding for the output CSV. Defaults to 'utf-8'.
+        chunksize (int, optional): Read the export in chunks of this many rows so
+            memory follows the report size instead of the export size. Defaults to None (read at once).
+            Shards are always coded chunk by chunk.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the input file extension.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        cache (ResultCache, optional): Reuse the transformed report of an earlier run on the
+            same export contents and arguments. Defaults to None (always transform).
+        instrumentation (Instrumentation, optional): Records wall time, peak memory and output
+            shape of the read, question, pivot, header and write stages. Defaults to None.
+        shard_key (List[str], optional): Columns identifying one answer across shards; the
+            newest shard's answers win. Defaults to assessmentId and questionNumber.
+        newest_by (str, optional): 'mtime' or 'order' (last given is newest). Defaults to 'mtime'.
+        max_workers (int, optional): Shards read at once. Defaults to the thread pool default.
+        on_duplicate (str, optional): Answer kept when a cell is answered more than once: 'first',
+            'last' or 'error'. Conflicting cells are listed in the report's attrs['conflicts']
+            (see pivot_engine.get_conflicts). Defaults to 'first'.
+        filters (Dict[str, Any], optional): Equality/IN filters on export columns, e.g.
+            {'period': 2024, 'industry': ['IT', 'Finance']}, and export_loader.ValueRange
+            filters, e.g. {'grade': ValueRange(50, 80)}. They are applied to every chunk as it
+            is read, so only the selected slice is kept. Defaults to None (every row).
+        split_by (str, optional): Export column, e.g. 'sectionName' or 'subsectionName', to split
+            the question columns by: every section is written to its own file next to a manifest,
+            see write_section_shards. Defaults to None (one report file).
+        write_workers (int, optional): Section files written at once. Defaults to the CPU count.
+        question_order_path (str, optional): JSON file keeping the natural order of the question
+            numbers across runs (see question_catalog.QuestionOrder); created when missing and
+            updated with new numbers. Defaults to None (ordered from this export alone).
+        assessment_key (str, optional): Column identifying an assessment, e.g. 'assessmentId'. When
+            given, a report written to one file gets its assessment rows written next to it (see
+            assessments_path), so update_main can apply delta exports that change an assessment's
+            metadata. Defaults to None (no assessment rows).
     """
-    # Read input data
-    df = pd.read_csv(input_csv_path)
-
-    # Transform data
-    transformed_df = transform_export(
-        df,
+    question_order = QuestionOrder.load(question_order_path) if question_order_path else None
+    # the assessment rows are only kept for reports written to one file
+    key_columns = [] if split_by is not None or assessment_key is None else [assessment_key]
+    columns = get_report_columns(
         assessment_metadata,
         question_number_column,
         question_text_column,
@@ -114,9 +806,129 @@ def main(
         pivot_column,
         pivot_value
     )
+    question_columns = get_question_columns(
+        question_number_column, question_text_column, question_new_column, pivot_column)
+    if split_by is not None:
+        columns = unique_columns(columns, [split_by])
+        question_columns = unique_columns(question_columns, [split_by])
+
+    input_paths = order_by_age(expand_input_paths(input_csv_path), newest_by)
+    # the chunked reader keeps each distinct answer per cell once, in order, which loses the last
+    # answer when an earlier one repeats it, so 'last' reads the coded export
+    streaming = bool(chunksize) and len(input_paths) == 1 and on_duplicate != 'last'
+
+    def read_and_transform() -> Tuple[pd.DataFrame, Optional[Dict[Any, str]], Optional[pd.DataFrame]]:
+        # Read input data
+        with stage('read') as record:
+            if streaming:
+                df, _ = read_export_streaming(
+                    input_paths[0],
+                    key_columns=[col for col in unique_columns(columns, key_columns) if col != pivot_value],
+                    value_column=pivot_value,
+                    chunksize=chunksize,
+                    file_format=input_format,
+                    filters=filters
+                )
+                record.set_output(df)
+            else:
+                coded = load_coded_export(
+                    input_paths,
+                    assessment_columns=unique_columns(assessment_metadata, key_columns),
+                    question_columns=question_columns,
+                    answer_column=pivot_value,
+                    chunksize=chunksize or DEFAULT_CHUNKSIZE,
+                    file_format=input_format,
+                    key_columns=shard_key,
+                    newest_by='order',
+                    max_workers=max_workers,
+                    filters=filters
+                )
+                record.set_output(coded)
+
+        # Transform data
+        if streaming:
+            report_df = transform_export(
+                df,
+                assessment_metadata,
+                question_number_column,
+                question_text_column,
+                question_new_column,
+                pivot_column,
+                pivot_value,
+                on_duplicate=on_duplicate,
+                question_order=question_order
+            )
+        else:
+            report_df = transform_coded_export(
+                coded,
+                assessment_metadata,
+                question_number_column,
+                question_text_column,
+                question_new_column,
+                pivot_column,
+                pivot_value,
+                on_duplicate=on_duplicate,
+                question_order=question_order
+            )
+        if question_order is not None:
+            # saved only here: a cached report never loads new numbers into the order
+            question_order.save(question_order_path)
+        if split_by is not None:
+            sections = get_question_sections(df if streaming else coded.questions, pivot_column, split_by)
+            return report_df, sections, None
+        if not key_columns:
+            return report_df, None, None
+        assessments = transform_assessments(
+            df if streaming else coded.to_frame(unique_columns(key_columns, columns)),
+            assessment_metadata,
+            question_number_column,
+            question_text_column,
+            question_new_column,
+            pivot_column,
+            pivot_value,
+            assessment_key,
+            on_duplicate
+        )
+        return report_df, None, assessments
+
+    with instrumented(instrumentation):
+        transformed_df = cached_result(
+            cache,
+            input_paths,
+            {
+                'report': 'questions_as_columns',
+                'input_format': input_format,
+                'shard_key': shard_key,
+                'filters': filters,
+                'assessment_metadata': assessment_metadata,
+                'question_number_column': question_number_column,
+                'question_text_column': question_text_column,
+                'question_new_column': question_new_column,
+                'pivot_column': pivot_column,
+                'pivot_value': pivot_value,
+                'on_duplicate': on_duplicate,
+                'split_by': split_by,
+                'assessment_key': key_columns,
+            },
+            read_and_transform
+        )
+        transformed_df, question_sections, assessments = transformed_df
 
-    # Output the transformed data
-    transformed_df.to_csv(output_csv_path, encoding=encoding, index=False)
+        # Output the transformed data
+        with stage('write') as record:
+            if split_by is None:
+                write_report(
+                    transformed_df, output_csv_path, output_format,
+                    encoding=encoding, key_columns=len(assessment_metadata)
+                )
+                if assessments is not None:
+                    write_assessments(assessments, output_csv_path, output_format, encoding)
+            else:
+                write_section_shards(
+                    transformed_df, output_csv_path, question_sections, assessment_metadata, split_by,
+                    output_format, encoding, write_workers
+                )
+            record.set_output(transformed_df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,294 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+# pandas and the report modules are imported in run_job, only when a report is
+# actually built, so --help, bad arguments and cache hits never load them.
+from export_paths import SHARD_ORDERS, expand_input_paths, order_by_age
+from result_cache import ResultCache, make_key
+
+logger = logging.getLogger(__name__)
+
+# Report name -> module whose main builds it.
+REPORT_MODULES = {
+    'comparison': 'assessment_comparison_report',
+    'questions_as_columns': 'questions_as_columns',
+}
+
+DUPLICATE_POLICIES = ('first', 'last', 'error')
+
+# Subdirectory of --cache-dir holding the bytes of written reports.
+REPORT_CACHE_DIRECTORY = 'reports'
+
+# Job options that make main write files next to the report, which the report cache does not hold.
+SIDE_FILE_OPTIONS = ('split_by', 'question_order_path', 'assessment_key')
+
+
+def parse_filter(text: str) -> Tuple[str, Any]:
+    """
+    Reads one --filter argument.
+
+    Args:
+        text (str): 'column=value', 'column=value,value' for IN, or 'column=low..high'
+            for an inclusive range where either bound may be left out.
+
+    Returns:
+        Tuple[str, Any]: The column and its value, values or range text.
+
+    Raises:
+        argparse.ArgumentTypeError: If the text has no column or a range bound is not a number.
+    """
+    column, separator, value = text.partition('=')
+    if not separator or not column:
+        raise argparse.ArgumentTypeError(f"Not a filter: {text!r}; expected 'column=value'")
+    if '..' in value:
+        # checked here so a bad range fails before pandas is imported
+        for bound in value.split('..', 1):
+            try:
+                if bound.strip():
+                    float(bound)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"Not a range of numbers: {value!r}") from None
+        return column, value
+    return column, value.split(',') if ',' in value else value
+
+
+def _comma_list(text: str) -> List[str]:
+    return [item for item in text.split(',') if item]
+
+
+def _build_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns 'low..high' filter values into export_loader.ValueRange filters."""
+    from export_loader import ValueRange
+
+    return {
+        column: ValueRange.parse(value) if isinstance(value, str) and '..' in value else value
+        for column, value in filters.items()
+    }
+
+
+def job_cache_key(job: Dict[str, Any]) -> str:
+    """
+    Builds the cache key of a job's written report without loading any report module.
+
+    Args:
+        job (Dict[str, Any]): The job, as taken by run_job.
+
+    Returns:
+        str: Hex digest of the export contents, the report arguments and the output format.
+    """
+    arguments = dict(job)
+    output_path = arguments.pop('output_csv_path')
+    input_paths = order_by_age(
+        expand_input_paths(arguments.pop('input_csv_path')), arguments.get('newest_by', 'mtime'))
+    # the same report written to another file of the same kind is the same bytes
+    arguments['output_extension'] = os.path.splitext(output_path)[1].lower()
+    return make_key(input_paths, arguments)
+
+
+def run_job(job: Dict[str, Any], cache_dir: Optional[str] = None) -> bool:
+    """
+    Writes one report, or copies it from the report cache.
+
+    On a hit the cached bytes are written to the output path without
+    importing pandas. On a miss the report module is imported, its main
+    builds the report and the written file is stored in the cache. Jobs
+    whose main also writes other files (section files, a question order or
+    assessment rows, see SIDE_FILE_OPTIONS) are not cached, as a hit would
+    leave those files stale or missing.
+
+    Args:
+        job (Dict[str, Any]): 'report' ('comparison' or 'questions_as_columns') and the
+            keyword arguments of that module's main. 'filters' values may be written as
+            'low..high' for ranges.
+        cache_dir (str, optional): Directory of the report cache. Defaults to None (always build).
+
+    Returns:
+        bool: Whether the report came from the cache.
+
+    Raises:
+        ValueError: If the report type is unknown.
+    """
+    job = dict(job)
+    report = job.pop('report', 'comparison')
+    if report not in REPORT_MODULES:
+        raise ValueError(f"Unknown report type {report!r}; expected one of {list(REPORT_MODULES)}")
+
+    cache = key = None
+    if cache_dir is not None and not any(job.get(option) for option in SIDE_FILE_OPTIONS):
+        cache = ResultCache(os.path.join(cache_dir, REPORT_CACHE_DIRECTORY))
+        key = job_cache_key({'report': report, **job})
+        data = cache.get(key)
+        if data is not None:
+            with open(job['output_csv_path'], 'wb') as f:
+                f.write(data)
+            return True
+
+    if job.get('filters'):
+        job['filters'] = _build_filters(job['filters'])
+    module = importlib.import_module(REPORT_MODULES[report])
+    module.main(**job)
+    if cache is not None:
+        with open(job['output_csv_path'], 'rb') as f:
+            cache.put(key, f.read())
+    return False
+
+
+def read_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads a job file: a JSON list of jobs, or one JSON job per line.
+
+    Args:
+        path (str): Path to the job file.
+
+    Returns:
+        List[Dict[str, Any]]: The jobs, as taken by run_job.
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def run_jobs(jobs: List[Dict[str, Any]], cache_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Runs jobs one after another in this process, so the imports are paid once.
+
+    A failing job is logged and recorded and does not stop the rest.
+
+    Args:
+        jobs (List[Dict[str, Any]]): The jobs, as taken by run_job.
+        cache_dir (str, optional): Directory of the report cache. Defaults to None (always build).
+
+    Returns:
+        List[Dict[str, Any]]: Per job its output path, seconds, whether it was cached and the error, if any.
+    """
+    results = []
+    for job in jobs:
+        start_time = time.perf_counter()
+        result = {'output': job.get('output_csv_path'), 'cached': False, 'error': None}
+        try:
+            result['cached'] = run_job(job, cache_dir)
+        except Exception:
+            result['error'] = traceback.format_exc()
+            logger.warning("Job for %s failed:\n%s", result['output'], result['error'])
+        result['seconds'] = round(time.perf_counter() - start_time, 4)
+        results.append(result)
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Build assessment reports from exports.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('input', nargs='+', help="Export file(s) or glob patterns of export shards.")
+    common.add_argument('-o', '--output', required=True, help="Report path; the extension picks the format.")
+    common.add_argument(
+        '-m', '--metadata', type=_comma_list, required=True, help="Comma separated assessment metadata fields.")
+    common.add_argument('--encoding', help="Encoding of a CSV report. Defaults to utf-8.")
+    common.add_argument('--input-format', choices=('csv', 'parquet', 'arrow'))
+    common.add_argument('--output-format', choices=('csv', 'parquet', 'arrow', 'xlsx'))
+    common.add_argument('--chunksize', type=int)
+    common.add_argument(
+        '--filter', dest='filters', type=parse_filter, action='append',
+        help="column=value, column=a,b or column=low..high; repeat for several columns.")
+    common.add_argument('--on-duplicate', choices=DUPLICATE_POLICIES)
+    common.add_argument('--shard-key', type=_comma_list)
+    common.add_argument('--newest-by', choices=SHARD_ORDERS)
+    common.add_argument('--max-workers', type=int)
+    common.add_argument('--cache-dir', help="Reuse reports written earlier from the same export and arguments.")
+    common.add_argument(
+        '--question-order', dest='question_order_path',
+        help="JSON file keeping the natural order of question numbers across runs.")
+
+    comparison = commands.add_parser(
+        'comparison', parents=[common], help="Questions as rows, one column per assessment.")
+    comparison.add_argument(
+        '--pivot-index', type=_comma_list, default=['questionNumber', 'questionText'],
+        help="Comma separated question columns. Defaults to questionNumber,questionText.")
+    comparison.add_argument('--pivot-column', default='assessmentId')
+    comparison.add_argument('--pivot-value', default='answer')
+
+    questions = commands.add_parser(
+        'questions_as_columns', parents=[common], help="Assessments as rows, one column per question.")
+    questions.add_argument('--pivot-column', help="Defaults to the combined question number and text.")
+    questions.add_argument('--pivot-value', help="Defaults to answer.")
+    questions.add_argument(
+        '--split-by', help="Write one file per value of this column, e.g. sectionName, plus a manifest.")
+    questions.add_argument('--write-workers', type=int, help="Section files written at once.")
+    questions.add_argument(
+        '--assessment-key', help="Write the assessment rows next to the report, keyed by this column, e.g. "
+        "assessmentId, so questions_as_columns.update_main can apply delta exports to it.")
+
+    jobs = commands.add_parser('jobs', help="Run every job of a job file in this process.")
+    jobs.add_argument('job_file', help="JSON list of jobs, or one JSON job per line: 'report' plus main arguments.")
+    jobs.add_argument('--cache-dir', help="Reuse reports written earlier from the same export and arguments.")
+    return parser
+
+
+def job_from_arguments(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Turns the arguments of a report command into a job for run_job.
+
+    Options that were not given are left out, so the report's main defaults apply.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of the 'comparison' or 'questions_as_columns' command.
+
+    Returns:
+        Dict[str, Any]: The job.
+    """
+    job = {
+        'report': args.command,
+        'input_csv_path': args.input[0] if len(args.input) == 1 else args.input,
+        'output_csv_path': args.output,
+        'assessment_metadata': args.metadata,
+    }
+    if args.filters:
+        job['filters'] = dict(args.filters)
+    for name in (
+        'pivot_index', 'pivot_column', 'pivot_value', 'encoding', 'input_format', 'output_format',
+        'chunksize', 'on_duplicate', 'shard_key', 'newest_by', 'max_workers', 'split_by', 'write_workers',
+        'question_order_path', 'assessment_key',
+    ):
+        value = getattr(args, name, None)
+        if value is not None:
+            job[name] = value
+    return job
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the command line.
+
+    Args:
+        argv (List[str], optional): Arguments without the program name. Defaults to sys.argv[1:].
+
+    Returns:
+        int: Exit status, 1 when the report or a job failed; the error is logged.
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == 'jobs':
+        results = run_jobs(read_jobs(args.job_file), args.cache_dir)
+        for result in results:
+            print(json.dumps(result))
+        return int(any(result['error'] for result in results))
+    try:
+        run_job(job_from_arguments(args), args.cache_dir)
+    except Exception:
+        logger.error("Report %s failed:\n%s", args.output, traceback.format_exc())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,367 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from batch_reports import ReportSpec, build_report
+from export_loader import ValueRange, load_export
+from report_writer import iter_csv_report
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that configure the report; every other parameter is a filter on that column.
+_REPORT_PARAMETERS = ('assessment_metadata', 'pivot_index', 'pivot_column', 'pivot_value')
+
+_ENDPOINTS = {
+    '/comparison': 'comparison',
+    '/questions-as-columns': 'questions_as_columns',
+}
+
+DEFAULT_ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+# The export a report worker builds from, set by its pool's initializer.
+_SERVICE_EXPORT: Optional[pd.DataFrame] = None
+
+
+class RequestError(ValueError):
+    """A report request the service cannot serve, answered with 400 Bad Request."""
+
+
+@dataclass
+class LoadedDataset:
+    """
+    An export held in memory.
+
+    Attributes:
+        df (pd.DataFrame): The export, with repetitive strings as categoricals.
+        input_path (str): Where it was loaded from.
+        loaded_at (float): Epoch time of the load.
+    """
+    df: pd.DataFrame
+    input_path: str
+    loaded_at: float
+
+
+def load_dataset(input_path: str, input_format: Optional[str] = None) -> LoadedDataset:
+    """
+    Loads every column of an export in its compact form.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+
+    Returns:
+        LoadedDataset: The loaded export.
+    """
+    df, _ = load_export(input_path, None, file_format=input_format)
+    return LoadedDataset(df, input_path, time.time())
+
+
+def _parse_filter(values: List[str]) -> Any:
+    if len(values) == 1 and '..' in values[0]:
+        try:
+            return ValueRange.parse(values[0])
+        except ValueError as error:
+            raise RequestError(str(error)) from error
+    return values
+
+
+def parse_report_request(report: str, query: Dict[str, List[str]], columns: pd.Index) -> ReportSpec:
+    """
+    Turns the query string of a report request into a report spec.
+
+    List parameters (assessment_metadata, pivot_index) are comma separated.
+    Any other parameter filters the export on the column of the same name;
+    repeating it selects several values, and a single 'low..high' value
+    (e.g. grade=50..80 or grade=50..) selects a range.
+
+    Args:
+        report (str): 'comparison' or 'questions_as_columns'.
+        query (Dict[str, List[str]]): The parsed query string.
+        columns (pd.Index): Columns of the loaded export.
+
+    Returns:
+        ReportSpec: The spec of the requested report.
+
+    Raises:
+        RequestError: If a parameter names a column the export does not have or a range is malformed.
+    """
+    spec = {'name': report, 'output_path': '', 'report': report}
+    if 'assessment_metadata' in query:
+        spec['assessment_metadata'] = query['assessment_metadata'][-1].split(',')
+    else:
+        spec['assessment_metadata'] = DEFAULT_ASSESSMENT_METADATA
+    if 'pivot_index' in query:
+        spec['pivot_index'] = query['pivot_index'][-1].split(',')
+    for name in ('pivot_column', 'pivot_value'):
+        if name in query:
+            spec[name] = query[name][-1]
+    spec['filters'] = {
+        name: _parse_filter(values) for name, values in query.items() if name not in _REPORT_PARAMETERS}
+
+    spec = ReportSpec.from_dict(spec)
+    unknown = [col for col in spec.required_columns() if col not in columns]
+    if unknown:
+        raise RequestError(f"Unknown columns: {', '.join(unknown)}")
+    return spec
+
+
+def _set_service_export(df: pd.DataFrame) -> None:
+    global _SERVICE_EXPORT
+    _SERVICE_EXPORT = df
+
+
+def _build_service_report(spec: ReportSpec) -> pd.DataFrame:
+    return build_report(_SERVICE_EXPORT, spec)
+
+
+class ReportService:
+    """
+    Serves both report types from an export loaded once.
+
+    Reports are built in a process pool, so the pivots run outside the
+    process that answers requests: a slow pivot neither holds the GIL nor
+    holds up other requests. The workers are started by a forkserver (or
+    spawned) rather than forked from this multi-threaded server, and get the
+    export from the pool's initializer. reload() loads a new export while
+    requests keep using the current one, then starts a new pool for it; the
+    old pool finishes the requests in flight, so a reload never affects
+    them. A pool broken by a dying worker is restarted and the report
+    retried once.
+
+    Attributes:
+        input_path (str): Export served by default and reloaded by reload().
+        input_format (str, optional): Format of the export.
+        max_workers (int, optional): Report worker processes; 0 builds in the request thread.
+    """
+
+    def __init__(self, input_path: str, max_workers: Optional[int] = None, input_format: Optional[str] = None):
+        self.input_path = input_path
+        self.input_format = input_format
+        self.max_workers = max_workers
+        self._reload_lock = threading.Lock()
+        # guards swapping the dataset and its pool against submitting to a pool being shut down
+        self._pool_lock = threading.Lock()
+        self._dataset = load_dataset(input_path, input_format)
+        self._executor = self._start_executor(self._dataset)
+
+    @property
+    def dataset(self) -> LoadedDataset:
+        return self._dataset
+
+    def _start_executor(self, dataset: LoadedDataset) -> Optional[ProcessPoolExecutor]:
+        """Starts the worker pool that builds the reports of a dataset."""
+        if self.max_workers == 0:
+            return None
+        # forking a process whose other threads may hold locks can deadlock the child
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_set_service_export,
+            initargs=(dataset.df,)
+        )
+
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        """Replaces a broken worker pool, unless another request already did."""
+        with self._pool_lock:
+            if self._executor is broken:
+                logger.warning("A report worker died; restarting the worker pool")
+                self._executor = self._start_executor(self._dataset)
+                broken.shutdown(wait=False)
+
+    def reload(self, input_path: Optional[str] = None) -> LoadedDataset:
+        """
+        Loads the export again (or a new one) and swaps it in once it is ready.
+
+        Args:
+            input_path (str, optional): Export to load instead of the current one.
+
+        Returns:
+            LoadedDataset: The newly loaded dataset.
+        """
+        with self._reload_lock:
+            dataset = load_dataset(input_path or self.input_path, self.input_format)
+            executor = self._start_executor(dataset)
+            with self._pool_lock:
+                old_executor = self._executor
+                self.input_path = dataset.input_path
+                self._dataset = dataset
+                self._executor = executor
+                if old_executor is not None:
+                    # reports already submitted still finish on the old dataset
+                    old_executor.shutdown(wait=False)
+        logger.info("Reloaded %s (%d rows)", dataset.input_path, len(dataset.df))
+        return dataset
+
+    def build(self, report: str, query: Dict[str, List[str]]) -> pd.DataFrame:
+        """
+        Builds a report in the worker pool from the current dataset.
+
+        If the pool is broken, e.g. a worker was killed, it is restarted and
+        the report submitted once more.
+
+        Args:
+            report (str): 'comparison' or 'questions_as_columns'.
+            query (Dict[str, List[str]]): The parsed query string.
+
+        Returns:
+            pd.DataFrame: The report.
+        """
+        executor, future, dataset, spec = self._submit(report, query)
+        if future is None:
+            return build_report(dataset.df, spec)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._restart_executor(executor)
+        return self._submit(report, query)[1].result()
+
+    def _submit(
+        self, report: str, query: Dict[str, List[str]]
+    ) -> Tuple[Optional[ProcessPoolExecutor], Optional[Future], LoadedDataset, ReportSpec]:
+        """Submits a report to the current pool; no future when it is built in the request thread."""
+        with self._pool_lock:
+            dataset, executor = self._dataset, self._executor
+            spec = parse_report_request(report, query, dataset.df.columns)
+            if executor is None:
+                return executor, None, dataset, spec
+            try:
+                future = executor.submit(_build_service_report, spec)
+            except BrokenProcessPool as error:
+                future = Future()
+                future.set_exception(error)
+        return executor, future, dataset, spec
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a ReportService, set as the server's `service` attribute."""
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(payload).encode(), 'application/json')
+
+    def _dataset_status(self, dataset: LoadedDataset) -> Dict[str, Any]:
+        return {'input_path': dataset.input_path, 'rows': len(dataset.df), 'loaded_at': dataset.loaded_at}
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send_json(200, self._dataset_status(service.dataset))
+            return
+        if url.path not in _ENDPOINTS:
+            self._send_json(404, {'error': f"Unknown endpoint {url.path}"})
+            return
+        try:
+            report_df = service.build(_ENDPOINTS[url.path], parse_qs(url.query))
+        except (RequestError, KeyError, ValueError) as error:
+            self._send_json(400, {'error': str(error)})
+            return
+        except Exception as error:
+            logger.exception("Report request %s failed", self.path)
+            self._send_json(500, {'error': str(error)})
+            return
+        # stream the CSV block by block; without a Content-Length the response ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for text in iter_csv_report(report_df):
+            self.wfile.write(text.encode('utf-8'))
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != '/reload':
+            self._send_json(404, {'error': f"Unknown endpoint {url.path}"})
+            return
+        input_path = parse_qs(url.query).get('path', [None])[-1]
+        try:
+            dataset = service.reload(input_path)
+        except (OSError, ValueError) as error:
+            self._send_json(400, {'error': str(error)})
+            return
+        self._send_json(200, self._dataset_status(dataset))
+
+    def log_message(self, format: str, *args) -> None:
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+def make_server(service: ReportService, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server for a report service.
+
+    Args:
+        service (ReportService): The service answering requests.
+        host (str, optional): Interface to listen on. Defaults to '127.0.0.1'.
+        port (int, optional): Port to listen on; 0 picks a free one. Defaults to 8000.
+
+    Returns:
+        ThreadingHTTPServer: The server, not yet serving.
+    """
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(
+    input_path: str,
+    host: str = '127.0.0.1',
+    port: int = 8000,
+    max_workers: Optional[int] = None,
+    input_format: Optional[str] = None
+) -> None:
+    """
+    Loads the export and serves reports until interrupted.
+
+    Args:
+        input_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        host (str, optional): Interface to listen on. Defaults to '127.0.0.1'.
+        port (int, optional): Port to listen on. Defaults to 8000.
+        max_workers (int, optional): Number of report worker processes; 0 builds each report in its
+            request thread. Defaults to the CPU count.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the file extension.
+    """
+    service = ReportService(input_path, max_workers, input_format)
+    server = make_server(service, host, port)
+    logger.info("Serving %s on http://%s:%d", input_path, *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve assessment reports from an export kept in memory.")
+    parser.add_argument('input_path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="Report worker processes; 0 builds in the request thread.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.input_path, args.host, args.port, args.workers)
@@ -0,0 +1,492 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from typing import IO, Iterator, List, Optional, Sequence, Tuple, Union
+
+from export_loader import detect_format
+
+# Schema metadata key marking a Parquet/Arrow report whose header was flattened by flatten_header.
+HEADER_METADATA_KEY = b'assessment_report.header'
+
+# Report rows formatted and written per block by iter_csv_report.
+DEFAULT_BLOCK_ROWS = 1000
+
+# Sheet size limits of Excel.
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_COLUMNS = 16_384
+
+# Line terminator of CSV reports, for csv.writer, to_csv and _format_rows alike.
+CSV_LINETERMINATOR = os.linesep
+
+# Characters that make csv.writer quote a field: the delimiter, the quote character and the
+# characters of the line terminator (a lone '\r' is not quoted when lines end in '\n').
+_QUOTED_CHARS = frozenset(',"' + CSV_LINETERMINATOR)
+
+# The report being split by write_report_shards, shared with forked writers instead of being pickled to them.
+_SHARDED_REPORT: Optional[pd.DataFrame] = None
+
+
+def _json_default(value):
+    # numpy scalars in header levels
+    return value.item()
+
+
+def needs_flat_header(columns: pd.Index) -> bool:
+    """
+    Tells whether a header cannot be stored as Parquet/Arrow column names as it is.
+
+    Args:
+        columns (pd.Index): The report columns.
+
+    Returns:
+        bool: True for a MultiIndex, non-string names or repeated names.
+    """
+    return (
+        isinstance(columns, pd.MultiIndex)
+        or not all(isinstance(col, str) for col in columns)
+        or columns.has_duplicates
+    )
+
+
+def flatten_header(columns: pd.Index) -> List[str]:
+    """
+    Encodes every column label as a unique string that unflatten_header can decode.
+
+    Each label becomes the JSON list of its levels. Labels that repeat, such
+    as two assessments with the same metadata, get a '#<n>' suffix after the
+    closing bracket.
+
+    Args:
+        columns (pd.Index): The report columns, usually a MultiIndex.
+
+    Returns:
+        List[str]: One flat, unique column name per column.
+    """
+    names = []
+    seen = {}
+    for col in columns:
+        levels = list(col) if isinstance(columns, pd.MultiIndex) else [col]
+        name = json.dumps(levels, ensure_ascii=False, default=_json_default)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else f"{name}#{count}")
+    return names
+
+
+def unflatten_header(names: List[str], nlevels: int) -> pd.Index:
+    """
+    Decodes column names written by flatten_header.
+
+    Args:
+        names (List[str]): The flat column names.
+        nlevels (int): Number of levels of the original header.
+
+    Returns:
+        pd.Index: The original header, a MultiIndex when nlevels is above one.
+    """
+    labels = []
+    for name in names:
+        encoded = name if name.endswith(']') else name[:name.rindex(']#') + 1]
+        labels.append(tuple(json.loads(encoded)))
+    if nlevels == 1:
+        return pd.Index([label[0] for label in labels])
+    return pd.MultiIndex.from_tuples(labels)
+
+
+def _header_rows(columns: pd.Index) -> List[list]:
+    if isinstance(columns, pd.MultiIndex):
+        return [columns.get_level_values(level).tolist() for level in range(columns.nlevels)]
+    return [columns.tolist()]
+
+
+def _formats_natively(dtypes: pd.Series) -> bool:
+    # str() of these values is what to_csv writes; dates and periods are formatted by pandas
+    return all(
+        dtype == object or isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)) or dtype.kind in 'biuf'
+        for dtype in dtypes
+    )
+
+
+def _quote_field(value) -> str:
+    # csv.QUOTE_MINIMAL, as used by to_csv
+    text = str(value)
+    if not _QUOTED_CHARS.isdisjoint(text):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _format_rows(values: np.ndarray) -> str:
+    """
+    Formats a 2-D object array as CSV lines the way csv.writer would.
+
+    Report cells repeat a small set of answers, so every distinct value is
+    formatted and quoted once and the lines are joined from those strings.
+    Factorizing treats equal values of different types (1, 1.0, True) as one,
+    so blocks with values other than strings go through csv.writer instead.
+    """
+    codes, uniques = pd.factorize(values.ravel(), use_na_sentinel=True)
+    if not all(isinstance(value, str) for value in uniques):
+        buffer = io.StringIO()
+        values = np.where(pd.isna(values), '', values)
+        csv.writer(buffer, lineterminator=CSV_LINETERMINATOR).writerows(values.tolist())
+        return buffer.getvalue()
+    formatted = np.array([_quote_field(value) for value in uniques] + [''], dtype=object)
+    # missing values have code -1, which picks the trailing ''
+    cells = formatted[codes].reshape(values.shape)
+    return ''.join([','.join(row) + CSV_LINETERMINATOR for row in cells.tolist()])
+
+
+def iter_csv_report(df: pd.DataFrame, block_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[str]:
+    """
+    Formats a report as CSV text, one block of rows at a time.
+
+    The output is what df.to_csv(index=False) writes: every level of a
+    MultiIndex header is one header row (the comparison report's stacked
+    metadata), missing values are empty and fields are quoted only when
+    needed. Rows are taken from the frame block by block, so the full CSV
+    text never exists at once.
+
+    Args:
+        df (pd.DataFrame): The report.
+        block_rows (int, optional): Rows per yielded block. Defaults to 1000.
+
+    Yields:
+        str: The header, then consecutive blocks of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=CSV_LINETERMINATOR)
+
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerows(_header_rows(df.columns))
+    yield flush()
+
+    # a lone empty field is written as "", which _format_rows does not do
+    native = _formats_natively(df.dtypes) and len(df.columns) > 1
+    for start in range(0, len(df), block_rows):
+        block = df.iloc[start:start + block_rows]
+        if native:
+            yield _format_rows(block.to_numpy(dtype=object))
+        else:
+            yield block.to_csv(header=False, index=False, lineterminator=CSV_LINETERMINATOR)
+
+
+def write_csv_report(
+    df: pd.DataFrame,
+    output: Union[str, IO[str]],
+    encoding: str = 'utf-8',
+    block_rows: int = DEFAULT_BLOCK_ROWS
+) -> None:
+    """
+    Streams a report as CSV to a path or a text file-like object.
+
+    Args:
+        df (pd.DataFrame): The report.
+        output (Union[str, IO[str]]): Path to write, or an open text stream such as a
+            TextIOWrapper around an HTTP response.
+        encoding (str, optional): Encoding when output is a path. Defaults to 'utf-8'.
+        block_rows (int, optional): Rows formatted per write. Defaults to 1000.
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'w', encoding=encoding, newline='') as f:
+            write_csv_report(df, f, block_rows=block_rows)
+        return
+    for text in iter_csv_report(df, block_rows):
+        output.write(text)
+
+
+def xlsx_sheet_columns(
+    n_columns: int,
+    key_columns: int = 0,
+    max_columns: int = EXCEL_MAX_COLUMNS
+) -> List[List[int]]:
+    """
+    Splits report columns across sheets that each fit Excel's column limit.
+
+    Every sheet starts with the key columns, so its rows can still be told apart.
+
+    Args:
+        n_columns (int): Number of report columns.
+        key_columns (int, optional): Leading columns repeated on every sheet. Defaults to 0.
+        max_columns (int, optional): Columns per sheet. Defaults to EXCEL_MAX_COLUMNS.
+
+    Returns:
+        List[List[int]]: Column positions of each sheet.
+    """
+    if key_columns >= max_columns:
+        raise ValueError(f"{key_columns} key columns do not fit in a sheet of {max_columns} columns")
+    keys = list(range(min(key_columns, n_columns)))
+    per_sheet = max_columns - len(keys)
+    data = range(len(keys), n_columns)
+    if not data:
+        return [keys]
+    return [keys + list(data[start:start + per_sheet]) for start in range(0, len(data), per_sheet)]
+
+
+def write_xlsx_report(
+    df: pd.DataFrame,
+    output_path: str,
+    key_columns: int = 0,
+    sheet_name: str = 'Report',
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    max_columns: int = EXCEL_MAX_COLUMNS
+) -> None:
+    """
+    Writes a report as an XLSX workbook, streaming rows so memory stays flat.
+
+    The workbook is written in openpyxl's write-only mode: rows go to disk as
+    they are appended. Every header level becomes a bold, frozen header row,
+    so the comparison report's metadata stays visible above its answers.
+    Reports wider than Excel allows continue on further sheets ('Report 2',
+    ...), each starting with the key columns.
+
+    Args:
+        df (pd.DataFrame): The report.
+        output_path (str): Path where the workbook will be saved.
+        key_columns (int, optional): Leading columns that identify a row, repeated on
+            every sheet and frozen. Defaults to 0.
+        sheet_name (str, optional): Name of the first sheet. Defaults to 'Report'.
+        block_rows (int, optional): Rows converted per block. Defaults to 1000.
+        max_columns (int, optional): Columns per sheet. Defaults to EXCEL_MAX_COLUMNS.
+
+    Raises:
+        ValueError: If the report has more rows than an Excel sheet.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    _add_xlsx_sheets(workbook, df, key_columns, sheet_name, block_rows, max_columns)
+    workbook.save(output_path)
+
+
+def _add_xlsx_sheets(
+    workbook,
+    df: pd.DataFrame,
+    key_columns: int,
+    sheet_name: str,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    max_columns: int = EXCEL_MAX_COLUMNS
+) -> None:
+    """Appends a report to a write-only workbook as one sheet, or several when it is too wide."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    header_rows = _header_rows(df.columns)
+    if len(header_rows) + len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(
+            f"{len(df)} rows and {len(header_rows)} header rows do not fit in an Excel sheet of {EXCEL_MAX_ROWS} rows")
+
+    bold = Font(bold=True)
+    for sheet_number, positions in enumerate(xlsx_sheet_columns(len(df.columns), key_columns, max_columns)):
+        sheet = workbook.create_sheet(sheet_name if sheet_number == 0 else f"{sheet_name} {sheet_number + 1}")
+        sheet.freeze_panes = f"{get_column_letter(min(key_columns, len(positions)) + 1)}{len(header_rows) + 1}"
+        for header_row in header_rows:
+            cells = []
+            for position in positions:
+                cell = WriteOnlyCell(sheet, value=header_row[position] if header_row[position] != '' else None)
+                cell.font = bold
+                cells.append(cell)
+            sheet.append(cells)
+        sheet_df = df.iloc[:, positions]
+        for start in range(0, len(sheet_df), block_rows):
+            values = sheet_df.iloc[start:start + block_rows].to_numpy(dtype=object)
+            values[pd.isna(values)] = None
+            for row in values.tolist():
+                sheet.append(row)
+
+
+def write_report_sheets(
+    sheets: Sequence[Tuple[str, pd.DataFrame, int]],
+    output_path: str,
+    file_format: Optional[str] = None,
+    encoding: str = 'utf-8'
+) -> List[str]:
+    """
+    Writes several reports that belong together, e.g. a summary and its details.
+
+    XLSX output is one workbook with a sheet per report. Other formats get a
+    file per report: the first at output_path, the others next to it named
+    after their sheet, e.g. 'changes.detail.csv'.
+
+    Args:
+        sheets (Sequence[Tuple[str, pd.DataFrame, int]]): Sheet name, report and key columns of each report.
+        output_path (str): Path of the workbook, or of the first report.
+        file_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the extension of output_path.
+        encoding (str, optional): Encoding for CSV output. Defaults to 'utf-8'.
+
+    Returns:
+        List[str]: The files written.
+    """
+    file_format = detect_format(output_path, file_format)
+    if file_format == 'xlsx':
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        for sheet_name, df, key_columns in sheets:
+            _add_xlsx_sheets(workbook, df, key_columns, sheet_name)
+        workbook.save(output_path)
+        return [output_path]
+    stem, extension = os.path.splitext(output_path)
+    paths = []
+    for number, (sheet_name, df, key_columns) in enumerate(sheets):
+        path = output_path if number == 0 else f"{stem}.{sheet_name.lower()}{extension}"
+        write_report(df, path, file_format, encoding, key_columns)
+        paths.append(path)
+    return paths
+
+
+def write_report(
+    df: pd.DataFrame,
+    output_path: str,
+    file_format: Optional[str] = None,
+    encoding: str = 'utf-8',
+    key_columns: int = 0
+) -> None:
+    """
+    Writes a report as CSV, Parquet, Arrow IPC or XLSX.
+
+    Parquet and Arrow need unique string column names, so headers that are
+    not (the comparison report's MultiIndex) are flattened with
+    flatten_header and marked in the schema metadata for read_report.
+
+    Args:
+        df (pd.DataFrame): The report to write.
+        output_path (str): Path where the report will be saved.
+        file_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the extension of output_path.
+        encoding (str, optional): Encoding for CSV output. Defaults to 'utf-8'.
+        key_columns (int, optional): Leading columns that identify a row; XLSX output freezes them
+            and repeats them on every sheet of a report split for width. Defaults to 0.
+    """
+    file_format = detect_format(output_path, file_format)
+    if file_format == 'csv':
+        write_csv_report(df, output_path, encoding)
+        return
+    if file_format == 'xlsx':
+        write_xlsx_report(df, output_path, key_columns)
+        return
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    header = None
+    if needs_flat_header(df.columns):
+        header = json.dumps({'nlevels': df.columns.nlevels}).encode()
+        df = df.set_axis(flatten_header(df.columns), axis=1)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if header is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), HEADER_METADATA_KEY: header})
+    if file_format == 'parquet':
+        pq.write_table(table, output_path)
+    else:
+        feather.write_feather(table, output_path)
+
+
+def shard_path(output_path: str, number: int) -> str:
+    """
+    Names a shard of a report split by write_report_shards.
+
+    Args:
+        output_path (str): Path the whole report would have been written to.
+        number (int): The shard number, from 1.
+
+    Returns:
+        str: e.g. 'report.003.csv' for shard 3 of 'report.csv'.
+    """
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}.{number:03d}{extension}"
+
+
+def _write_shard(
+    output_path: str,
+    columns: list,
+    file_format: Optional[str],
+    encoding: str,
+    key_columns: int
+) -> str:
+    write_report(_SHARDED_REPORT[columns], output_path, file_format, encoding, key_columns)
+    return output_path
+
+
+def write_report_shards(
+    df: pd.DataFrame,
+    output_path: str,
+    shard_columns: Sequence[list],
+    file_format: Optional[str] = None,
+    encoding: str = 'utf-8',
+    key_columns: int = 0,
+    max_workers: Optional[int] = None
+) -> List[str]:
+    """
+    Writes a wide report as several narrower reports, in parallel.
+
+    Every shard gets the key columns followed by its own columns. Shards are
+    written across a process pool forked after the report is built, so the
+    workers share it copy-on-write and formatting runs on all cores. Where
+    fork is not available, or max_workers is 0, they are written one after
+    another in this process.
+
+    Args:
+        df (pd.DataFrame): The report.
+        output_path (str): Path the whole report would have been written to; shards are named by shard_path.
+        shard_columns (Sequence[list]): The columns of each shard, without the key columns.
+        file_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the extension of output_path.
+        encoding (str, optional): Encoding for CSV output. Defaults to 'utf-8'.
+        key_columns (int, optional): Leading columns of the report repeated in every shard. Defaults to 0.
+        max_workers (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Returns:
+        List[str]: The shard paths, in the order of shard_columns.
+    """
+    global _SHARDED_REPORT
+    file_format = detect_format(output_path, file_format)
+    keys = list(df.columns[:key_columns])
+    jobs = [
+        (shard_path(output_path, number), keys + list(columns), file_format, encoding, key_columns)
+        for number, columns in enumerate(shard_columns, start=1)
+    ]
+    _SHARDED_REPORT = df
+    try:
+        if max_workers == 0 or len(jobs) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+            return [_write_shard(*job) for job in jobs]
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            return list(executor.map(_write_shard, *zip(*jobs)))
+    finally:
+        _SHARDED_REPORT = None
+
+
+def read_report(input_path: str, file_format: Optional[str] = None) -> pd.DataFrame:
+    """
+    Reads a Parquet or Arrow IPC report written by write_report, restoring its header.
+
+    Args:
+        input_path (str): Path to the report.
+        file_format (str, optional): 'parquet' or 'arrow'. Defaults to the extension of input_path.
+
+    Returns:
+        pd.DataFrame: The report with its original columns.
+    """
+    file_format = detect_format(input_path, file_format)
+    if file_format not in ('parquet', 'arrow'):
+        raise ValueError("read_report reads Parquet or Arrow IPC reports")
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(input_path) if file_format == 'parquet' else feather.read_table(input_path)
+    df = table.to_pandas()
+    header = (table.schema.metadata or {}).get(HEADER_METADATA_KEY)
+    if header is not None:
+        df.columns = unflatten_header(list(df.columns), json.loads(header)['nlevels'])
+    return df
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# (path, size, mtime) -> content hash, so an unchanged export is hashed once per process
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_file(path: str) -> str:
+    """
+    Hashes the contents of a file.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: The SHA-256 hex digest of the file contents.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def make_key(input_path: Union[str, List[str]], arguments: Dict[str, Any]) -> str:
+    """
+    Builds the cache key of a transform run.
+
+    Args:
+        input_path (Union[str, List[str]]): Path to the input export, or its shards oldest first.
+        arguments (Dict[str, Any]): The transform arguments; must be JSON serializable.
+
+    Returns:
+        str: Hex digest of the file contents and the arguments.
+    """
+    encoded_arguments = json.dumps(arguments, sort_keys=True, default=str)
+    if isinstance(input_path, str):
+        input_hash = hash_file(input_path)
+    elif len(input_path) == 1:
+        input_hash = hash_file(input_path[0])
+    else:
+        # shard order decides which answers win, so it is part of the key
+        input_hash = ' '.join(hash_file(path) for path in input_path)
+    return hashlib.sha256(f"{input_hash}\n{encoded_arguments}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of transform results with LRU eviction.
+
+    Entries are files named by their key. Reading an entry refreshes its
+    modification time, and writing one evicts the least recently used
+    entries until the directory fits in max_bytes.
+
+    Attributes:
+        directory (str): Where the entries are stored.
+        max_bytes (int): Size limit of all entries together.
+        hits (int): Number of lookups that found an entry.
+        misses (int): Number of lookups that did not.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Looks up an entry and counts the hit or miss.
+
+        Args:
+            key (str): The entry key.
+
+        Returns:
+            Optional[bytes]: The stored bytes, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Stores an entry and evicts least recently used entries over the size limit.
+
+        Entries larger than max_bytes are not stored.
+
+        Args:
+            key (str): The entry key.
+            data (bytes): The bytes to store.
+        """
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports the hit/miss counters and the current cache size.
+
+        Returns:
+            Dict[str, int]: hits, misses, entries and bytes.
+        """
+        sizes = [entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.pkl')]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(sizes), 'bytes': sum(sizes)}
+
+
+def cached_result(
+    cache: Optional[ResultCache],
+    input_path: Union[str, List[str]],
+    arguments: Dict[str, Any],
+    compute: Callable[[], Any]
+) -> Any:
+    """
+    Returns the cached result of a transform run, computing and storing it on a miss.
+
+    Args:
+        cache (ResultCache, optional): The cache to use; None always computes.
+        input_path (Union[str, List[str]]): Path to the input export or its shards, hashed into the key.
+        arguments (Dict[str, Any]): The transform arguments, hashed into the key.
+        compute (Callable[[], Any]): Produces the result on a miss; it must be picklable.
+
+    Returns:
+        Any: The cached or freshly computed result.
+    """
+    if cache is None:
+        return compute()
+    key = make_key(input_path, arguments)
+    data = cache.get(key)
+    if data is not None:
+        return pickle.loads(data)
+    result = compute()
+    cache.put(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    return result
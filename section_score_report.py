@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from assessment_comparison_report import get_meta_data_frame, get_new_column_index
+from export_loader import load_export, unique_columns
+from instrumentation import Instrumentation, instrumented, stage
+from pivot_engine import combine_codes, dense_sorted_codes, factorize_sorted
+from report_writer import write_report
+
+MEASURES = ('score', 'mean_score', 'answered', 'unanswered', 'completion')
+DEFAULT_MEASURES = ['score', 'answered', 'unanswered', 'completion']
+
+# Subsection label of the per-section total rows, and section label of the overall total row.
+TOTAL_LABEL = 'Total'
+
+
+def _key_codes(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Sorted codes of a section column, with missing names grouped under ''."""
+    codes, uniques = factorize_sorted(values)
+    missing = codes < 0
+    if missing.any():
+        codes = codes + 1
+        uniques = pd.Index(['']).append(pd.Index(uniques, dtype=object))
+    return codes, uniques
+
+
+def _sum_grid(cells: np.ndarray, weights: Optional[np.ndarray], n_rows: int, n_columns: int) -> np.ndarray:
+    return np.bincount(cells, weights=weights, minlength=n_rows * n_columns).reshape(n_rows, n_columns)
+
+
+def get_section_totals(
+    df: pd.DataFrame,
+    pivot_column: str,
+    section_column: str,
+    subsection_column: str,
+    score_column: str,
+    answer_column: str,
+    totals: bool = True
+) -> Tuple[pd.DataFrame, pd.Index, dict]:
+    """
+    Sums questions, answers and scores per section, subsection and assessment in one pass.
+
+    Every row is one question of one assessment. The section, subsection and
+    assessment keys are turned into one cell code per row, and each sum is a
+    single bincount over those codes, so the work grows with the number of
+    rows rather than the number of groups.
+
+    Args:
+        df (pd.DataFrame): The export.
+        pivot_column (str): The assessment column, one report column group per value.
+        section_column (str): The section column.
+        subsection_column (str): The subsection column.
+        score_column (str): The numeric score column.
+        answer_column (str): The answer column; a missing answer counts as unanswered.
+        totals (bool, optional): Add a total row per section and one for the whole
+            assessment. Defaults to True.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.Index, dict]: The section and subsection of every report
+        row, the assessments in column order, and per sum ('questions', 'answered',
+        'score', 'scored') a rows x assessments array.
+    """
+    assessment_codes, assessments = factorize_sorted(df[pivot_column])
+    keep = assessment_codes >= 0
+    section_codes, sections = _key_codes(df[section_column])
+    subsection_codes, subsections = _key_codes(df[subsection_column])
+
+    scores = pd.to_numeric(df[score_column], errors='coerce').to_numpy(dtype=float)
+    scored = ~np.isnan(scores)
+    answered = df[answer_column].notna().to_numpy()
+    if not keep.all():
+        assessment_codes, section_codes, subsection_codes = (
+            assessment_codes[keep], section_codes[keep], subsection_codes[keep])
+        scores, scored, answered = scores[keep], scored[keep], answered[keep]
+    scores = np.where(scored, scores, 0.0)
+
+    combined = combine_codes([section_codes, subsection_codes], [len(sections), len(subsections)])
+    row_codes, first_rows = dense_sorted_codes(combined)
+    row_sections = section_codes[first_rows]
+    labels = pd.DataFrame({
+        section_column: sections.take(row_sections),
+        subsection_column: subsections.take(subsection_codes[first_rows]),
+    })
+
+    groups = [(row_codes, len(first_rows))]
+    if totals:
+        groups.append((section_codes, len(sections)))
+        groups.append((np.zeros(len(section_codes), dtype=np.int64), 1))
+    n_assessments = len(assessments)
+    grids = {'questions': [], 'answered': [], 'score': [], 'scored': []}
+    for codes, n_rows in groups:
+        cells = codes.astype(np.int64) * n_assessments + assessment_codes
+        grids['questions'].append(_sum_grid(cells, None, n_rows, n_assessments))
+        grids['answered'].append(_sum_grid(cells, answered.astype(float), n_rows, n_assessments).astype(np.int64))
+        grids['score'].append(_sum_grid(cells, scores, n_rows, n_assessments))
+        grids['scored'].append(_sum_grid(cells, scored.astype(float), n_rows, n_assessments).astype(np.int64))
+
+    if totals:
+        used_sections = np.unique(row_sections)
+        labels = pd.concat([
+            labels,
+            pd.DataFrame({
+                section_column: sections.take(used_sections),
+                subsection_column: TOTAL_LABEL,
+            }),
+            pd.DataFrame({section_column: [TOTAL_LABEL], subsection_column: ['']}),
+        ], ignore_index=True)
+        # each section's total row follows its subsections, the overall total comes last
+        order = np.lexsort((
+            np.r_[np.zeros(len(row_sections)), np.ones(len(used_sections)), [2]],
+            np.r_[row_sections, used_sections, [len(sections)]],
+        ))
+        for name in grids:
+            grids[name][1] = grids[name][1][used_sections]
+            grids[name] = np.concatenate(grids[name])[order]
+        labels = labels.take(order).reset_index(drop=True)
+    else:
+        grids = {name: parts[0] for name, parts in grids.items()}
+    return labels, pd.Index(assessments, name=pivot_column), grids
+
+
+def get_measures(grids: dict, measures: List[str]) -> List[np.ndarray]:
+    """
+    Derives the report measures from the sums of get_section_totals.
+
+    Args:
+        grids (dict): The sums returned by get_section_totals.
+        measures (List[str]): Measures to derive, from MEASURES.
+
+    Returns:
+        List[np.ndarray]: One rows x assessments array per measure. Scores are
+        empty where nothing was scored and completion where there are no questions.
+    """
+    questions, answered = grids['questions'], grids['answered']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = {
+            'score': np.where(grids['scored'] > 0, grids['score'], np.nan),
+            'mean_score': np.where(grids['scored'] > 0, grids['score'] / grids['scored'], np.nan),
+            'answered': answered,
+            'unanswered': questions.astype(np.int64) - answered,
+            'completion': np.where(questions > 0, answered / questions, np.nan),
+        }
+    unknown = [measure for measure in measures if measure not in values]
+    if unknown:
+        raise ValueError(f"Unknown measures {unknown}; expected some of {list(MEASURES)}")
+    return [values[measure] for measure in measures]
+
+
+def transform_export(
+    df: pd.DataFrame,
+    assessment_metadata: List[str],
+    pivot_column: str = 'assessmentId',
+    section_column: str = 'sectionName',
+    subsection_column: str = 'subsectionName',
+    score_column: str = 'evaluationScore',
+    answer_column: str = 'answer',
+    measures: Optional[List[str]] = None,
+    totals: bool = True,
+    instrumentation: Optional[Instrumentation] = None
+) -> pd.DataFrame:
+    """
+    Builds the section score report: sections as rows, assessments as columns.
+
+    Each assessment gets one column per measure under the same metadata
+    header as the comparison report, with the measure name on the last
+    header level.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the export data.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        section_column (str, optional): The section column. Defaults to 'sectionName'.
+        subsection_column (str, optional): The subsection column. Defaults to 'subsectionName'.
+        score_column (str, optional): The score column. Defaults to 'evaluationScore'.
+        answer_column (str, optional): The answer column. Defaults to 'answer'.
+        measures (List[str], optional): Measures per assessment, from MEASURES. Defaults to
+            score, answered, unanswered and completion.
+        totals (bool, optional): Add section and overall total rows. Defaults to True.
+        instrumentation (Instrumentation, optional): Records the pivot, metadata
+            and header stages. Defaults to None (not recorded).
+
+    Returns:
+        pd.DataFrame: The section score report.
+    """
+    measures = list(measures or DEFAULT_MEASURES)
+    with instrumented(instrumentation):
+        with stage('pivot') as record:
+            labels, assessments, grids = get_section_totals(
+                df, pivot_column, section_column, subsection_column, score_column, answer_column, totals)
+            # measure blocks side by side, then interleaved so each assessment's measures are adjacent
+            report_df = pd.concat(
+                [labels] + [pd.DataFrame(values) for values in get_measures(grids, measures)],
+                axis=1,
+                ignore_index=True
+            )
+            n_assessments = len(assessments)
+            order = 2 + (np.arange(len(measures)) * n_assessments + np.arange(n_assessments)[:, None]).ravel()
+            report_df = report_df.iloc[:, np.r_[0, 1, order]]
+            record.set_output(report_df)
+        with stage('metadata') as record:
+            metadata = get_meta_data_frame(df, assessment_metadata, pivot_column)
+            record.set_output(metadata)
+        with stage('header') as record:
+            report_df.columns = [section_column, subsection_column] + list(np.repeat(assessments, len(measures)))
+            header = get_new_column_index(report_df, metadata, assessment_metadata, '')
+            measure_level = [section_column, subsection_column] + measures * n_assessments
+            report_df.columns = pd.MultiIndex.from_arrays(
+                [header.get_level_values(level) for level in range(header.nlevels - 1)] + [measure_level])
+            record.set_output(report_df)
+    return report_df
+
+
+def get_report_columns(
+    assessment_metadata: List[str],
+    pivot_column: str = 'assessmentId',
+    section_column: str = 'sectionName',
+    subsection_column: str = 'subsectionName',
+    score_column: str = 'evaluationScore',
+    answer_column: str = 'answer'
+) -> List[str]:
+    """
+    Lists the export columns the section score report reads.
+
+    Args:
+        assessment_metadata (List[str]): List of metadata fields to include.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        section_column (str, optional): The section column. Defaults to 'sectionName'.
+        subsection_column (str, optional): The subsection column. Defaults to 'subsectionName'.
+        score_column (str, optional): The score column. Defaults to 'evaluationScore'.
+        answer_column (str, optional): The answer column. Defaults to 'answer'.
+
+    Returns:
+        List[str]: The required column names.
+    """
+    return unique_columns(
+        [pivot_column], assessment_metadata, [section_column, subsection_column, score_column, answer_column])
+
+
+def main(
+    input_csv_path: str,
+    output_csv_path: str,
+    assessment_metadata: List[str],
+    pivot_column: str = 'assessmentId',
+    section_column: str = 'sectionName',
+    subsection_column: str = 'subsectionName',
+    score_column: str = 'evaluationScore',
+    answer_column: str = 'answer',
+    measures: Optional[List[str]] = None,
+    totals: bool = True,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    instrumentation: Optional[Instrumentation] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Reads the export and writes the section score report.
+
+    Args:
+        input_csv_path (str): Path to the input CSV, Parquet or Arrow IPC file.
+        output_csv_path (str): Path where the output CSV (or Parquet/Arrow IPC/XLSX) will be saved.
+        assessment_metadata (List[str]): List of metadata fields to include.
+        pivot_column (str, optional): The assessment column. Defaults to 'assessmentId'.
+        section_column (str, optional): The section column. Defaults to 'sectionName'.
+        subsection_column (str, optional): The subsection column. Defaults to 'subsectionName'.
+        score_column (str, optional): The score column. Defaults to 'evaluationScore'.
+        answer_column (str, optional): The answer column. Defaults to 'answer'.
+        measures (List[str], optional): Measures per assessment, from MEASURES.
+        totals (bool, optional): Add section and overall total rows. Defaults to True.
+        input_format (str, optional): 'csv', 'parquet' or 'arrow'. Defaults to the input file extension.
+        output_format (str, optional): 'csv', 'parquet', 'arrow' or 'xlsx'. Defaults to the output file extension.
+        instrumentation (Instrumentation, optional): Records wall time, peak memory and
+            output shape of the read, pivot, metadata, header and write stages. Defaults to None.
+        filters (Dict[str, Any], optional): Equality/IN filters on export columns, e.g.
+            {'period': 2024, 'industry': ['IT', 'Finance']}, and export_loader.ValueRange
+            filters, e.g. {'grade': ValueRange(50, 80)}. They are applied to every chunk as it
+            is read, so only the selected slice is kept. Defaults to None (every row).
+    """
+    with instrumented(instrumentation):
+        with stage('read') as record:
+            df, _ = load_export(
+                input_csv_path,
+                get_report_columns(
+                    assessment_metadata, pivot_column, section_column, subsection_column, score_column, answer_column),
+                file_format=input_format,
+                filters=filters
+            )
+            record.set_output(df)
+        report_df = transform_export(
+            df,
+            assessment_metadata,
+            pivot_column,
+            section_column,
+            subsection_column,
+            score_column,
+            answer_column,
+            measures,
+            totals
+        )
+        with stage('write') as record:
+            write_report(report_df, output_csv_path, output_format, key_columns=2)
+            record.set_output(report_df)
+
+
+if __name__ == "__main__":
+    main(
+        input_csv_path='sample_export.csv',
+        output_csv_path='section_scores.csv',
+        assessment_metadata=['partner', 'product', 'recipient', 'period', 'industry', 'grade'],
+    )
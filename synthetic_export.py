@@ -0,0 +1,197 @@
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Iterator
+
+# Column order of sample_export.csv
+EXPORT_COLUMNS = [
+    'assessmentId', 'partner', 'product', 'recipient', 'period', 'industry', 'grade',
+    'sectionName', 'subsectionName', 'questionNumber', 'questionText', 'answerType', 'answer',
+    'answerOptions', 'parentQuestion', 'followupTrigger', 'evaluationGrade', 'evaluationScore',
+    'evaluationComment',
+]
+
+INDUSTRIES = ['IT', 'Consulting', 'Manufacturing', 'Finance', 'Healthcare', 'Retail', 'Energy']
+PERIODS = [2022, 2023, 2024]
+SHORT_ANSWERS = ['Yes', 'No', 'N/A']
+
+_WORDS = (
+    'lorem ipsum odor amet consectetuer adipiscing elit nullam velit senectus pharetra nostra '
+    'cursus nulla sapien egestas netus hac facilisis organization supply chain labor risk '
+    'policy suppliers operations compliance management due diligence'
+).split()
+
+FIRST_ASSESSMENT_ID = 100000
+
+
+def make_text(rng: np.random.Generator, length: int) -> str:
+    """
+    Builds a sentence of random words cut to an exact length.
+
+    Args:
+        rng (np.random.Generator): Source of the word choice.
+        length (int): Number of characters.
+
+    Returns:
+        str: The text, capitalized.
+    """
+    words = []
+    size = 0
+    while size < length:
+        word = _WORDS[rng.integers(len(_WORDS))]
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length].strip().capitalize()
+
+
+def make_questions(questions: int, text_length: int = 200, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds the question catalog every synthetic assessment answers.
+
+    Questions are numbered section.subsection.question with up to ten
+    questions per subsection and ten subsections per section, so the numbers
+    need natural sorting just like the real catalog.
+
+    Args:
+        questions (int): Number of questions.
+        text_length (int, optional): Characters of every question text. Defaults to 200.
+        seed (int, optional): Seed for the question texts. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: sectionName, subsectionName, questionNumber and questionText per question.
+    """
+    rng = np.random.default_rng(seed)
+    positions = np.arange(questions)
+    sections = positions // 100 + 1
+    subsections = positions // 10 % 10 + 1
+    return pd.DataFrame({
+        'sectionName': [f'Section {section}' for section in sections],
+        'subsectionName': [f'Subsection {section}.{sub}' for section, sub in zip(sections, subsections)],
+        'questionNumber': [
+            f'{section}.{sub}.{number}' for section, sub, number in zip(sections, subsections, positions % 10 + 1)],
+        'questionText': [f'{make_text(rng, text_length)}?' for _ in positions],
+    })
+
+
+def make_export(
+    assessments: int,
+    questions: int,
+    text_length: int = 200,
+    answer_length: int = 50,
+    distinct_answers: int = 1000,
+    seed: int = 0,
+    first_assessment_id: int = FIRST_ASSESSMENT_ID
+) -> pd.DataFrame:
+    """
+    Builds a synthetic export with the columns of sample_export.csv.
+
+    Every assessment answers every question once. Answers are drawn from the
+    short answers ('Yes', 'No', 'N/A') and a pool of free text answers.
+
+    Args:
+        assessments (int): Number of distinct assessmentIds.
+        questions (int): Number of questions answered by every assessment.
+        text_length (int, optional): Characters of every question text. Defaults to 200.
+        answer_length (int, optional): Characters of every free text answer. Defaults to 50.
+        distinct_answers (int, optional): Size of the free text answer pool. Defaults to 1000.
+        seed (int, optional): Seed for all random choices. Defaults to 0.
+        first_assessment_id (int, optional): assessmentId of the first assessment. Defaults to 100000.
+
+    Returns:
+        pd.DataFrame: The synthetic export, one row per assessment and question.
+    """
+    catalog = make_questions(questions, text_length, seed)
+    pool_rng = np.random.default_rng([seed, 1])
+    answer_pool = np.array(
+        SHORT_ANSWERS + [make_text(pool_rng, answer_length) for _ in range(distinct_answers)], dtype=object)
+    # seeded per batch so iter_export batches differ but are reproducible
+    rng = np.random.default_rng([seed, first_assessment_id])
+
+    ids = np.arange(first_assessment_id, first_assessment_id + assessments)
+    # four assessments (products) per partner
+    partners = (ids - FIRST_ASSESSMENT_ID) // 4
+    assessment_df = pd.DataFrame({
+        'assessmentId': ids,
+        'partner': [f'Partner {partner}' for partner in partners],
+        'product': [f'Product {assessment_id}' for assessment_id in ids],
+        'recipient': [f'contact@partner{partner}.com' for partner in partners],
+        'period': np.array(PERIODS)[ids % len(PERIODS)],
+        'industry': np.array(INDUSTRIES, dtype=object)[partners % len(INDUSTRIES)],
+        'grade': rng.integers(0, 101, assessments),
+    })
+
+    rows = assessments * questions
+    df = assessment_df.loc[np.repeat(np.arange(assessments), questions)].reset_index(drop=True)
+    for col in catalog.columns:
+        df[col] = np.tile(catalog[col].to_numpy(dtype=object), assessments)
+    df['answerType'] = 'Open'
+    df['answer'] = answer_pool[rng.integers(0, len(answer_pool), rows)]
+    for col in EXPORT_COLUMNS[13:]:
+        df[col] = np.nan
+    # scored 0-10, except answers that do not apply
+    scores = rng.integers(0, 11, rows).astype(float)
+    df['evaluationScore'] = np.where(df['answer'].to_numpy() == 'N/A', np.nan, scores)
+    return df[EXPORT_COLUMNS]
+
+
+def iter_export(assessments: int, questions: int, batch_assessments: int = 1000, **options) -> Iterator[pd.DataFrame]:
+    """
+    Builds a synthetic export in batches of assessments, so millions of rows never sit in memory at once.
+
+    Args:
+        assessments (int): Number of distinct assessmentIds.
+        questions (int): Number of questions answered by every assessment.
+        batch_assessments (int, optional): Assessments per batch. Defaults to 1000.
+        **options: Passed on to make_export (text_length, answer_length, distinct_answers, seed).
+
+    Yields:
+        pd.DataFrame: Consecutive parts of the export.
+    """
+    for first in range(0, assessments, batch_assessments):
+        yield make_export(
+            min(batch_assessments, assessments - first),
+            questions,
+            first_assessment_id=FIRST_ASSESSMENT_ID + first,
+            **options
+        )
+
+
+def write_export(output_path: str, assessments: int, questions: int, **options) -> int:
+    """
+    Writes a synthetic export CSV.
+
+    Args:
+        output_path (str): Path where the export will be saved.
+        assessments (int): Number of distinct assessmentIds.
+        questions (int): Number of questions answered by every assessment.
+        **options: Passed on to iter_export.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rows = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        for batch in iter_export(assessments, questions, **options):
+            batch.to_csv(f, index=False, header=rows == 0)
+            rows += len(batch)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic export with the sample_export.csv schema.")
+    parser.add_argument('output_path')
+    parser.add_argument('--assessments', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--text-length', type=int, default=200)
+    parser.add_argument('--answer-length', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rows = write_export(
+        args.output_path,
+        args.assessments,
+        args.questions,
+        text_length=args.text_length,
+        answer_length=args.answer_length,
+        seed=args.seed
+    )
+    print(f"Wrote {rows} rows to {args.output_path}")
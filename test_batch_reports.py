@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+import assessment_comparison_report
+from batch_reports import ReportSpec, run_batch
+from export_loader import load_export
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.specs = [
+            ReportSpec(
+                name=partner,
+                output_path=os.path.join(self.tmp_dir.name, f'{partner}.csv'),
+                assessment_metadata=ASSESSMENT_METADATA,
+                filters={'partner': partner, 'period': [2024]}
+            )
+            for partner in ['3M', 'Boeing']
+        ]
+        self.specs.append(ReportSpec.from_dict({
+            'name': 'all as columns',
+            'report': 'questions_as_columns',
+            'output_path': os.path.join(self.tmp_dir.name, 'questions.csv'),
+            'assessment_metadata': ASSESSMENT_METADATA,
+        }))
+        self.specs.append(ReportSpec(
+            name='broken',
+            output_path=os.path.join(self.tmp_dir.name, 'broken.csv'),
+            assessment_metadata=['partner'],
+            pivot_value='answer',
+            report='no_such_report'
+        ))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_results(self, results):
+        self.assertEqual([result.name for result in results], ['3M', 'Boeing', 'all as columns', 'broken'])
+        self.assertEqual([result.ok for result in results], [True, True, True, False])
+        self.assertIn('no_such_report', results[3].error)
+
+        df, _ = load_export(SAMPLE_EXPORT, None, report_memory=False)
+        expected = assessment_comparison_report.transform_export(
+            df[df['partner'] == 'Boeing'], ASSESSMENT_METADATA,
+            ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+        written = pd.read_csv(self.specs[1].output_path, header=None)
+        self.assertEqual(written.shape, (expected.shape[0] + len(ASSESSMENT_METADATA) + 1, expected.shape[1]))
+        self.assertEqual(written.iloc[0, 2], 'Boeing')
+        self.assertTrue(os.path.exists(self.specs[2].output_path))
+
+    def test_process_pool(self):
+        self.check_results(run_batch(SAMPLE_EXPORT, self.specs, max_workers=2))
+
+    def test_in_process(self):
+        finished = []
+        results = run_batch(SAMPLE_EXPORT, self.specs, max_workers=0, on_result=finished.append)
+        self.check_results(results)
+        self.assertEqual(len(finished), len(self.specs))
+
+    def test_spec_with_unknown_column_fails_alone(self):
+        misspelled = ReportSpec(
+            name='misspelled',
+            output_path=os.path.join(self.tmp_dir.name, 'misspelled.csv'),
+            assessment_metadata=['partner', 'industy']
+        )
+        results = run_batch(SAMPLE_EXPORT, [misspelled] + self.specs[:1], max_workers=0)
+        self.assertEqual([result.ok for result in results], [False, True])
+        self.assertIn('industy', results[0].error)
+        self.assertFalse(os.path.exists(misspelled.output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+from benchmark_suite import compare_results, run_suite
+from synthetic_export import EXPORT_COLUMNS, iter_export, make_export, write_export
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+
+
+class TestSyntheticExport(unittest.TestCase):
+    def test_follows_sample_schema(self):
+        df = make_export(5, 12, text_length=80, answer_length=30)
+        self.assertEqual(list(df.columns), list(pd.read_csv(SAMPLE_EXPORT, nrows=1).columns))
+        self.assertEqual(list(df.columns), EXPORT_COLUMNS)
+        self.assertEqual(len(df), 60)
+        self.assertEqual(df['assessmentId'].nunique(), 5)
+        self.assertTrue((df['questionText'].str.len() <= 81).all())
+
+    def test_batches_continue_one_export(self):
+        batches = list(iter_export(7, 4, batch_assessments=3))
+        self.assertEqual([len(batch) for batch in batches], [12, 12, 4])
+        combined = pd.concat(batches, ignore_index=True)
+        self.assertEqual(combined['assessmentId'].nunique(), 7)
+        # every batch answers the same question catalog
+        self.assertEqual(
+            combined.groupby('assessmentId')['questionText'].apply(tuple).nunique(), 1)
+
+    def test_write_export_round_trips(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'export.csv')
+            self.assertEqual(write_export(path, 6, 3, batch_assessments=4), 18)
+            self.assertEqual(len(pd.read_csv(path)), 18)
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_times_every_stage_of_both_reports(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = run_suite(SAMPLE_EXPORT, tmp_dir, repeat=1)
+        self.assertEqual(
+            list(results['comparison']), ['read', 'pivot', 'metadata', 'header', 'write', 'total'])
+        self.assertEqual(
+            list(results['questions_as_columns']), ['read', 'question', 'pivot', 'header', 'write', 'total'])
+
+    def test_compare_flags_only_real_slowdowns(self):
+        baseline = {'comparison': {'read': 1.0, 'pivot': 0.01, 'write': 0.5}}
+        current = {'comparison': {'read': 1.5, 'pivot': 0.03, 'write': 0.55, 'header': 9.0}}
+        regressions = compare_results(current, baseline, tolerance=0.2, min_seconds=0.05)
+        self.assertEqual([(r['report'], r['stage']) for r in regressions], [('comparison', 'read')])
+        self.assertAlmostEqual(regressions[0]['ratio'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
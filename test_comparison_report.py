@@ -5,10 +5,13 @@ from typing import Dict, List, Tuple
 
 from assessment_comparison_report import (
     get_meta_data_fields,
+    get_meta_data_frame,
     get_pivoted_data,
     get_new_columns,
+    get_new_column_index,
     transform_export
 )
+from pivot_engine import DuplicateAnswersError, get_conflicts
 
 class TestTransformExport(unittest.TestCase):
     def setUp(self):
@@ -132,6 +135,33 @@ assessmentId,partner,product,country,questionNumber,questionText,answer
         new_columns = get_new_columns(pivot_df, metadata, self.assessment_metadata, 'answer')
         self.assertEqual(new_columns, expected_new_columns)
     
+    def test_get_new_column_index(self):
+        df_blank = pd.DataFrame({
+            'assessmentId': [34, 37, 38],
+            'partner': ['Partner 1', '', 'Partner 3'],
+            'product': ['Product 1', 'Product 2', None],
+            'country': ['United States', 'France', 'Germany'],
+            'questionNumber': ['A.1', 'A.1', 'A.1'],
+            'questionText': ['Lorem ipsum dolor sit amet'] * 3,
+            'answer': ['Yes', 'No', 'N/A']
+        })
+        pivot_df = get_pivoted_data(df_blank, self.pivot_index, self.pivot_column, self.pivot_value)
+        metadata_df = get_meta_data_frame(df_blank, self.assessment_metadata, self.pivot_column)
+        expected_columns = pd.MultiIndex.from_tuples([
+            ('', '', '', 'questionNumber'),
+            ('', '', '', 'questionText'),
+            ('Partner 1', 'Product 1', 'United States', 'answer'),
+            ('', 'Product 2', 'France', 'answer'),
+            ('Partner 3', '', 'Germany', 'answer'),
+        ])
+        new_columns = get_new_column_index(pivot_df, metadata_df, self.assessment_metadata, 'answer')
+        self.assertTrue(new_columns.equals(expected_columns))
+        # the tuple-based builder gives the same header
+        metadata = get_meta_data_fields(df_blank, self.assessment_metadata, self.pivot_column)
+        self.assertEqual(
+            get_new_columns(pivot_df, metadata, self.assessment_metadata, 'answer'),
+            list(expected_columns))
+    
     def test_transform_export(self):
         # Adjust the sample data to have unique assessmentIds for accurate testing
         df_unique = pd.DataFrame({
@@ -302,5 +332,21 @@ assessmentId,partner,product,country,questionNumber,questionText,answer
         # Compare the transformed DataFrame with the expected DataFrame
         pd.testing.assert_frame_equal(transformed_df, expected_df)
 
+    def test_transform_export_reports_conflicting_answers(self):
+        df = pd.concat([self.df, self.df.iloc[[0]].assign(answer='No')], ignore_index=True)
+        transformed_df = transform_export(
+            df, self.assessment_metadata, self.pivot_index, self.pivot_column, self.pivot_value, on_duplicate='last')
+        self.assertEqual(transformed_df.iloc[0, 2], 'No')
+        self.assertEqual(get_conflicts(transformed_df).to_dict('records'), [{
+            'questionNumber': 'A.1',
+            'questionText': 'Lorem ipsum dolor sit amet',
+            'assessmentId': 34,
+            'answers': ['Yes', 'No'],
+        }])
+        with self.assertRaises(DuplicateAnswersError):
+            transform_export(
+                df, self.assessment_metadata, self.pivot_index, self.pivot_column, self.pivot_value,
+                on_duplicate='error')
+
 if __name__ == '__main__':
     unittest.main(argv=[''], exit=False)
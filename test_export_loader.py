@@ -0,0 +1,199 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+import assessment_comparison_report
+import questions_as_columns
+from export_loader import ValueRange, convert_export, filter_mask, load_export, read_export_streaming
+from pivot_engine import DuplicateAnswersError
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+class TestStreamingIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def output_path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def read_bytes(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_comparison_report_streaming_matches_full_read(self):
+        arguments = dict(
+            assessment_metadata=ASSESSMENT_METADATA,
+            pivot_index=['questionNumber', 'questionText'],
+            pivot_column='assessmentId',
+            pivot_value='answer'
+        )
+        assessment_comparison_report.main(SAMPLE_EXPORT, self.output_path('full.csv'), **arguments)
+        # 37 rows per chunk splits assessments across chunk boundaries
+        assessment_comparison_report.main(
+            SAMPLE_EXPORT, self.output_path('streamed.csv'), chunksize=37, **arguments)
+        self.assertEqual(
+            self.read_bytes(self.output_path('full.csv')),
+            self.read_bytes(self.output_path('streamed.csv')))
+
+    def test_questions_as_columns_streaming_matches_full_read(self):
+        questions_as_columns.main(SAMPLE_EXPORT, self.output_path('full.csv'), ASSESSMENT_METADATA)
+        # single-row chunks must not change how columns such as questionNumber are typed
+        questions_as_columns.main(
+            SAMPLE_EXPORT, self.output_path('streamed.csv'), ASSESSMENT_METADATA, chunksize=1)
+        self.assertEqual(
+            self.read_bytes(self.output_path('full.csv')),
+            self.read_bytes(self.output_path('streamed.csv')))
+
+    def test_streaming_keeps_first_non_null_answer(self):
+        path = self.output_path('export.csv')
+        pd.DataFrame({
+            'assessmentId': [34, 34, 34, 37],
+            'partner': ['Partner 1', 'Partner 1', 'Partner 1', 'Partner 2'],
+            'questionNumber': ['A.1', 'A.1', 'A.1', 'A.1'],
+            'answer': [None, 'Yes', 'No', 'No']
+        }).to_csv(path, index=False)
+        answers, metadata = read_export_streaming(
+            path,
+            key_columns=['questionNumber', 'assessmentId'],
+            value_column='answer',
+            metadata_columns=['assessmentId', 'partner'],
+            chunksize=1
+        )
+        # the conflicting 'No' of assessment 34 is kept after its first answer for the pivot to report
+        self.assertEqual(answers['answer'].tolist(), ['Yes', 'No', 'No'])
+        self.assertEqual(answers['assessmentId'].tolist(), [34, 34, 37])
+        self.assertEqual(metadata['partner'].tolist(), ['Partner 1', 'Partner 2'])
+
+    def test_streaming_reports_conflicts_like_full_read(self):
+        path = self.output_path('export.csv')
+        export = pd.read_csv(SAMPLE_EXPORT)
+        conflicting = export.iloc[[0]].assign(answer='A different answer')
+        # the repeated answer lands in another chunk than the first one
+        pd.concat([export, conflicting, export.iloc[[1]]]).to_csv(path, index=False)
+        arguments = dict(
+            assessment_metadata=ASSESSMENT_METADATA,
+            pivot_index=['questionNumber', 'questionText'],
+            pivot_column='assessmentId',
+            pivot_value='answer'
+        )
+        for chunksize in (None, 50):
+            output_path = self.output_path(f'report_{chunksize}.csv')
+            with self.assertLogs('pivot_engine', 'WARNING') as logs:
+                assessment_comparison_report.main(path, output_path, chunksize=chunksize, **arguments)
+            self.assertIn('1 pivot cells have conflicting answers', logs.output[0])
+        self.assertEqual(
+            self.read_bytes(self.output_path('report_None.csv')), self.read_bytes(self.output_path('report_50.csv')))
+        with self.assertRaises(DuplicateAnswersError):
+            assessment_comparison_report.main(
+                path, self.output_path('error.csv'), chunksize=50, on_duplicate='error', **arguments)
+
+
+class TestLoadExport(unittest.TestCase):
+    def setUp(self):
+        self.columns = ['assessmentId', 'partner', 'period', 'grade', 'questionNumber', 'questionText', 'answer']
+        self.df, self.report = load_export(SAMPLE_EXPORT, self.columns, chunksize=100)
+
+    def test_reads_only_requested_columns(self):
+        self.assertEqual(sorted(self.df.columns), sorted(self.columns))
+
+    def test_repetitive_strings_are_categorical(self):
+        for col in ['partner', 'questionNumber', 'questionText']:
+            self.assertIsInstance(self.df[col].dtype, pd.CategoricalDtype)
+        # free-text answers are mostly distinct and stay plain strings
+        self.assertEqual(self.df['answer'].dtype, object)
+
+    def test_values_match_read_csv(self):
+        expected = pd.read_csv(SAMPLE_EXPORT, usecols=self.columns)
+        for col in self.columns:
+            self.assertEqual(self.df[col].astype(object).tolist(), expected[col].astype(object).tolist())
+        for col in ['assessmentId', 'period', 'grade']:
+            self.assertEqual(self.df[col].dtype, expected[col].dtype)
+
+    def test_reports_memory_saved(self):
+        self.assertEqual(self.report.rows, 468)
+        self.assertGreater(self.report.saved_bytes, 0)
+        self.assertIn('saved', self.report.summary())
+
+
+class TestFilterPushdown(unittest.TestCase):
+    def setUp(self):
+        self.df, _ = load_export(SAMPLE_EXPORT, None, report_memory=False)
+        self.filters = {'period': '2024', 'industry': ['Banking', 'Aerospace', 'IT'], 'grade': ValueRange(60, 95)}
+
+    def test_load_keeps_only_matching_rows(self):
+        filtered, _ = load_export(
+            SAMPLE_EXPORT, ['assessmentId', 'answer'], chunksize=50, report_memory=False, filters=self.filters)
+        expected = self.df[filter_mask(self.df, self.filters)]
+        self.assertEqual(list(filtered.columns), ['assessmentId', 'answer'])
+        self.assertEqual(filtered['assessmentId'].tolist(), expected['assessmentId'].tolist())
+        self.assertGreater(len(filtered), 0)
+        self.assertLess(len(filtered), len(self.df))
+
+    def test_numbers_match_text_columns(self):
+        text = pd.DataFrame({'period': ['2023', '2024', None], 'grade': ['50', 'x', '90']})
+        self.assertEqual(filter_mask(text, {'period': 2024}).tolist(), [False, True, False])
+        self.assertEqual(filter_mask(text, {'grade': ValueRange.parse('..60')}).tolist(), [True, False, False])
+        self.assertEqual(ValueRange.parse('50..'), ValueRange(50, None))
+        with self.assertRaises(ValueError):
+            ValueRange.parse('50')
+
+    def test_comparison_report_of_slice(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'slice.csv')
+            assessment_comparison_report.main(
+                SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, ['questionNumber', 'questionText'],
+                'assessmentId', 'answer', filters=self.filters)
+            report = pd.read_csv(output_path, header=None, dtype=str)
+        expected_ids = self.df.loc[filter_mask(self.df, self.filters), 'partner'].unique().tolist()
+        self.assertEqual(sorted(report.iloc[0, 2:].tolist()), sorted(expected_ids))
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class TestColumnarInput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.expected_path = os.path.join(self.tmp_dir.name, 'expected.csv')
+        assessment_comparison_report.main(
+            SAMPLE_EXPORT, self.expected_path, ASSESSMENT_METADATA,
+            ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_same_report(self, input_path, **kwargs):
+        output_path = os.path.join(self.tmp_dir.name, 'result.csv')
+        assessment_comparison_report.main(
+            input_path, output_path, ASSESSMENT_METADATA,
+            ['questionNumber', 'questionText'], 'assessmentId', 'answer', **kwargs)
+        with open(self.expected_path, 'rb') as expected, open(output_path, 'rb') as result:
+            self.assertEqual(expected.read(), result.read())
+
+    def test_parquet_cache_gives_same_report(self):
+        path = os.path.join(self.tmp_dir.name, 'export.parquet')
+        convert_export(SAMPLE_EXPORT, path)
+        self.assert_same_report(path)
+        self.assert_same_report(path, chunksize=50)
+
+    def test_arrow_cache_gives_same_report(self):
+        path = os.path.join(self.tmp_dir.name, 'export.cache')
+        convert_export(SAMPLE_EXPORT, path, file_format='arrow')
+        self.assert_same_report(path, input_format='arrow')
+
+    def test_parquet_reads_only_requested_columns(self):
+        path = os.path.join(self.tmp_dir.name, 'export.parquet')
+        convert_export(SAMPLE_EXPORT, path)
+        df, _ = load_export(path, ['assessmentId', 'partner'], report_memory=False)
+        self.assertEqual(list(df.columns), ['assessmentId', 'partner'])
+        self.assertIsInstance(df['partner'].dtype, pd.CategoricalDtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
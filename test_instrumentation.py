@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+
+import assessment_comparison_report
+import questions_as_columns
+from instrumentation import Instrumentation, stage
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'report.csv')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records_every_comparison_stage(self):
+        seen = []
+        instrumentation = Instrumentation(hooks=[seen.append])
+        assessment_comparison_report.main(
+            SAMPLE_EXPORT, self.output_path, ASSESSMENT_METADATA,
+            ['questionNumber', 'questionText'], 'assessmentId', 'answer',
+            instrumentation=instrumentation
+        )
+        self.assertEqual(
+            [record.name for record in instrumentation.records], ['read', 'pivot', 'metadata', 'header', 'write'])
+        self.assertEqual(seen, instrumentation.records)
+        read, pivot = instrumentation.records[:2]
+        self.assertEqual((read.rows, read.columns), (468, 10))
+        self.assertEqual(pivot.columns, 11)
+        self.assertTrue(all(record.peak_memory_bytes is not None for record in instrumentation.records))
+        summary = json.loads(instrumentation.to_json())
+        self.assertEqual(len(summary['stages']), 5)
+        self.assertIn('pivot ', instrumentation.summary_line())
+
+    def test_profiles_the_named_stage(self):
+        instrumentation = Instrumentation(trace_memory=False, profile_stage='header')
+        questions_as_columns.main(
+            SAMPLE_EXPORT, self.output_path, ASSESSMENT_METADATA, instrumentation=instrumentation)
+        self.assertEqual(
+            [record.name for record in instrumentation.records], ['read', 'question', 'pivot', 'header', 'write'])
+        self.assertIsNone(instrumentation.records[0].peak_memory_bytes)
+        self.assertIn('order_question_columns', instrumentation.profile_text())
+
+    def test_inactive_stage_records_nothing(self):
+        with stage('pivot') as record:
+            record.set_output(None)
+        instrumentation = Instrumentation()
+        with instrumentation.activate():
+            with stage('pivot'):
+                pass
+        with stage('write'):
+            pass
+        self.assertEqual([record.name for record in instrumentation.records], ['pivot'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import period_change_report
+from period_change_report import get_period_pairs, transform_export
+
+HAS_OPENPYXL = importlib.util.find_spec('openpyxl') is not None
+
+
+class TestPeriodChangeReport(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'assessmentId': [1, 1, 1, 2, 2, 2, 3, 3, 4, 5],
+            'partner': ['P'] * 6 + ['Q'] * 3 + ['R'],
+            'product': ['X'] * 10,
+            'period': [2023, 2023, 2023, 2024, 2024, 2024, 2023, 2023, 2024, 2024],
+            'questionNumber': ['1', '2', '3', '1', '2', '4', '1', '2', '1', '1'],
+            'questionText': ['a', 'b', 'c', 'a', 'b', 'd', 'a', 'b', 'a', 'a'],
+            'answer': ['Yes', 'No', 'Yes', 'Yes', 'Yes', 'No', 'No', 'No', 'No', 'Yes'],
+            'evaluationScore': [1, 0, 1, 2, 1, 0, 0, 0, 0, 1],
+        })
+
+    def test_pairs(self):
+        pairs = get_period_pairs(self.df, ['partner', 'product'], 'period', 'assessmentId', 2023, 2024)
+        self.assertEqual(pairs.values.tolist(), [['P', 'X', 1, 2], ['Q', 'X', 3, 4]])
+
+    def test_summary(self):
+        summary, _ = transform_export(self.df, 2023, 2024)
+        self.assertEqual(summary[['changed', 'added', 'removed', 'unchanged', 'rescored']].values.tolist(),
+                         [[1, 1, 1, 1, 1], [0, 0, 1, 1, 0]])
+        self.assertEqual(summary['score_delta'].tolist(), [1.0, 0.0])
+
+    def test_detail(self):
+        _, detail = transform_export(self.df, 2023, 2024)
+        self.assertEqual(
+            detail[['partner', 'questionNumber', 'change', 'base_answer', 'compare_answer']].fillna('').values.tolist(),
+            [
+                ['P', '1', 'rescored', 'Yes', 'Yes'],
+                ['P', '2', 'changed', 'No', 'Yes'],
+                ['P', '3', 'removed', 'Yes', ''],
+                ['P', '4', 'added', '', 'No'],
+                ['Q', '2', 'removed', 'No', ''],
+            ]
+        )
+        np.testing.assert_array_equal(detail['score_delta'], [1.0, 1.0, np.nan, np.nan, np.nan])
+        _, detail = transform_export(self.df, 2023, 2024, score_column=None)
+        self.assertNotIn('rescored', detail['change'].tolist())
+        self.assertNotIn('score_delta', detail.columns)
+
+    def test_main_writes_summary_and_detail(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = os.path.join(tmp_dir, 'export.csv')
+            self.df.to_csv(input_path, index=False)
+            output_path = os.path.join(tmp_dir, 'changes.csv')
+            period_change_report.main(input_path, output_path, 2023, 2024)
+            self.assertEqual(len(pd.read_csv(output_path)), 2)
+            self.assertEqual(len(pd.read_csv(os.path.join(tmp_dir, 'changes.detail.csv'))), 5)
+            if HAS_OPENPYXL:
+                from openpyxl import load_workbook
+
+                workbook_path = os.path.join(tmp_dir, 'changes.xlsx')
+                period_change_report.main(input_path, workbook_path, 2023, 2024)
+                self.assertEqual(load_workbook(workbook_path).sheetnames, ['Summary', 'Detail'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from pivot_engine import DuplicateAnswersError, get_conflicts, pivot_answers, pivot_first
+
+
+class TestPivotFirst(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        size = 400
+        self.df = pd.DataFrame({
+            'assessmentId': rng.integers(1, 30, size),
+            'partner': rng.choice(['Partner 1', 'Partner 2', 'Partner 3'], size),
+            'questionNumber': rng.choice(['1.1.1', '1.1.2', '1.1.10', '2.1'], size),
+            'questionText': rng.choice(['Lorem', 'Ipsum'], size),
+            'answer': rng.choice(['Yes', 'No', 'N/A', None], size),
+        })
+
+    def assert_matches_pivot_table(self, df, index, columns, values):
+        expected = df.pivot_table(index=index, columns=columns, values=values, aggfunc='first')
+        pd.testing.assert_frame_equal(pivot_first(df, index, columns, values), expected)
+
+    def test_matches_pivot_table_with_duplicates_and_nulls(self):
+        self.assert_matches_pivot_table(
+            self.df, ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+
+    def test_matches_pivot_table_with_single_index(self):
+        self.assert_matches_pivot_table(self.df, ['questionNumber'], 'assessmentId', 'answer')
+
+    def test_matches_pivot_table_with_string_columns(self):
+        self.assert_matches_pivot_table(
+            self.df, ['partner', 'assessmentId'], 'questionNumber', 'answer')
+
+    def test_matches_pivot_table_with_null_keys(self):
+        df = self.df.copy()
+        df.loc[::5, 'questionText'] = None
+        self.assert_matches_pivot_table(df, ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+
+    def test_categorical_keys_pivot_like_strings(self):
+        categorical = self.df.astype({'questionNumber': 'category', 'partner': 'category'})
+        # category order is not the sorted order after chunks are merged
+        categorical['questionNumber'] = categorical['questionNumber'].cat.reorder_categories(
+            ['2.1', '1.1.10', '1.1.2', '1.1.1'])
+        pd.testing.assert_frame_equal(
+            pivot_first(categorical, ['questionNumber', 'partner'], 'assessmentId', 'answer'),
+            pivot_first(self.df, ['questionNumber', 'partner'], 'assessmentId', 'answer'))
+
+    def test_unique_keys_fill_every_cell(self):
+        df = pd.DataFrame({
+            'questionNumber': ['A.2', 'A.1', 'A.2', 'A.1'],
+            'assessmentId': [37, 37, 34, 34],
+            'answer': ['Yes', 'No', 'Yes', 'Yes'],
+        })
+        pivoted = pivot_first(df, ['questionNumber'], 'assessmentId', 'answer')
+        self.assertEqual(pivoted.index.tolist(), ['A.1', 'A.2'])
+        self.assertEqual(pivoted.columns.tolist(), [34, 37])
+        self.assertEqual(pivoted.to_numpy().tolist(), [['Yes', 'No'], ['Yes', 'Yes']])
+
+
+class TestDuplicateAnswers(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'questionNumber': ['A.1', 'A.1', 'A.2', 'A.2', 'A.1', 'A.1'],
+            'assessmentId': [34, 37, 34, 34, 34, 37],
+            'answer': ['Yes', 'No', 'Yes', 'Yes', 'No', None],
+        })
+
+    def test_reports_only_different_answers(self):
+        conflicts = get_conflicts(pivot_answers(self.df, ['questionNumber'], 'assessmentId', 'answer'))
+        self.assertEqual(conflicts.to_dict('records'), [
+            {'questionNumber': 'A.1', 'assessmentId': 34, 'answers': ['Yes', 'No']},
+        ])
+
+    def test_unique_keys_have_no_conflicts(self):
+        pivoted = pivot_answers(self.df.iloc[:3], ['questionNumber'], 'assessmentId', 'answer', 'error')
+        self.assertTrue(get_conflicts(pivoted).empty)
+
+    def test_last_policy(self):
+        pivoted = pivot_answers(self.df, ['questionNumber'], 'assessmentId', 'answer', 'last')
+        expected = self.df.pivot_table(index=['questionNumber'], columns='assessmentId', values='answer', aggfunc='last')
+        pd.testing.assert_frame_equal(pivoted, expected)
+        self.assertEqual(pivoted.loc['A.1', 34], 'No')
+
+    def test_error_policy(self):
+        with self.assertRaises(DuplicateAnswersError) as caught:
+            pivot_answers(self.df, ['questionNumber'], 'assessmentId', 'answer', 'error')
+        self.assertEqual(len(caught.exception.conflicts), 1)
+        with self.assertRaises(ValueError):
+            pivot_answers(self.df, ['questionNumber'], 'assessmentId', 'answer', 'mean')
+
+    def test_numeric_answers_match_pivot_table(self):
+        for values in ([3, 1, 2, 5, 4, 0], [3, 1, 2, 5, 4, None]):
+            df = self.df.assign(answer=values)
+            for policy in ('first', 'last'):
+                expected = df.pivot_table(
+                    index=['questionNumber'], columns='assessmentId', values='answer', aggfunc=policy)
+                pd.testing.assert_frame_equal(
+                    pivot_answers(df, ['questionNumber'], 'assessmentId', 'answer', policy), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
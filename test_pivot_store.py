@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from assessment_comparison_report import transform_export, transform_pivot_store
+from pivot_store import PivotStore, build_pivot_store, write_pivot_store
+from question_catalog import load_coded_export
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+PIVOT_INDEX = ['questionNumber', 'questionText']
+
+
+class TestPivotStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = write_pivot_store(
+            SAMPLE_EXPORT, self.tmp_dir.name, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer')
+        self.df = pd.read_csv(SAMPLE_EXPORT)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_opens_memory_mapped(self):
+        store = PivotStore.open(self.tmp_dir.name)
+        self.assertIsInstance(store.codes, np.memmap)
+        self.assertTrue(store.codes.flags['F_CONTIGUOUS'])
+        self.assertEqual(store.codes.shape, (len(store.questions), 9))
+        self.assertEqual(store.pivot_value, 'answer')
+
+    def test_subset_matches_transform_export(self):
+        for assessment_ids in [None, list(self.store.assessment_ids[[5, 0, 3]])]:
+            subset = self.df if assessment_ids is None else self.df[self.df['assessmentId'].isin(assessment_ids)]
+            expected = transform_export(subset, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer')
+            report = transform_pivot_store(self.store, ASSESSMENT_METADATA, assessment_ids)
+            self.assertEqual(report.to_csv(index=False), expected.to_csv(index=False))
+
+    def test_unknown_assessment(self):
+        with self.assertRaises(KeyError):
+            self.store.pivot([-1])
+        known = self.store.assessment_ids[0]
+        with self.assertRaisesRegex(KeyError, r'\[-1\]'):
+            self.store.column_positions([known, known, -1])
+
+    def test_numeric_answers_and_empty_cells(self):
+        df = pd.DataFrame({
+            'assessmentId': [1, 1, 2, 3],
+            'questionNumber': ['A.1', 'A.2', 'A.1', 'A.2'],
+            'answer': [5, 7, 6, np.nan],
+        })
+        path = os.path.join(self.tmp_dir.name, 'numeric.csv')
+        df.to_csv(path, index=False)
+        coded = load_coded_export(path, ['assessmentId'], ['questionNumber'], 'answer')
+        store = build_pivot_store(coded, os.path.join(self.tmp_dir.name, 'numeric'), ['questionNumber'], 'assessmentId')
+        pivot_df = store.pivot()
+        self.assertEqual(list(pivot_df.columns), ['questionNumber', 1, 2])
+        np.testing.assert_array_equal(pivot_df[2], [6.0, np.nan])
+        self.assertEqual(list(store.pivot([1])[1]), [5, 7])
+        self.assertEqual(len(store.pivot([3])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from natsort import natsorted
+
+import assessment_comparison_report
+import questions_as_columns
+from export_loader import load_export
+from question_catalog import QuestionOrder, load_coded_export
+from result_cache import ResultCache
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+PIVOT_INDEX = ['questionNumber', 'questionText']
+
+
+class TestCodedExport(unittest.TestCase):
+    def setUp(self):
+        # small chunks so distinct values are interned across many chunks
+        self.coded = load_coded_export(
+            SAMPLE_EXPORT, ['assessmentId'] + ASSESSMENT_METADATA, PIVOT_INDEX, 'answer', chunksize=37)
+
+    def test_stores_each_question_once(self):
+        self.assertEqual(len(self.coded), 468)
+        self.assertEqual(len(self.coded.questions), len(self.coded.questions.drop_duplicates()))
+        self.assertEqual(len(self.coded.assessments), 9)
+        self.assertLessEqual(self.coded.question_codes.itemsize, 2)
+
+    def test_rebuilds_the_loaded_columns(self):
+        columns = ['assessmentId'] + ASSESSMENT_METADATA + PIVOT_INDEX + ['answer']
+        df, _ = load_export(SAMPLE_EXPORT, columns, report_memory=False)
+        rebuilt = self.coded.to_frame(columns)
+        for col in columns:
+            self.assertEqual(rebuilt[col].tolist(), df[col].tolist(), col)
+        self.assertLess(self.coded.memory_bytes(), df.memory_usage(deep=True).sum())
+
+    def test_comparison_report_matches_frame_transform(self):
+        df, _ = load_export(SAMPLE_EXPORT, None, report_memory=False)
+        expected = assessment_comparison_report.transform_export(
+            df, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer')
+        pd.testing.assert_frame_equal(
+            assessment_comparison_report.transform_coded_export(
+                self.coded, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer'),
+            expected
+        )
+
+    def test_questions_report_matches_frame_transform(self):
+        df, _ = load_export(SAMPLE_EXPORT, None, report_memory=False)
+        coded = load_coded_export(SAMPLE_EXPORT, ASSESSMENT_METADATA, PIVOT_INDEX, 'answer', chunksize=50)
+        pd.testing.assert_frame_equal(
+            questions_as_columns.transform_coded_export(coded, ASSESSMENT_METADATA),
+            questions_as_columns.transform_export(df, ASSESSMENT_METADATA)
+        )
+
+    def test_numeric_answers_keep_their_type(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'scores.csv')
+            pd.DataFrame({
+                'assessmentId': [1, 1, 2, 2],
+                'questionNumber': ['A.1', 'A.2', 'A.1', 'A.2'],
+                'evaluationScore': [3, None, 5, 3],
+            }).to_csv(path, index=False)
+            coded = load_coded_export(path, ['assessmentId'], ['questionNumber'], 'evaluationScore', chunksize=3)
+            df, _ = load_export(path, None, report_memory=False)
+        pd.testing.assert_series_equal(
+            pd.Series(coded.column('evaluationScore'), name='evaluationScore'), df['evaluationScore'])
+
+
+class TestShardedExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        df = pd.read_csv(SAMPLE_EXPORT)
+        ids = sorted(df['assessmentId'].unique())
+        # two overlapping shards and a newer one re-sending one assessment with a changed answer
+        self.shards = []
+        for number, shard in enumerate([
+            df[df['assessmentId'].isin(ids[:6])],
+            df[df['assessmentId'].isin(ids[4:])],
+            df[df['assessmentId'] == ids[0]].assign(answer='Changed'),
+        ]):
+            path = os.path.join(self.tmp_dir.name, f'shard_{number}.csv')
+            shard.to_csv(path, index=False)
+            self.shards.append(path)
+        self.changed_id = ids[0]
+        self.changed_rows = int(((df['assessmentId'] == ids[0]) & (df['answer'] != 'Changed')).sum())
+        self.expected = df.copy()
+        self.expected.loc[df['assessmentId'] == ids[0], 'answer'] = 'Changed'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_newest_shard_wins(self):
+        coded = load_coded_export(
+            os.path.join(self.tmp_dir.name, 'shard_*.csv'),
+            ['assessmentId'] + ASSESSMENT_METADATA, PIVOT_INDEX, 'answer',
+            chunksize=40, newest_by='order', max_workers=2
+        )
+        self.assertEqual(len(coded), len(self.expected))
+        pd.testing.assert_frame_equal(
+            assessment_comparison_report.transform_coded_export(
+                coded, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer'),
+            assessment_comparison_report.transform_export(
+                self.expected, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer')
+        )
+
+    def test_reports_conflicts(self):
+        coded = load_coded_export(
+            self.shards, ['assessmentId'] + ASSESSMENT_METADATA, PIVOT_INDEX, 'answer', newest_by='order')
+        conflicts = coded.conflicts
+        self.assertEqual(len(conflicts), self.changed_rows)
+        self.assertEqual(set(conflicts['assessmentId']), {self.changed_id})
+        self.assertEqual(set(conflicts['newest_shard']), {self.shards[2]})
+        self.assertEqual(set(conflicts['newest_answer']), {'Changed'})
+        # the overlap of the first two shards has equal answers, so it is no conflict
+        self.assertEqual(set(conflicts['shard']), {self.shards[0]})
+
+    def test_questions_report_reads_shards(self):
+        output_path = os.path.join(self.tmp_dir.name, 'report.csv')
+        questions_as_columns.main(self.shards, output_path, ASSESSMENT_METADATA, newest_by='order')
+        expected_path = os.path.join(self.tmp_dir.name, 'expected.csv')
+        questions_as_columns.main(SAMPLE_EXPORT, expected_path, ASSESSMENT_METADATA)
+        report = pd.read_csv(output_path)
+        self.assertEqual(list(report.columns), list(pd.read_csv(expected_path).columns))
+        self.assertEqual(len(report), 9)
+
+
+class TestQuestionOrder(unittest.TestCase):
+    def test_ranks_numbers_naturally(self):
+        order = QuestionOrder(['1.10', '1.2', '1.1', '1.2'])
+        self.assertEqual(order.numbers, ['1.1', '1.2', '1.10'])
+        self.assertEqual(order.ranks(['1.10', None, '1.1']).tolist(), [2, -1, 0])
+
+    def test_inserts_new_numbers(self):
+        order = QuestionOrder(['1.1', '1.10'])
+        self.assertEqual(order.update(['1.10', '1.9', '2.1']), 2)
+        self.assertEqual(order.numbers, ['1.1', '1.9', '1.10', '2.1'])
+        self.assertEqual(order.argsort(['2.1', '1.9', '1.1', '1.9']).tolist(), [2, 1, 3, 0])
+
+    def test_save_and_load(self):
+        order = QuestionOrder(['A.10', 'A.2'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'order.json')
+            self.assertEqual(len(QuestionOrder.load(path)), 0)
+            order.save(path)
+            self.assertEqual(QuestionOrder.load(path).numbers, ['A.2', 'A.10'])
+
+    def test_comparison_rows_in_natural_order(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'report.csv')
+            order_path = os.path.join(tmp_dir, 'order.json')
+            assessment_comparison_report.main(
+                SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, PIVOT_INDEX, 'assessmentId', 'answer',
+                question_order_path=order_path)
+            numbers = pd.read_csv(output_path, header=None, skiprows=7, dtype=str)[0].tolist()
+            ranks = QuestionOrder.load(order_path).ranks(numbers)
+        self.assertTrue((ranks[1:] >= ranks[:-1]).all())
+        self.assertLess(numbers.index('1.1.2'), numbers.index('1.1.10'))
+
+    def test_cached_report_leaves_order_file_alone(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(os.path.join(tmp_dir, 'cache'))
+            output_path = os.path.join(tmp_dir, 'report.csv')
+            order_path = os.path.join(tmp_dir, 'order.json')
+            for path in (None, order_path):
+                questions_as_columns.main(
+                    SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, cache=cache, question_order_path=path)
+            self.assertEqual(cache.hits, 1)
+            self.assertFalse(os.path.exists(order_path))
+
+    def test_other_pivot_columns_stay_out_of_order(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'report.csv')
+            order_path = os.path.join(tmp_dir, 'order.json')
+            QuestionOrder(['1.1', '1.2']).save(order_path)
+            questions_as_columns.main(
+                SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, pivot_column='questionText',
+                question_order_path=order_path)
+            self.assertEqual(QuestionOrder.load(order_path).numbers, ['1.1', '1.2'])
+            columns = pd.read_csv(output_path, nrows=0).columns[len(ASSESSMENT_METADATA):]
+        # question texts holding ': ' are ranked whole, not split
+        self.assertEqual(list(columns), natsorted(columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
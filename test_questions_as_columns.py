@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+import questions_as_columns
+from questions_as_columns import transform_assessments, transform_export, update_export
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+
+class TestUpdateExport(unittest.TestCase):
+    def setUp(self):
+        self.export = pd.read_csv(SAMPLE_EXPORT)
+        assessment_ids = self.export['assessmentId'].unique()
+        self.new_ids = assessment_ids[-3:]
+        self.history = self.export[~self.export['assessmentId'].isin(self.new_ids)]
+        self.delta = self.export[self.export['assessmentId'].isin(self.new_ids)].copy()
+        # a question no earlier assessment answered
+        extra = self.delta.iloc[[0]].copy()
+        extra['questionNumber'] = '1.1.0'
+        extra['questionText'] = 'A question added in the new export'
+        self.delta = pd.concat([self.delta, extra], ignore_index=True)
+
+    def full_rebuild(self, export):
+        return transform_export(export.copy(), ASSESSMENT_METADATA)
+
+    def test_added_assessments_match_full_rebuild(self):
+        previous = self.full_rebuild(self.history)
+        updated = update_export(previous, self.delta.copy(), ASSESSMENT_METADATA)
+        expected = self.full_rebuild(pd.concat([self.history, self.delta]))
+        pd.testing.assert_frame_equal(updated, expected.reset_index(drop=True))
+        self.assertIn('1.1.0: A question added in the new export', updated.columns)
+
+    def test_changed_assessment_is_replaced(self):
+        changed_id = self.history['assessmentId'].iloc[0]
+        changed = self.history[self.history['assessmentId'] == changed_id].copy()
+        changed['answer'] = 'Changed answer'
+        previous = self.full_rebuild(self.history)
+        updated = update_export(previous, changed.copy(), ASSESSMENT_METADATA)
+        unchanged_history = self.history[self.history['assessmentId'] != changed_id]
+        expected = self.full_rebuild(pd.concat([unchanged_history, changed]))
+        pd.testing.assert_frame_equal(updated, expected.reset_index(drop=True))
+
+    def test_update_main_writes_same_report_as_full_run(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = {name: os.path.join(tmp_dir, f'{name}.csv')
+                     for name in ['history', 'delta', 'full', 'previous', 'expected', 'updated']}
+            self.history.to_csv(paths['history'], index=False)
+            self.delta.to_csv(paths['delta'], index=False)
+            pd.concat([self.history, self.delta]).to_csv(paths['full'], index=False)
+            questions_as_columns.main(paths['history'], paths['previous'], ASSESSMENT_METADATA)
+            questions_as_columns.main(paths['full'], paths['expected'], ASSESSMENT_METADATA)
+            questions_as_columns.update_main(
+                paths['previous'], paths['delta'], paths['updated'], ASSESSMENT_METADATA)
+            with open(paths['expected'], 'rb') as expected, open(paths['updated'], 'rb') as updated:
+                self.assertEqual(expected.read(), updated.read())
+
+    def regraded(self):
+        changed_id = self.history['assessmentId'].iloc[0]
+        changed = self.history[self.history['assessmentId'] == changed_id].copy()
+        # another assessment sharing the report row, answering part of the questions differently
+        sharing = changed.iloc[::2].copy()
+        sharing['assessmentId'] = 'sharing-assessment'
+        sharing['answer'] = 'Other answer'
+        history = pd.concat([self.history, sharing], ignore_index=True)
+        changed['grade'] = changed['grade'] + 1
+        return history, changed, history[history['assessmentId'] != changed_id]
+
+    def test_changed_metadata_replaces_old_row(self):
+        history, changed, unchanged_history = self.regraded()
+        updated = update_export(
+            self.full_rebuild(history), changed.copy(), ASSESSMENT_METADATA,
+            previous_assessments=transform_assessments(history, ASSESSMENT_METADATA))
+        expected = self.full_rebuild(pd.concat([unchanged_history, changed]))
+        pd.testing.assert_frame_equal(updated, expected.reset_index(drop=True))
+        self.assertEqual(len(updated), len(self.full_rebuild(history)) + 1)
+
+    def test_update_main_replaces_regraded_assessment(self):
+        history, changed, unchanged_history = self.regraded()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = {name: os.path.join(tmp_dir, f'{name}.csv')
+                     for name in ['history', 'delta', 'full', 'previous', 'expected', 'updated']}
+            history.to_csv(paths['history'], index=False)
+            changed.to_csv(paths['delta'], index=False)
+            pd.concat([unchanged_history, changed]).to_csv(paths['full'], index=False)
+            questions_as_columns.main(
+                paths['history'], paths['previous'], ASSESSMENT_METADATA, assessment_key='assessmentId')
+            questions_as_columns.main(
+                paths['full'], paths['expected'], ASSESSMENT_METADATA, assessment_key='assessmentId')
+            questions_as_columns.update_main(
+                paths['previous'], paths['delta'], paths['updated'], ASSESSMENT_METADATA)
+            for path in [paths['expected'], questions_as_columns.assessments_path(paths['expected'])]:
+                with open(path, 'rb') as expected, open(path.replace('expected', 'updated'), 'rb') as updated:
+                    self.assertEqual(expected.read(), updated.read())
+
+    def test_assessment_rows_are_opt_in(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'report.csv')
+            questions_as_columns.main(SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA)
+            self.assertEqual(os.listdir(tmp_dir), ['report.csv'])
+            questions_as_columns.main(
+                SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, chunksize=50, assessment_key='assessmentId')
+            assessments = pd.read_csv(questions_as_columns.assessments_path(output_path))
+            self.assertEqual(list(assessments['assessmentId']), list(self.export['assessmentId'].unique()))
+
+
+class TestSectionShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.full_path = os.path.join(self.tmp_dir.name, 'full.csv')
+        questions_as_columns.main(SAMPLE_EXPORT, self.full_path, ASSESSMENT_METADATA)
+        self.full = pd.read_csv(self.full_path, dtype=str)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_shards(self, split_by, **kwargs):
+        output_path = os.path.join(self.tmp_dir.name, 'split.csv')
+        questions_as_columns.main(SAMPLE_EXPORT, output_path, ASSESSMENT_METADATA, split_by=split_by, **kwargs)
+        with open(questions_as_columns.manifest_path(output_path), encoding='utf-8') as f:
+            manifest = json.load(f)
+        export = pd.read_csv(SAMPLE_EXPORT)
+        self.assertEqual([shard['section'] for shard in manifest['shards']], list(export[split_by].fillna('').unique()))
+        shards = [
+            pd.read_csv(os.path.join(self.tmp_dir.name, shard['path']), dtype=str) for shard in manifest['shards']]
+        for shard, entry in zip(shards, manifest['shards']):
+            self.assertEqual(list(shard.columns), ASSESSMENT_METADATA + entry['questions'])
+        joined = pd.concat([shards[0]] + [shard.drop(columns=ASSESSMENT_METADATA) for shard in shards[1:]], axis=1)
+        pd.testing.assert_frame_equal(joined, self.full)
+
+    def test_sections_in_parallel(self):
+        self.check_shards('sectionName', write_workers=2)
+
+    def test_subsections_in_process(self):
+        self.check_shards('subsectionName', write_workers=0, chunksize=37)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import questions_as_columns
+import report_cli
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_EXPORT = os.path.join(PACKAGE_DIR, 'sample_export.csv')
+SAMPLE_RESULT = os.path.join(PACKAGE_DIR, 'sample_result.csv')
+METADATA = 'partner,product,recipient,period,industry,grade'
+
+
+class TestReportCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def output_path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def read_bytes(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_comparison_matches_sample_result(self):
+        argv = ['comparison', SAMPLE_EXPORT, '-o', self.output_path('report.csv'), '-m', METADATA]
+        self.assertEqual(report_cli.main(argv), 0)
+        self.assertEqual(self.read_bytes(self.output_path('report.csv')), self.read_bytes(SAMPLE_RESULT))
+
+    def test_questions_as_columns_split_by_section(self):
+        questions_as_columns.main(SAMPLE_EXPORT, self.output_path('expected.csv'), METADATA.split(','))
+        argv = ['questions_as_columns', SAMPLE_EXPORT, '-o', self.output_path('report.csv'), '-m', METADATA]
+        report_cli.main(argv)
+        self.assertEqual(
+            self.read_bytes(self.output_path('report.csv')), self.read_bytes(self.output_path('expected.csv')))
+        report_cli.main(argv + ['--split-by', 'sectionName', '--write-workers', '0'])
+        self.assertTrue(os.path.exists(questions_as_columns.manifest_path(self.output_path('report.csv'))))
+
+    def test_failed_report_logs_and_exits_1(self):
+        for arguments in (
+            [self.output_path('missing.csv')],
+            [SAMPLE_EXPORT, '--filter', 'no_such_column=1'],
+            [SAMPLE_EXPORT, '--pivot-index', 'questionNumber', '--on-duplicate', 'error'],
+        ):
+            argv = ['comparison'] + arguments + ['-o', self.output_path('report.csv'), '-m', METADATA]
+            with self.assertLogs(report_cli.logger, 'ERROR') as logs:
+                self.assertEqual(report_cli.main(argv), 1)
+            self.assertIn('Traceback', logs.output[0])
+
+    def test_parse_filter(self):
+        self.assertEqual(report_cli.parse_filter('period=2024'), ('period', '2024'))
+        self.assertEqual(report_cli.parse_filter('industry=IT,Finance'), ('industry', ['IT', 'Finance']))
+        self.assertEqual(report_cli.parse_filter('grade=50..'), ('grade', '50..'))
+        for text in ['period', '=2024', 'grade=low..80']:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                report_cli.parse_filter(text)
+
+    def test_cache_hit_skips_pandas(self):
+        argv = ['comparison', SAMPLE_EXPORT, '-o', self.output_path('first.csv'), '-m', METADATA,
+                '--cache-dir', self.cache_dir]
+        report_cli.main(argv)
+        argv[3] = self.output_path('second.csv')
+        script = f"import sys, report_cli; report_cli.main({argv!r}); print('pandas' in sys.modules)"
+        loaded = subprocess.run(
+            [sys.executable, '-c', script], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(loaded.stdout.strip(), 'False')
+        self.assertEqual(self.read_bytes(self.output_path('second.csv')), self.read_bytes(SAMPLE_RESULT))
+
+    def test_jobs_writing_side_files_are_not_cached(self):
+        argv = ['questions_as_columns', SAMPLE_EXPORT, '-m', METADATA, '--cache-dir', self.cache_dir]
+        for options, side_file in (
+            (['--assessment-key', 'assessmentId'], questions_as_columns.assessments_path),
+            (['--question-order', self.output_path('order.json')], lambda path: self.output_path('order.json')),
+        ):
+            report_cli.main(argv + options + ['-o', self.output_path('first.csv')])
+            second_side_file = side_file(self.output_path('second.csv'))
+            if os.path.exists(second_side_file):
+                os.remove(second_side_file)
+            report_cli.main(argv + options + ['-o', self.output_path('second.csv')])
+            self.assertTrue(os.path.exists(second_side_file))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, report_cli.REPORT_CACHE_DIRECTORY)))
+
+    def test_job_file(self):
+        jobs = [
+            {
+                'report': 'questions_as_columns',
+                'input_csv_path': SAMPLE_EXPORT,
+                'output_csv_path': self.output_path('slice.csv'),
+                'assessment_metadata': ['partner', 'grade'],
+                'filters': {'grade': '50..', 'industry': ['IT', 'Finance']},
+            },
+            {'report': 'no_such_report', 'output_csv_path': self.output_path('broken.csv')},
+        ]
+        job_file = self.output_path('jobs.jsonl')
+        with open(job_file, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(job) + '\n' for job in jobs)
+        results = report_cli.run_jobs(report_cli.read_jobs(job_file), self.cache_dir)
+        self.assertIsNone(results[0]['error'])
+        self.assertIn('no_such_report', results[1]['error'])
+        self.assertTrue(os.path.exists(self.output_path('slice.csv')))
+        self.assertTrue(report_cli.run_jobs(jobs[:1], self.cache_dir)[0]['cached'])
+        self.assertEqual(report_cli.main(['jobs', job_file]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
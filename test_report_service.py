@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import pandas as pd
+
+import assessment_comparison_report
+from export_loader import load_export
+from report_service import ReportService, make_server
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+
+class TestReportService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.export_path = os.path.join(self.tmp_dir.name, 'export.csv')
+        shutil.copyfile(SAMPLE_EXPORT, self.export_path)
+        self.service = ReportService(self.export_path, max_workers=2)
+        self.server = make_server(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = 'http://%s:%d' % self.server.server_address[:2]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.tmp_dir.cleanup()
+
+    def get(self, path):
+        with urlopen(self.base_url + path) as response:
+            return response.read().decode('utf-8')
+
+    def test_comparison_report_matches_main(self):
+        expected_path = os.path.join(self.tmp_dir.name, 'expected.csv')
+        assessment_comparison_report.main(
+            self.export_path, expected_path, ASSESSMENT_METADATA,
+            ['questionNumber', 'questionText'], 'assessmentId', 'answer')
+        with open(expected_path, encoding='utf-8') as f:
+            self.assertEqual(self.get('/comparison'), f.read())
+
+    def test_filters_and_report_parameters(self):
+        body = self.get('/questions-as-columns?assessment_metadata=partner,period&partner=3M&partner=Boeing&period=2024')
+        report = pd.read_csv(io.StringIO(body))
+        self.assertEqual(report['partner'].tolist(), ['3M', 'Boeing'])
+        self.assertEqual(list(report.columns[:2]), ['partner', 'period'])
+
+    def test_range_filter(self):
+        body = self.get('/questions-as-columns?assessment_metadata=partner,grade&grade=90..')
+        report = pd.read_csv(io.StringIO(body))
+        self.assertEqual(sorted(report['grade'].tolist()), [90, 95, 97])
+        with self.assertRaises(HTTPError) as context:
+            self.get('/comparison?grade=high..')
+        self.assertEqual(context.exception.code, 400)
+
+    def test_unknown_column_is_bad_request(self):
+        with self.assertRaises(HTTPError) as context:
+            self.get('/comparison?assessment_metadata=partner,no_such_field')
+        self.assertEqual(context.exception.code, 400)
+
+    def test_reload_swaps_dataset(self):
+        df, _ = load_export(SAMPLE_EXPORT, None, report_memory=False)
+        smaller_path = os.path.join(self.tmp_dir.name, 'smaller.csv')
+        pd.read_csv(SAMPLE_EXPORT).head(10).to_csv(smaller_path, index=False)
+        old_dataset = self.service.dataset
+        with urlopen(Request(self.base_url + '/reload?path=' + smaller_path, method='POST')) as response:
+            status = json.loads(response.read())
+        self.assertEqual(status['rows'], 10)
+        # requests that started before the reload keep their dataset
+        self.assertEqual(len(old_dataset.df), len(df))
+        self.assertEqual(json.loads(self.get('/health'))['rows'], 10)
+
+    def test_reports_after_reload_use_new_dataset(self):
+        # the report workers are forked with the dataset, so a reload has to give them the new one
+        before = pd.read_csv(io.StringIO(self.get('/questions-as-columns')))
+        first_partner_path = os.path.join(self.tmp_dir.name, 'first_partner.csv')
+        export = pd.read_csv(SAMPLE_EXPORT)
+        export[export['partner'] == before['partner'].iloc[0]].to_csv(first_partner_path, index=False)
+        self.service.reload(first_partner_path)
+        after = pd.read_csv(io.StringIO(self.get('/questions-as-columns')))
+        self.assertEqual(after['partner'].tolist(), before['partner'].tolist()[:1])
+
+    def test_broken_pool_is_restarted(self):
+        broken = self.service._executor
+        broken.submit(os._exit, 1)
+        report = pd.read_csv(io.StringIO(self.get('/questions-as-columns')))
+        self.assertEqual(len(report), 9)
+        self.assertIsNot(self.service._executor, broken)
+
+    def test_builds_in_request_thread_without_workers(self):
+        service = ReportService(self.export_path, max_workers=0)
+        report = service.build('questions_as_columns', {})
+        service.close()
+        self.assertEqual(len(report), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from report_writer import (
+    flatten_header,
+    iter_csv_report,
+    read_report,
+    unflatten_header,
+    write_csv_report,
+    write_report,
+    write_xlsx_report,
+    xlsx_sheet_columns
+)
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+HAS_OPENPYXL = importlib.util.find_spec('openpyxl') is not None
+
+
+class TestFlattenHeader(unittest.TestCase):
+    def setUp(self):
+        self.columns = pd.MultiIndex.from_tuples([
+            ('', '', 'questionNumber'),
+            ('Partner 1', 2024, 'answer'),
+            ('Partner 1', 2024, 'answer'),
+            ('Partner 2', '', 'answer'),
+        ])
+
+    def test_names_are_unique_strings(self):
+        names = flatten_header(self.columns)
+        self.assertEqual(len(set(names)), len(names))
+        self.assertEqual(names[1], '["Partner 1", 2024, "answer"]')
+        self.assertEqual(names[2], '["Partner 1", 2024, "answer"]#1')
+
+    def test_round_trip(self):
+        restored = unflatten_header(flatten_header(self.columns), self.columns.nlevels)
+        self.assertTrue(restored.equals(self.columns))
+        self.assertEqual(list(restored), list(self.columns))
+
+
+class TestCsvReport(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            [
+                ['1.1.1', 'Text, with a comma', 'Yes', None],
+                ['1.1.10', 'Says "hi"', np.nan, 'multi\nline'],
+                ['1.2', '', 'No', 'N/A'],
+            ],
+            columns=pd.MultiIndex.from_tuples([
+                ('', '', 'questionNumber'),
+                ('', '', 'questionText'),
+                ('Partner 1', 2024, 'answer'),
+                ('Partner, 2', 88, 'answer'),
+            ])
+        )
+
+    def test_matches_to_csv_in_any_block_size(self):
+        expected = self.df.to_csv(index=False)
+        for block_rows in (1, 2, 1000):
+            self.assertEqual(''.join(iter_csv_report(self.df, block_rows)), expected)
+
+    def test_carriage_return_is_quoted_like_to_csv(self):
+        df = pd.DataFrame({'question\r': ['cr\rx', 'crlf\r\nx', 'Yes'], 'answer': ['a', 'b\r', None]})
+        self.assertEqual(''.join(iter_csv_report(df, block_rows=2)), df.to_csv(index=False))
+
+    def test_mixed_dtypes_match_to_csv(self):
+        df = pd.DataFrame({
+            'number': [1.5, np.nan, 0.1 + 0.2],
+            'flag': [True, False, True],
+            'count': [1, 0, 2],
+            'same': [1.0, 0.0, 2.0],
+            'grade': pd.array([88, None, 70], dtype='Int64'),
+            'partner': pd.Categorical(['3M', None, 'IBM']),
+            'loaded': pd.to_datetime(['2024-01-01', None, '2024-02-01']),
+        })
+        self.assertEqual(''.join(iter_csv_report(df, block_rows=2)), df.to_csv(index=False))
+
+    def test_writes_to_file_like(self):
+        output = io.StringIO()
+        write_csv_report(self.df, output, block_rows=2)
+        self.assertEqual(output.getvalue(), self.df.to_csv(index=False))
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class TestWriteReport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame(
+            [['A.1', 'Yes', 'No'], ['A.2', None, 'Yes']],
+            columns=pd.MultiIndex.from_tuples([
+                ('', '', 'questionNumber'),
+                ('Partner 1', 88, 'answer'),
+                ('Partner 1', 88, 'answer'),
+            ])
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parquet_round_trip(self):
+        path = os.path.join(self.tmp_dir.name, 'report.parquet')
+        write_report(self.df, path)
+        pd.testing.assert_frame_equal(read_report(path), self.df)
+
+    def test_arrow_round_trip(self):
+        path = os.path.join(self.tmp_dir.name, 'report.out')
+        write_report(self.df, path, file_format='arrow')
+        pd.testing.assert_frame_equal(read_report(path, file_format='arrow'), self.df)
+
+
+class TestXlsxSheetColumns(unittest.TestCase):
+    def test_key_columns_repeat_on_every_sheet(self):
+        self.assertEqual(xlsx_sheet_columns(7, key_columns=2, max_columns=4), [[0, 1, 2, 3], [0, 1, 4, 5], [0, 1, 6]])
+
+    def test_narrow_report_is_one_sheet(self):
+        self.assertEqual(xlsx_sheet_columns(3, key_columns=1), [[0, 1, 2]])
+
+
+@unittest.skipUnless(HAS_OPENPYXL, "openpyxl is not installed")
+class TestXlsxReport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'report.xlsx')
+        self.df = pd.DataFrame(
+            [['A.1', 'Yes', 'No', None], ['A.2', None, 'Yes', 'N/A']],
+            columns=pd.MultiIndex.from_tuples([
+                ('', '', 'questionNumber'),
+                ('Partner 1', 88, 'answer'),
+                ('Partner 2', 70, 'answer'),
+                ('Partner 3', 95, 'answer'),
+            ])
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_header_levels_become_frozen_rows(self):
+        from openpyxl import load_workbook
+
+        write_report(self.df, self.path, key_columns=1)
+        sheet = load_workbook(self.path)['Report']
+        self.assertEqual(list(sheet.values), [
+            (None, 'Partner 1', 'Partner 2', 'Partner 3'),
+            (None, 88, 70, 95),
+            ('questionNumber', 'answer', 'answer', 'answer'),
+            ('A.1', 'Yes', 'No', None),
+            ('A.2', None, 'Yes', 'N/A'),
+        ])
+        self.assertEqual(sheet.freeze_panes, 'B4')
+        self.assertTrue(sheet['B1'].font.bold)
+
+    def test_wide_report_splits_across_sheets(self):
+        from openpyxl import load_workbook
+
+        write_xlsx_report(self.df, self.path, key_columns=1, max_columns=3)
+        workbook = load_workbook(self.path)
+        self.assertEqual(workbook.sheetnames, ['Report', 'Report 2'])
+        self.assertEqual(
+            [row[0] for row in workbook['Report 2'].values], [None, None, 'questionNumber', 'A.1', 'A.2'])
+        self.assertEqual(workbook['Report 2']['B1'].value, 'Partner 3')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import assessment_comparison_report
+from result_cache import ResultCache, cached_result, make_key
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_export.csv')
+ASSESSMENT_METADATA = ['partner', 'product', 'recipient', 'period', 'industry', 'grade']
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.tmp_dir.name, 'cache'), max_bytes=250)
+        self.export_path = os.path.join(self.tmp_dir.name, 'export.csv')
+        with open(self.export_path, 'w') as f:
+            f.write('assessmentId,answer\n34,Yes\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hit_after_miss(self):
+        calls = []
+        compute = lambda: calls.append(1) or {'rows': 1}
+        first = cached_result(self.cache, self.export_path, {'pivot_value': 'answer'}, compute)
+        second = cached_result(self.cache, self.export_path, {'pivot_value': 'answer'}, compute)
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_contents_and_arguments(self):
+        key = make_key(self.export_path, {'pivot_value': 'answer'})
+        self.assertNotEqual(key, make_key(self.export_path, {'pivot_value': 'answerText'}))
+        with open(self.export_path, 'a') as f:
+            f.write('37,No\n')
+        self.assertNotEqual(key, make_key(self.export_path, {'pivot_value': 'answer'}))
+
+    def test_evicts_least_recently_used(self):
+        for name in ['a', 'b', 'c']:
+            self.cache.put(name, b'x' * 100)
+            time.sleep(0.01)
+        # 'a' and 'b' no longer fit together with 'c'; reading 'b' before the next put keeps it
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('b'))
+        time.sleep(0.01)
+        self.cache.put('d', b'x' * 100)
+        self.assertIsNone(self.cache.get('c'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertLessEqual(self.cache.stats()['bytes'], 250)
+
+    def test_report_from_cache_matches(self):
+        cache = ResultCache(os.path.join(self.tmp_dir.name, 'reports'))
+        export_path = os.path.join(self.tmp_dir.name, 'sample_export.csv')
+        shutil.copyfile(SAMPLE_EXPORT, export_path)
+        outputs = []
+        for run in range(2):
+            outputs.append(os.path.join(self.tmp_dir.name, f'result{run}.csv'))
+            assessment_comparison_report.main(
+                export_path, outputs[-1], ASSESSMENT_METADATA,
+                ['questionNumber', 'questionText'], 'assessmentId', 'answer', cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with open(outputs[0], 'rb') as first, open(outputs[1], 'rb') as second:
+            self.assertEqual(first.read(), second.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
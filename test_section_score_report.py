@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from section_score_report import TOTAL_LABEL, get_section_totals, transform_export
+
+
+class TestSectionScoreReport(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'assessmentId': [37, 37, 37, 34, 34, 34, 34],
+            'partner': ['Partner 2'] * 3 + ['Partner 1'] * 4,
+            'sectionName': ['A', 'A', 'B', 'A', 'A', 'A', 'B'],
+            'subsectionName': ['A1', 'A2', None, 'A1', 'A1', 'A2', None],
+            'evaluationScore': [1, 2, np.nan, 3, 4, np.nan, 5],
+            'answer': ['Yes', 'Yes', 'x', 'Yes', 'No', None, 'No'],
+        })
+
+    def test_rows_and_header(self):
+        report = transform_export(self.df, ['partner'])
+        self.assertEqual(
+            list(report.iloc[:, :2].itertuples(index=False, name=None)),
+            [('A', 'A1'), ('A', 'A2'), ('A', TOTAL_LABEL), ('B', ''), ('B', TOTAL_LABEL), (TOTAL_LABEL, '')]
+        )
+        self.assertEqual(
+            list(report.columns[:6]),
+            [
+                ('', 'sectionName'), ('', 'subsectionName'),
+                ('Partner 1', 'score'), ('Partner 1', 'answered'),
+                ('Partner 1', 'unanswered'), ('Partner 1', 'completion'),
+            ]
+        )
+        self.assertEqual(report.shape, (6, 10))
+
+    def test_measures(self):
+        report = transform_export(self.df, ['partner'])
+        partner_1 = report.xs('Partner 1', axis=1, level=0)
+        pd.testing.assert_series_equal(
+            partner_1['score'], pd.Series([7.0, np.nan, 7.0, 5.0, 5.0, 12.0]), check_names=False)
+        self.assertEqual(list(partner_1['answered']), [2, 0, 2, 1, 1, 3])
+        self.assertEqual(list(partner_1['unanswered']), [0, 1, 1, 0, 0, 1])
+        self.assertEqual(list(partner_1['completion']), [1.0, 0.0, 2 / 3, 1.0, 1.0, 0.75])
+
+    def test_matches_groupby(self):
+        labels, assessments, grids = get_section_totals(
+            self.df, 'assessmentId', 'sectionName', 'subsectionName', 'evaluationScore', 'answer', totals=False)
+        expected = (
+            self.df.fillna({'subsectionName': ''})
+            .groupby(['sectionName', 'subsectionName', 'assessmentId'])['evaluationScore']
+            .sum(min_count=1)
+            .unstack()
+        )
+        self.assertEqual(list(assessments), [34, 37])
+        np.testing.assert_array_equal(
+            np.where(grids['scored'] > 0, grids['score'], np.nan), expected.to_numpy())
+        self.assertEqual(list(labels['subsectionName']), list(expected.index.get_level_values(1)))
+
+    def test_selected_measures_without_totals(self):
+        report = transform_export(self.df, ['partner'], measures=['mean_score'], totals=False)
+        self.assertEqual(
+            list(report.columns.get_level_values(-1)), ['sectionName', 'subsectionName', 'mean_score', 'mean_score'])
+        np.testing.assert_array_equal(report.iloc[:, 2], [3.5, np.nan, 5.0])
+        np.testing.assert_array_equal(report.iloc[:, 3], [1.0, 2.0, np.nan])
+        with self.assertRaises(ValueError):
+            transform_export(self.df, ['partner'], measures=['median'])
+
+
+if __name__ == '__main__':
+    unittest.main()